@@ -29,6 +29,57 @@ class Config:
     OSM_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'cache', 'osm')
     OSM_CACHE_TIMEOUT = 86400  # 24 hours
     OSM_USER_AGENT = 'taximore'
+    # Компактная CSR-сеть города (собирается backend.services.graph_builder),
+    # открывается через mmap всеми процессами
+    OSM_CITY_NETWORK_PATH = os.getenv(
+        'OSM_CITY_NETWORK_PATH',
+        os.path.join(OSM_CACHE_DIR, 'city.rnet')
+    )
+    # Тайлы графа за пределами города: размер (градусы), бюджет памяти процесса
+    # на отображённые тайлы и сшитые сети и предел файлов тайлов на диске (МБ)
+    GRAPH_TILE_DIR = os.getenv('GRAPH_TILE_DIR', os.path.join(OSM_CACHE_DIR, 'tiles'))
+    GRAPH_TILE_DEG = float(os.getenv('GRAPH_TILE_DEG', 0.05))
+    GRAPH_TILE_MEMORY_MB = int(os.getenv('GRAPH_TILE_MEMORY_MB', 256))
+    GRAPH_TILE_DISK_MB = int(os.getenv('GRAPH_TILE_DISK_MB', 2048))
+    # Движок поиска маршрута: ch (contraction hierarchies), astar или dijkstra
+    ROUTING_ENGINE = os.getenv('ROUTING_ENGINE', 'ch')
+    # Пул процессов маршрутизации: число процессов (0 - потоки текущего процесса),
+    # максимум задач в очереди и в работе, таймаут ожидания результата (секунды)
+    ROUTING_WORKERS = int(os.getenv('ROUTING_WORKERS', 2))
+    ROUTING_MAX_PENDING = int(os.getenv('ROUTING_MAX_PENDING', 64))
+    ROUTING_TIMEOUT = float(os.getenv('ROUTING_TIMEOUT', 10))
+    # Сокет демона маршрутизации (routing_daemon); пусто - каждый процесс ищет сам
+    ROUTING_SOCKET = os.getenv('ROUTING_SOCKET', '')
+    # Кэш маршрутов: записей в памяти процесса и время жизни в Redis (секунды)
+    ROUTE_CACHE_SIZE = int(os.getenv('ROUTE_CACHE_SIZE', 10000))
+    ROUTE_CACHE_TTL = int(os.getenv('ROUTE_CACHE_TTL', 900))
+    # Допуск упрощения геометрии маршрута (метры) там, где нужна только отрисовка
+    ROUTE_SIMPLIFY_TOLERANCE = float(os.getenv('ROUTE_SIMPLIFY_TOLERANCE', 5))
+    # Геокодер Nominatim: время жизни найденных и ненайденных адресов (секунды),
+    # общий для всех процессов лимит запросов в секунду, ожидание токена и
+    # число одновременных запросов пакетного геокодирования
+    GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', 86400))
+    GEOCODE_NEGATIVE_TTL = int(os.getenv('GEOCODE_NEGATIVE_TTL', 3600))
+    GEOCODE_RATE = float(os.getenv('GEOCODE_RATE', 1.0))
+    GEOCODE_BURST = int(os.getenv('GEOCODE_BURST', 1))
+    GEOCODE_MAX_WAIT = float(os.getenv('GEOCODE_MAX_WAIT', 5.0))
+    GEOCODE_CONCURRENCY = int(os.getenv('GEOCODE_CONCURRENCY', 4))
+    # Изохроны: изохрон в кэше процесса и размер шестиугольной ячейки (метры)
+    ISOCHRONE_CACHE_SIZE = int(os.getenv('ISOCHRONE_CACHE_SIZE', 256))
+    ISOCHRONE_CELL_M = float(os.getenv('ISOCHRONE_CELL_M', 250))
+    # Период сборщика водителей без свежих локаций (backend.services.driver_sweeper), секунды
+    DRIVER_SWEEP_INTERVAL = float(os.getenv('DRIVER_SWEEP_INTERVAL', 30))
+    # Поиск свободных водителей: redis (гео-индексы) или grid (индекс в памяти процесса,
+    # синхронизируется из потока driver_events) и размер его ячеек (метры)
+    DRIVER_INDEX = os.getenv('DRIVER_INDEX', 'redis')
+    DRIVER_GRID_CELL_M = float(os.getenv('DRIVER_GRID_CELL_M', 500))
+    # Хранилище траекторий водителей (backend.services.trajectory_store) и период
+    # записи сегментов из потока driver_events (секунды)
+    TRAJECTORY_DIR = os.getenv(
+        'TRAJECTORY_DIR',
+        os.path.join(os.path.dirname(__file__), '..', 'cache', 'trajectories')
+    )
+    TRAJECTORY_FLUSH_SECONDS = float(os.getenv('TRAJECTORY_FLUSH_SECONDS', 60))
     
     # City Boundaries (example for Moscow)
     CITY_BOUNDS = {
@@ -37,6 +88,18 @@ class Config:
         'west': 37.0,
         'east': 38.0
     }
+    # Зона городского тарифа города по умолчанию (без CITIES_FILE)
+    FARE_ZONE = {
+        'north': 56.5,
+        'south': 56.0,
+        'west': 92.5,
+        'east': 93.0
+    }
+    # Несколько городов: JSON-список {name, bounds, network_path, fare_zone?, redis_prefix?};
+    # без файла - один город из CITY_BOUNDS и OSM_CITY_NETWORK_PATH.
+    # Бюджет памяти процесса на сети, иерархии и адреса загруженных городов (МБ)
+    CITIES_FILE = os.getenv('CITIES_FILE', '')
+    CITY_MEMORY_MB = int(os.getenv('CITY_MEMORY_MB', 2048))
     
     # YooKassa
     YOOKASSA_SHOP_ID = os.getenv('YOOKASSA_SHOP_ID')
@@ -2,8 +2,12 @@ from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from functools import wraps
 from ..models import db, User, Driver, Customer, Order, Subscription, SubscriptionPlan
+from ..services.routing import get_search_stats
+from ..services.osm_service import geocoding_client, get_daemon_stats, route_cache, routing_pool
+from ..services.driver_location import DriverLocationService
 
 admin_bp = Blueprint('admin', __name__)
+driver_service = DriverLocationService()
 
 def admin_required(f):
     @wraps(f)
@@ -94,6 +98,26 @@ def manage_driver(driver_id):
     db.session.commit()
     return jsonify({'message': 'Driver updated successfully'})
 
+@admin_bp.route('/routing/stats')
+@login_required
+@admin_required
+def routing_stats():
+    """Route search, route cache, geocoding, routing pool and daemon statistics of this worker"""
+    return jsonify({
+        'engines': get_search_stats(),
+        'route_cache': route_cache.get_stats(),
+        'geocoding': geocoding_client.get_stats(),
+        'routing_pool': routing_pool.get_stats(),
+        'routing_daemon': get_daemon_stats()
+    })
+
+@admin_bp.route('/drivers/presence')
+@login_required
+@admin_required
+def drivers_presence():
+    """Driver geo set sizes against drivers with a recent location, per city"""
+    return jsonify(driver_service.get_presence_stats())
+
 @admin_bp.route('/reports')
 @login_required
 @admin_required
@@ -1,9 +1,15 @@
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from ..models import db, Order, Driver, Customer, FareRule, Subscription
+from ..services.driver_location import DriverLocationService
 from datetime import datetime
+import asyncio
 
 api_bp = Blueprint('api', __name__)
+driver_service = DriverLocationService()
+
+# Максимум локаций в одном запросе пакетного обновления
+MAX_LOCATION_BATCH = 5000
 
 @api_bp.route('/orders', methods=['GET'])
 @login_required
@@ -45,6 +51,21 @@ def get_drivers():
         } if driver.current_location_lat and driver.current_location_lon else None
     } for driver in drivers])
 
+@api_bp.route('/drivers/locations', methods=['POST'])
+@login_required
+def update_driver_locations():
+    """Ingest a batch of driver location pings in one Redis round trip"""
+    batch = request.json
+    if not isinstance(batch, list):
+        return jsonify({'error': 'Expected a JSON list of locations'}), 400
+    if len(batch) > MAX_LOCATION_BATCH:
+        return jsonify({'error': f'At most {MAX_LOCATION_BATCH} locations per request'}), 413
+    
+    accepted = asyncio.run(driver_service.update_driver_locations(batch))
+    if accepted is None:
+        return jsonify({'error': 'Failed to store locations'}), 503
+    return jsonify({'accepted': accepted, 'rejected': len(batch) - accepted})
+
 @api_bp.route('/fare-rules', methods=['GET', 'POST'])
 @login_required
 def fare_rules():
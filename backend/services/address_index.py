@@ -0,0 +1,267 @@
+import os
+import bisect
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+import numpy as np
+from .address_parser import normalize_house, normalize_street, parse_address
+from .road_network import load_arrays, save_arrays
+from .spatial_index import PointIndex, build_point_grid
+
+logger = logging.getLogger(__name__)
+
+# Адресная точка дальше этого расстояния не считается адресом точки запроса, метры
+ADDRESS_MAX_DISTANCE_M = 60.0
+ADDRESS_GRID_CELL_M = 100.0
+
+# Минимальное сходство триграмм (коэффициент Дайса) для нечёткого поиска улицы
+FUZZY_MIN_SIMILARITY = 0.45
+
+
+def _trigrams(text: str) -> set:
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def address_index_path(network_path: str) -> str:
+    """Artifact path of the address index built next to a network file: city.rnet -> city.addr"""
+    return f'{os.path.splitext(network_path)[0]}.addr'
+
+
+class AddressIndex:
+    """Address points (street + house number) from the OSM extract with a grid index.
+
+    Street names and house numbers are stored once in ``meta['streets']`` and
+    ``meta['housenumbers']``; per-point arrays hold indices into them. Saved
+    with the same mmap format as the road network.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict = None, buffer=None):
+        self.arrays = arrays
+        self.meta = meta or {}
+        self._buffer = buffer
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self.streets = self.meta.get('streets', [])
+        self.housenumbers = self.meta.get('housenumbers', [])
+        self.points = None
+        self._forward = None
+        self._forward_lock = threading.Lock()
+        if self.count:
+            self.points = PointIndex(self.addr_lat, self.addr_lon, self.addr_grid_indptr,
+                                     self.addr_grid_items, self.meta['grid'])
+
+    @property
+    def count(self) -> int:
+        return len(self.addr_lat)
+
+    @property
+    def version(self) -> str:
+        return self.meta.get('version', '')
+
+    @classmethod
+    def build(cls, lats, lons, streets: List[str], housenumbers: List[str],
+              meta: Dict = None) -> 'AddressIndex':
+        """Index address points given as parallel lists"""
+        street_ids, house_ids = {}, {}
+        addr_street = np.array([street_ids.setdefault(s, len(street_ids)) for s in streets],
+                               dtype=np.int32)
+        addr_house = np.array([house_ids.setdefault(h, len(house_ids)) for h in housenumbers],
+                              dtype=np.int32)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        indptr, items, grid = build_point_grid(lats, lons, ADDRESS_GRID_CELL_M)
+        arrays = {
+            'addr_lat': lats,
+            'addr_lon': lons,
+            'addr_street': addr_street,
+            'addr_house': addr_house,
+            'addr_grid_indptr': indptr,
+            'addr_grid_items': items
+        }
+        meta = dict(meta or {}, streets=list(street_ids), housenumbers=list(house_ids), grid=grid)
+        return cls(arrays, meta)
+
+    def save(self, path: str) -> str:
+        self.meta = save_arrays(path, self.arrays, dict(self.meta, kind='addresses'))
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'AddressIndex':
+        arrays, meta, buffer = load_arrays(path)
+        if meta.get('kind') != 'addresses':
+            raise ValueError(f'{path} is not an address index file')
+        return cls(arrays, meta, buffer)
+
+    def address(self, i: int) -> Dict:
+        """Address point as a dict: street, housenumber, full address and coordinates"""
+        street = self.streets[int(self.addr_street[i])]
+        housenumber = self.housenumbers[int(self.addr_house[i])]
+        return {
+            'address': f'{street}, {housenumber}',
+            'street': street,
+            'housenumber': housenumber,
+            'lat': float(self.addr_lat[i]),
+            'lon': float(self.addr_lon[i])
+        }
+
+    def reverse(self, lat: float, lon: float,
+                max_distance: float = ADDRESS_MAX_DISTANCE_M) -> Optional[Dict]:
+        """Nearest address point within max_distance meters, with ``distance``"""
+        if self.points is None:
+            return None
+        i, distance = self.points.nearest(lat, lon)
+        if distance > max_distance:
+            return None
+        return dict(self.address(i), distance=round(distance, 1))
+
+    def _forward_index(self) -> Dict:
+        """Street and house lookup structures, built on first forward query"""
+        if self._forward is None:
+            with self._forward_lock:
+                if self._forward is None:
+                    self._forward = self._build_forward()
+        return self._forward
+
+    def _build_forward(self) -> Dict:
+        keys, kinds = [], []
+        by_key, by_word, rotations, by_trigram = {}, {}, [], {}
+        for street_id, name in enumerate(self.streets):
+            words, kind = normalize_street(name)
+            key = ' '.join(words)
+            keys.append(key)
+            kinds.append(kind)
+            by_key.setdefault(key, []).append(street_id)
+            for i, word in enumerate(words):
+                by_word.setdefault(word, set()).add(street_id)
+                # Префиксный поиск с любого слова названия: 'ямск' -> '1я тверская ямская'
+                rotations.append((' '.join(words[i:] + words[:i]), street_id))
+            for trigram in _trigrams(key):
+                by_trigram.setdefault(trigram, []).append(street_id)
+        rotations.sort()
+
+        # Адреса по улицам, внутри улицы - по нормализованному номеру дома
+        house_keys = [normalize_house(h) for h in self.housenumbers]
+        ranks = {key: rank for rank, key in enumerate(sorted(set(house_keys)))}
+        house_rank = np.array([ranks[key] for key in house_keys], dtype=np.int64)
+        order = np.lexsort((house_rank[self.addr_house], self.addr_street))
+        street_indptr = np.zeros(len(self.streets) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.addr_street, minlength=len(self.streets)), out=street_indptr[1:])
+        return {
+            'keys': keys,
+            'kinds': kinds,
+            'by_key': by_key,
+            'by_word': by_word,
+            'rotations': rotations,
+            'rotation_keys': [key for key, _ in rotations],
+            'by_trigram': by_trigram,
+            'order': order,
+            'street_indptr': street_indptr,
+            'sorted_houses': [house_keys[h] for h in self.addr_house[order].tolist()]
+        }
+
+    def _match_streets(self, words: List[str], kind: Optional[str], prefix: bool) -> List[tuple]:
+        """Candidate streets as (street id, match type), best first"""
+        index = self._forward_index()
+        key = ' '.join(words)
+        matches = [(street_id, 'exact') for street_id in index['by_key'].get(key, [])]
+
+        known = [word for word in words if word in index['by_word']]
+        if not matches and known:
+            # Все слова названия есть в запросе: лишние слова (город, район) не мешают
+            rare = min(known, key=lambda word: len(index['by_word'][word]))
+            query_words = set(words)
+            found = [
+                street_id for street_id in index['by_word'].get(rare, ())
+                if set(index['keys'][street_id].split()) <= query_words
+            ]
+            found.sort(key=lambda street_id: -len(index['keys'][street_id]))
+            matches = [(street_id, 'exact') for street_id in found]
+
+        if not matches and prefix and key:
+            rotation_keys = index['rotation_keys']
+            seen = set()
+            i = bisect.bisect_left(rotation_keys, key)
+            while i < len(rotation_keys) and rotation_keys[i].startswith(key):
+                street_id = index['rotations'][i][1]
+                if street_id not in seen:
+                    seen.add(street_id)
+                    matches.append((street_id, 'prefix'))
+                i += 1
+
+        if not matches and key:
+            trigrams = _trigrams(key)
+            shared = Counter()
+            for trigram in trigrams:
+                shared.update(index['by_trigram'].get(trigram, ()))
+            scored = []
+            for street_id, count in shared.items():
+                similarity = 2 * count / (len(trigrams) + len(_trigrams(index['keys'][street_id])))
+                if similarity >= FUZZY_MIN_SIMILARITY:
+                    scored.append((-similarity, street_id))
+            matches = [(street_id, 'fuzzy') for _, street_id in sorted(scored)]
+
+        if kind:
+            # Тип улицы из запроса различает 'Ленинский проспект' и 'Ленинский переулок'
+            same_kind = [m for m in matches if index['kinds'][m[0]] == kind]
+            matches = same_kind or matches
+        return matches
+
+    def _street_result(self, street_id: int) -> Optional[Dict]:
+        index = self._forward_index()
+        start, end = index['street_indptr'][street_id], index['street_indptr'][street_id + 1]
+        if start == end:
+            return None
+        ids = index['order'][start:end]
+        # Точка улицы - адрес, ближайший к центру её адресов
+        lat, lon = self.addr_lat[ids], self.addr_lon[ids]
+        center = int(ids[np.argmin((lat - lat.mean()) ** 2 + (lon - lon.mean()) ** 2)])
+        return dict(self.address(center), address=self.streets[street_id], housenumber=None)
+
+    def search(self, query: str, limit: int = 5, prefix: bool = True) -> List[Dict]:
+        """Addresses matching a typed query, best first.
+
+        Streets are matched exactly, by words, by prefix of any name word
+        (as-you-type, when ``prefix``) and finally by trigram similarity.
+        Results carry ``precision`` ('house' or 'street') and ``match``
+        ('exact', 'prefix' or 'fuzzy').
+        """
+        if not self.count:
+            return []
+        words, kind, house = parse_address(query)
+        index = self._forward_index()
+        sorted_houses = index['sorted_houses']
+        results = []
+        for street_id, match in self._match_streets(words, kind, prefix):
+            start = int(index['street_indptr'][street_id])
+            end = int(index['street_indptr'][street_id + 1])
+            if house:
+                i = bisect.bisect_left(sorted_houses, house, start, end)
+                if i < end and sorted_houses[i] == house:
+                    results.append(dict(self.address(int(index['order'][i])),
+                                        precision='house', match=match))
+                else:
+                    # Набор по буквам показывает все номера с этим началом ('7' -> '7к1', '71'),
+                    # полный запрос - корпуса и строения того же дома ('7' -> '7к1')
+                    while i < end and sorted_houses[i].startswith(house) and len(results) < limit:
+                        if prefix or not sorted_houses[i][len(house)].isdigit():
+                            results.append(dict(self.address(int(index['order'][i])),
+                                                precision='house', match='prefix'))
+                            if not prefix:
+                                break
+                        i += 1
+                if results and not prefix:
+                    break
+            if not house or not results:
+                street = self._street_result(street_id)
+                if street is not None:
+                    results.append(dict(street, precision='street', match=match))
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    def geocode(self, query: str) -> Optional[Dict]:
+        """Best address for a complete query, or None"""
+        results = self.search(query, limit=1, prefix=False)
+        return results[0] if results else None
@@ -0,0 +1,106 @@
+"""Normalization of Russian street addresses for the local geocoder.
+
+"ул. Тверская, д. 7 корп. 1", "Тверская улица 7к1" and "тверская 7 к1" all
+parse to the street words ``['тверская']``, street type ``'ул'`` and house
+``'7к1'``. The same functions normalize OSM names when the index is built,
+so typed queries and address data meet in one form.
+"""
+import re
+from typing import List, Optional, Tuple
+
+# Типы улиц и их сокращения -> каноническое сокращение
+STREET_TYPES = {
+    'улица': 'ул', 'ул': 'ул',
+    'проспект': 'пр-кт', 'пр-кт': 'пр-кт', 'пр-т': 'пр-кт', 'просп': 'пр-кт', 'пр': 'пр-кт',
+    'переулок': 'пер', 'пер': 'пер',
+    'бульвар': 'б-р', 'б-р': 'б-р', 'бул': 'б-р',
+    'шоссе': 'ш', 'ш': 'ш',
+    'площадь': 'пл', 'пл': 'пл',
+    'набережная': 'наб', 'наб': 'наб',
+    'проезд': 'пр-д', 'пр-д': 'пр-д',
+    'тупик': 'туп', 'туп': 'туп',
+    'аллея': 'ал', 'ал': 'ал',
+    'линия': 'лин', 'лин': 'лин',
+    'микрорайон': 'мкр', 'мкр': 'мкр',
+    'квартал': 'кв-л', 'кв-л': 'кв-л'
+}
+
+# Части номера дома: маркер -> сокращение в нормализованном номере
+HOUSE_MARKERS = {
+    'дом': '', 'д': '',
+    'корпус': 'к', 'корп': 'к', 'к': 'к',
+    'строение': 'с', 'стр': 'с', 'с': 'с',
+    'владение': 'вл', 'вл': 'вл',
+    'литера': '', 'лит': ''
+}
+
+# Слова, которые не относятся ни к улице, ни к дому
+NOISE_WORDS = {'г', 'город', 'россия', 'рф'}
+
+_PUNCTUATION = re.compile(r'[.,;:()"«»№#]+')
+_ORDINAL = re.compile(r'^(\d+)-?([а-я]{1,2})$')
+_GLUED_MARKER = re.compile(r'^(корпус|корп|строение|стр|к|с|вл)(\d+[а-я]?)$')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words with punctuation removed and 'ё' folded to 'е'"""
+    text = _PUNCTUATION.sub(' ', text.lower().replace('ё', 'е'))
+    return text.split()
+
+
+def _is_house_token(token: str) -> bool:
+    return token[0].isdigit() or token in HOUSE_MARKERS or bool(_GLUED_MARKER.match(token))
+
+
+def normalize_house(text: str) -> str:
+    """Canonical house number: '7 корп. 1 стр 2' -> '7к1с2', '12 А' -> '12а'"""
+    parts = []
+    for token in tokenize(text) if isinstance(text, str) else []:
+        glued = _GLUED_MARKER.match(token)
+        if glued:
+            parts.append(HOUSE_MARKERS[glued.group(1)] + glued.group(2))
+        elif token in HOUSE_MARKERS:
+            parts.append(HOUSE_MARKERS[token])
+        else:
+            parts.append(token)
+    return ''.join(parts)
+
+
+def _street_words(tokens: List[str]) -> Tuple[List[str], Optional[str]]:
+    """Street words without type and noise; hyphenated names are split, ordinals kept"""
+    words, kind = [], None
+    for token in tokens:
+        if token in STREET_TYPES:
+            kind = STREET_TYPES[token]
+            continue
+        if token in NOISE_WORDS:
+            continue
+        ordinal = _ORDINAL.match(token)
+        if ordinal:
+            words.append(ordinal.group(1) + ordinal.group(2))
+            continue
+        words.extend(part for part in token.split('-') if part)
+    return words, kind
+
+
+def normalize_street(name: str) -> Tuple[List[str], Optional[str]]:
+    """Street name words and canonical street type: 'Ленинский проспект' -> (['ленинский'], 'пр-кт')"""
+    return _street_words(tokenize(name))
+
+
+def parse_address(text: str) -> Tuple[List[str], Optional[str], str]:
+    """Split a typed address into street words, street type and normalized house number.
+
+    The house is the trailing run of tokens that start with a digit or are
+    house markers ('д', 'к1', 'стр'), so street names with numbers such as
+    '8 Марта' or '1-я Тверская-Ямская' stay in the street part.
+    """
+    tokens = tokenize(text)
+    split = len(tokens)
+    while split > 0 and _is_house_token(tokens[split - 1]):
+        split -= 1
+    # Одиночное число без названия улицы - это не номер дома
+    if split == 0:
+        split = len(tokens)
+    words, kind = _street_words(tokens[:split])
+    return words, kind, normalize_house(' '.join(tokens[split:]))
@@ -12,6 +12,7 @@ import json
 import logging
 from .osm_service import OSMService
 from .driver_location import DriverLocationService
+from .road_network import haversine_km
 
 logger = logging.getLogger(__name__)
 
@@ -121,15 +122,14 @@ class AnalyticsService:
             end_date = datetime.now()
             start_date = end_date - timedelta(days=7)
             
-            analytics = self.driver_service.get_driver_analytics(
-                driver_id, start_date
-            )
+            # Синхронные чтения: дашборд строят и из обработчиков с запущенным циклом событий
+            analytics = self.driver_service.driver_analytics(driver_id, start_date)
             
             if not analytics:
                 return {}
             
-            # График активности по часам
-            history = self.driver_service.get_driver_route_history(driver_id)
+            # График активности по часам - по траектории за неделю
+            history = self.driver_service.driver_trajectory(driver_id, start_date, end_date)
             df_history = pd.DataFrame(history)
             df_history['datetime'] = pd.to_datetime(df_history['timestamp'], unit='s')
             df_history['hour'] = df_history['datetime'].dt.hour
@@ -143,21 +143,15 @@ class AnalyticsService:
                 labels={'hour': 'Час', 'count': 'Количество обновлений локации'}
             )
             
-            # График скорости
-            speeds = []
-            for i in range(len(history)-1):
-                time_diff = history[i+1]['timestamp'] - history[i]['timestamp']
-                if time_diff > 0:
-                    distance = self.osm_service.calculate_distance(
-                        history[i], history[i+1]
-                    )
-                    speed = (distance / time_diff) * 3600  # км/ч
-                    speeds.append({
-                        'timestamp': history[i]['timestamp'],
-                        'speed': speed
-                    })
-            
-            df_speeds = pd.DataFrame(speeds)
+            # График скорости: точек за неделю много, считаем векторно
+            lats, lons = df_history['lat'].to_numpy(), df_history['lon'].to_numpy()
+            time_diff = np.diff(df_history['timestamp'].to_numpy())
+            distance = haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:])
+            moving = time_diff > 0
+            df_speeds = pd.DataFrame({
+                'timestamp': df_history['timestamp'].to_numpy()[:-1][moving],
+                'speed': distance[moving] / time_diff[moving] * 3600  # км/ч
+            })
             df_speeds['datetime'] = pd.to_datetime(df_speeds['timestamp'], unit='s')
             fig_speed = px.line(
                 df_speeds,
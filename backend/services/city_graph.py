@@ -0,0 +1,218 @@
+import os
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from .road_network import RoadNetwork
+from .contraction import ContractionHierarchy, hierarchy_path
+from .address_index import AddressIndex, address_index_path
+from .speed_table import SpeedTable, speed_table_path
+from .tile_cache import TileCache
+from .city_registry import City, city_registry
+
+logger = logging.getLogger(__name__)
+
+# Дальше этого расстояния от дороги название улицы не подставляется, метры
+STREET_MAX_DISTANCE_M = 150.0
+
+_tile_cache = None
+_tile_cache_lock = threading.Lock()
+
+
+def _load_city_network(city: City) -> Optional[RoadNetwork]:
+    path = city.network_path
+    if not os.path.exists(path):
+        logger.error(f"City network {path} not found, build it with "
+                     f"'python -m backend.services.graph_builder'")
+        return None
+    try:
+        network = RoadNetwork.load(path)
+        logger.info(f"City network {city.name} {network.version} mapped from {path}: "
+                    f"{network.node_count} nodes, {network.edge_count} edges")
+        _apply_speed_table(network, speed_table_path(path))
+        return network
+    except Exception as e:
+        logger.error(f"Error loading city network: {str(e)}")
+        return None
+
+
+def _apply_speed_table(network: RoadNetwork, path: str):
+    """Replace default speed profiles with ones learned from driver traces, if available"""
+    if not os.path.exists(path):
+        return
+    try:
+        table = SpeedTable.load(path)
+        if table.network_version != network.version:
+            logger.warning(f"Speed table {path} was learned for network "
+                           f"{table.network_version}, not {network.version}; ignoring it")
+            return
+        profiles, edge_profile = table.to_profiles(network)
+        network.set_speed_profiles(profiles, edge_profile)
+        logger.info(f"Speed profiles from {path}: {table.observations} observations, "
+                    f"{len(profiles)} profiles")
+    except Exception as e:
+        logger.error(f"Error loading speed table: {str(e)}")
+
+
+def get_city_network(city: City = None) -> Optional[RoadNetwork]:
+    """Get the drive network of a city (default city if not given), mapped on first use"""
+    city = city or city_registry.default
+    return city_registry.resource(city, 'network', lambda: _load_city_network(city))
+
+
+def _load_city_hierarchy(city: City, weight: str) -> Optional[ContractionHierarchy]:
+    network = get_city_network(city)
+    path = hierarchy_path(city.network_path, weight)
+    if network is None or not os.path.exists(path):
+        logger.warning(f"Contraction hierarchy {path} not found, routing falls back to Dijkstra")
+        return None
+    try:
+        hierarchy = ContractionHierarchy.load(path)
+    except Exception as e:
+        logger.error(f"Error loading contraction hierarchy: {str(e)}")
+        return None
+    if hierarchy.network_version != network.version:
+        logger.warning(f"Contraction hierarchy {path} was built for network "
+                       f"{hierarchy.network_version}, not {network.version}; ignoring it")
+        return None
+    return hierarchy
+
+
+def get_city_hierarchy(weight: str = 'time', city: City = None) -> Optional[ContractionHierarchy]:
+    """Get the contraction hierarchy of a city network for 'time' or 'length'"""
+    city = city or city_registry.default
+    return city_registry.resource(city, f'ch:{weight}', lambda: _load_city_hierarchy(city, weight))
+
+
+def hierarchy_for(network: RoadNetwork, weight: str = 'time') -> Optional[ContractionHierarchy]:
+    """Hierarchy of the city whose network this is; None for tile networks"""
+    for city in city_registry.cities.values():
+        loaded = city_registry.loaded(city, 'network')
+        if loaded is not None and loaded.version == network.version:
+            return get_city_hierarchy(weight, city)
+    return None
+
+
+def _load_city_addresses(path: str) -> Optional[AddressIndex]:
+    if not os.path.exists(path):
+        logger.warning(f"Address index {path} not found, addresses fall back to street names")
+        return None
+    try:
+        addresses = AddressIndex.load(path)
+        logger.info(f"Address index mapped from {path}: {addresses.count} addresses")
+        return addresses
+    except Exception as e:
+        logger.error(f"Error loading address index: {str(e)}")
+        return None
+
+
+def get_city_addresses(city: City = None) -> Optional[AddressIndex]:
+    """Get the address index of a city (default city if not given), mapped on first use"""
+    city = city or city_registry.default
+    path = address_index_path(city.network_path)
+    return city_registry.resource(city, 'addresses', lambda: _load_city_addresses(path))
+
+
+def reverse_geocode(lat: float, lon: float, network: RoadNetwork = None) -> str:
+    """Address of a point from local data only.
+
+    Nearest house address from the address index, otherwise the name of the
+    nearest street, otherwise the coordinates themselves.
+    """
+    try:
+        city = city_registry.city_for(lat, lon)
+        addresses = get_city_addresses(city) if city else None
+        if addresses is not None:
+            found = addresses.reverse(lat, lon)
+            if found:
+                return found['address']
+
+        if network is None and city:
+            network = get_city_network(city)
+        if network is not None:
+            snapped = network.snap_edge(lat, lon)
+            street = network.street_name(snapped['edge'])
+            if street and snapped['distance'] <= STREET_MAX_DISTANCE_M:
+                return street
+    except Exception as e:
+        logger.error(f"Error reverse geocoding point: {str(e)}")
+    return f'{lat:.5f}, {lon:.5f}'
+
+
+def geocode_address(query: str, city: City = None) -> Optional[Dict]:
+    """Coordinates of a typed city address from the local address index, or None.
+
+    Only a house found without fuzzy matching is returned: a similar street
+    or the centre of a street would be a confidently wrong point, so such
+    queries are left to Nominatim (suggest_addresses still offers them).
+    """
+    addresses = get_city_addresses(city)
+    if addresses is None:
+        return None
+    try:
+        found = addresses.geocode(query)
+    except Exception as e:
+        logger.error(f"Error geocoding address locally: {str(e)}")
+        return None
+    if found is None or found['precision'] != 'house' or found['match'] == 'fuzzy':
+        return None
+    return found
+
+
+def suggest_addresses(query: str, limit: int = 5, city: City = None) -> List[Dict]:
+    """As-you-type address suggestions from the local address index of a city"""
+    addresses = get_city_addresses(city)
+    if addresses is None or not query.strip():
+        return []
+    try:
+        return addresses.search(query, limit)
+    except Exception as e:
+        logger.error(f"Error suggesting addresses: {str(e)}")
+        return []
+
+
+def is_in_city(lat: float, lon: float, city_bounds: Dict = None) -> bool:
+    """Check if point is covered by a city graph (or lies within ``city_bounds``)"""
+    if city_bounds is None:
+        return city_registry.city_for(lat, lon) is not None
+    return (city_bounds['south'] <= lat <= city_bounds['north'] and
+            city_bounds['west'] <= lon <= city_bounds['east'])
+
+
+def get_tile_cache() -> TileCache:
+    """Tile cache of road networks outside the city graph, shared by the process"""
+    global _tile_cache
+    if _tile_cache is None:
+        with _tile_cache_lock:
+            if _tile_cache is None:
+                _tile_cache = TileCache()
+    return _tile_cache
+
+
+def get_bbox_network(bbox: Tuple[float, float, float, float],
+                     speed_limits: Dict[str, int] = None) -> Optional[RoadNetwork]:
+    """Street network for (min_lat, min_lon, max_lat, max_lon) stitched from cached tiles"""
+    try:
+        tile_cache = get_tile_cache()
+        return tile_cache.network_for(tile_cache.tiles_for_bbox(bbox), speed_limits)
+    except Exception as e:
+        logger.error(f"Error creating graph: {str(e)}")
+        return None
+
+
+def get_route_network(origin: Tuple[float, float], destination: Tuple[float, float],
+                      speed_limits: Dict[str, int] = None,
+                      buffer_deg: float = 0.02) -> Optional[RoadNetwork]:
+    """Get network for a trip: the network of the pickup city, or tiles along the trip outside it"""
+    city = city_registry.city_for(*origin)
+    if city is not None and city.contains(*destination):
+        network = get_city_network(city)
+        if network is not None:
+            return network
+
+    try:
+        tile_cache = get_tile_cache()
+        return tile_cache.network_for(tile_cache.tiles_for_trip(origin, destination, buffer_deg),
+                                      speed_limits)
+    except Exception as e:
+        logger.error(f"Error creating graph: {str(e)}")
+        return None
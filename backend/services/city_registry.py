@@ -0,0 +1,183 @@
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# Отсутствующий или не загрузившийся артефакт города повторно пробуется через, секунды
+MISSING_RETRY_SECONDS = 60.0
+
+
+def _contains(bounds: Dict, lat: float, lon: float) -> bool:
+    return (bounds['south'] <= lat <= bounds['north'] and
+            bounds['west'] <= lon <= bounds['east'])
+
+
+def _nbytes(value) -> int:
+    """Bytes of the arrays of a loaded artifact (network, hierarchy, address index)"""
+    arrays = getattr(value, 'arrays', None)
+    return sum(array.nbytes for array in arrays.values()) if arrays else 0
+
+
+class City:
+    """A served city: bounds, road network artifact, fare zone and Redis key namespace.
+
+    The contraction hierarchies, address index and speed table live next to
+    ``network_path`` (city.rnet -> city.time.ch, city.addr, city.speeds).
+    The fare zone, where city per-km rates apply, defaults to the bounds.
+    """
+
+    def __init__(self, name: str, bounds: Dict, network_path: str,
+                 fare_zone: Dict = None, redis_prefix: str = None):
+        self.name = name
+        self.bounds = bounds
+        self.network_path = network_path
+        self.fare_zone = fare_zone or bounds
+        self.redis_prefix = redis_prefix if redis_prefix is not None else f'{name}:'
+
+    @property
+    def area(self) -> float:
+        return ((self.bounds['north'] - self.bounds['south']) *
+                (self.bounds['east'] - self.bounds['west']))
+
+    def contains(self, lat: float, lon: float) -> bool:
+        return _contains(self.bounds, lat, lon)
+
+    def in_fare_zone(self, lat: float, lon: float) -> bool:
+        return _contains(self.fare_zone, lat, lon)
+
+    def key(self, name: str) -> str:
+        """Redis key in the city namespace"""
+        return f'{self.redis_prefix}{name}'
+
+    def __repr__(self) -> str:
+        return f'City({self.name!r})'
+
+
+def load_cities(path: str = None) -> List[City]:
+    """Cities from CITIES_FILE, or the single city of CITY_BOUNDS / OSM_CITY_NETWORK_PATH / FARE_ZONE.
+
+    The file is a JSON list of ``{"name", "bounds", "network_path",
+    "fare_zone"?, "redis_prefix"?}``; the first city is the default one.
+    """
+    path = path if path is not None else Config.CITIES_FILE
+    if not path:
+        # Один город со старыми ключами Redis без префикса
+        return [City('default', Config.CITY_BOUNDS, Config.OSM_CITY_NETWORK_PATH,
+                     fare_zone=Config.FARE_ZONE, redis_prefix='')]
+    with open(path) as f:
+        return [
+            City(item['name'], item['bounds'], item['network_path'],
+                 item.get('fare_zone'), item.get('redis_prefix'))
+            for item in json.load(f)
+        ]
+
+
+class CityRegistry:
+    """Served cities and their lazily loaded artifacts under a shared memory budget.
+
+    Artifacts (network, hierarchies, address index) are loaded per city on
+    first use through ``resource``. Loading runs outside the registry lock,
+    one loader per artifact, so a cold city does not block lookups of
+    loaded ones. A loader returning None (artifact missing or broken) is
+    retried after ``retry_seconds``. When the mapped arrays of all loaded
+    cities exceed ``memory_bytes``, the least recently used cities other
+    than the one being loaded are unloaded; callers holding references keep
+    working with them.
+    """
+
+    def __init__(self, cities: List[City], memory_bytes: int = None, retry_seconds: float = None):
+        if not cities:
+            raise ValueError('At least one city is required')
+        self.cities = OrderedDict((city.name, city) for city in cities)
+        self.default = cities[0]
+        self.memory_bytes = (memory_bytes if memory_bytes is not None
+                             else Config.CITY_MEMORY_MB * 1024 * 1024)
+        self.retry_seconds = retry_seconds if retry_seconds is not None else MISSING_RETRY_SECONDS
+        self._loaded = OrderedDict()
+        self._sizes = {}
+        self._loading = {}
+        self._missing = {}
+        self._lock = threading.RLock()
+        self._stats = {'loads': 0, 'unloads': 0, 'missing': 0}
+
+    @classmethod
+    def from_config(cls) -> 'CityRegistry':
+        return cls(load_cities())
+
+    def city_for(self, lat: float, lon: float) -> Optional[City]:
+        """City containing a point; the smallest one if cities overlap"""
+        found = [city for city in self.cities.values() if city.contains(lat, lon)]
+        return min(found, key=lambda city: city.area) if found else None
+
+    def get(self, name: str) -> Optional[City]:
+        return self.cities.get(name)
+
+    def _cached(self, city: City, name: str):
+        """Loaded artifact, marking the city as recently used; caller holds the lock"""
+        state = self._loaded.get(city.name)
+        if state is not None and name in state:
+            self._loaded.move_to_end(city.name)
+            return state[name]
+        return None
+
+    def resource(self, city: City, name: str, loader: Callable):
+        """Artifact ``name`` of a city, loaded once with ``loader()``; None if it is unavailable"""
+        key = (city.name, name)
+        with self._lock:
+            value = self._cached(city, name)
+            if value is not None:
+                return value
+            guard = self._loading.setdefault(key, threading.Lock())
+
+        # Загрузка вне общей блокировки: ждут только запросы того же артефакта
+        with guard:
+            with self._lock:
+                value = self._cached(city, name)
+                if value is not None or time.monotonic() < self._missing.get(key, 0.0):
+                    return value
+            value = loader()
+            with self._lock:
+                if value is None:
+                    self._missing[key] = time.monotonic() + self.retry_seconds
+                    self._stats['missing'] += 1
+                    return None
+                self._missing.pop(key, None)
+                self._loaded.setdefault(city.name, {})[name] = value
+                self._loaded.move_to_end(city.name)
+                self._sizes[city.name] = self._sizes.get(city.name, 0) + _nbytes(value)
+                self._stats['loads'] += 1
+                self._enforce_budget(keep=city.name)
+                return value
+
+    def loaded(self, city: City, name: str):
+        """Already loaded artifact of a city without loading it"""
+        with self._lock:
+            return self._loaded.get(city.name, {}).get(name)
+
+    def _enforce_budget(self, keep: str):
+        while sum(self._sizes.values()) > self.memory_bytes:
+            cold = next((name for name in self._loaded if name != keep), None)
+            if cold is None:
+                break
+            self.unload(cold)
+
+    def unload(self, name: str):
+        with self._lock:
+            if self._loaded.pop(name, None) is not None:
+                freed = self._sizes.pop(name, 0)
+                self._stats['unloads'] += 1
+                logger.info(f"City {name} unloaded, {freed // (1024 * 1024)} MB released")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, loaded={name: self._sizes.get(name, 0) for name in self._loaded},
+                        memory_bytes=sum(self._sizes.values()))
+
+
+# Города процесса: артефакты загружаются по первому обращению
+city_registry = CityRegistry.from_config()
@@ -0,0 +1,374 @@
+import os
+import heapq
+import logging
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from .road_network import RoadNetwork, load_arrays, save_arrays
+
+logger = logging.getLogger(__name__)
+
+# Ограничение witness-поиска при контракции: больше узлов - меньше лишних шорткатов
+WITNESS_SETTLE_LIMIT = 200
+
+
+def hierarchy_path(network_path: str, weight: str) -> str:
+    """Artifact path of the hierarchy built for a network file: city.rnet -> city.time.ch"""
+    return f'{os.path.splitext(network_path)[0]}.{weight}.ch'
+
+
+class ContractionHierarchy:
+    """Contraction hierarchy over a RoadNetwork for one edge weighting.
+
+    Every CH edge is either an original network edge (``ch_edge >= 0``) or a
+    shortcut made of two CH edges ``ch_child1`` and ``ch_child2``. Queries run
+    a bidirectional Dijkstra on the upward graphs: ``fwd_*`` arrays hold edges
+    to higher-ranked heads grouped by tail, ``bwd_*`` arrays hold edges from
+    higher-ranked tails grouped by head. Paths are unpacked to original edge
+    ids, so geometry and totals come from the RoadNetwork as with Dijkstra.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict = None, buffer=None):
+        self.arrays = arrays
+        self.meta = meta or {}
+        self._buffer = buffer
+        self._levels = None
+        self._last_distances = None
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @property
+    def weight(self) -> str:
+        return self.meta.get('weight', 'time')
+
+    @property
+    def network_version(self) -> str:
+        return self.meta.get('network_version', '')
+
+    @classmethod
+    def build(cls, network: RoadNetwork, weight: str = 'time',
+              settle_limit: int = WITNESS_SETTLE_LIMIT) -> 'ContractionHierarchy':
+        """Contract all nodes in edge-difference order (offline, minutes for a city)"""
+        started = time.perf_counter()
+        node_count = network.node_count
+        edge_weights = network.edge_weights(weight).tolist()
+
+        ch_tail, ch_head, ch_weight = [], [], []
+        ch_child1, ch_child2, ch_edge = [], [], []
+        out_adj = [{} for _ in range(node_count)]
+        in_adj = [{} for _ in range(node_count)]
+
+        def add_edge(u, v, w, child1, child2, edge):
+            current = out_adj[u].get(v)
+            if current is not None and ch_weight[current] <= w:
+                return
+            out_adj[u][v] = in_adj[v][u] = len(ch_weight)
+            ch_tail.append(u)
+            ch_head.append(v)
+            ch_weight.append(w)
+            ch_child1.append(child1)
+            ch_child2.append(child2)
+            ch_edge.append(edge)
+
+        for edge, (u, v) in enumerate(zip(network.edge_tail.tolist(), network.edge_head.tolist())):
+            if u != v:
+                add_edge(u, v, edge_weights[edge], -1, -1, edge)
+
+        def witness_dist(source, excluded, max_cost, targets):
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            remaining = set(targets)
+            settled = 0
+            while heap and remaining and settled < settle_limit:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                if d > max_cost:
+                    break
+                settled += 1
+                remaining.discard(u)
+                for x, eid in out_adj[u].items():
+                    if x == excluded:
+                        continue
+                    nd = d + ch_weight[eid]
+                    if nd < dist.get(x, float('inf')):
+                        dist[x] = nd
+                        heapq.heappush(heap, (nd, x))
+            return dist
+
+        def shortcuts(v):
+            """Shortcuts (u, x, weight, edge u->v, edge v->x) required to contract v"""
+            needed = []
+            outgoing = list(out_adj[v].items())
+            if not outgoing:
+                return needed
+            for u, in_eid in in_adj[v].items():
+                w_in = ch_weight[in_eid]
+                targets = {x: w_in + ch_weight[eid] for x, eid in outgoing if x != u}
+                if not targets:
+                    continue
+                dist = witness_dist(u, v, max(targets.values()), targets)
+                for x, via in targets.items():
+                    if dist.get(x, float('inf')) > via:
+                        needed.append((u, x, via, in_eid, out_adj[v][x]))
+            return needed
+
+        contracted_neighbors = [0] * node_count
+        level = [0] * node_count
+
+        def priority(v):
+            return (len(shortcuts(v)) - len(in_adj[v]) - len(out_adj[v])
+                    + contracted_neighbors[v] + level[v])
+
+        heap = [(priority(v), v) for v in range(node_count)]
+        heapq.heapify(heap)
+        rank = np.full(node_count, -1, dtype=np.int32)
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if rank[v] >= 0:
+                continue
+            # Ленивое обновление приоритета
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            for u, x, w, in_eid, out_eid in shortcuts(v):
+                add_edge(u, x, w, in_eid, out_eid, -1)
+            neighbors = set(in_adj[v]) | set(out_adj[v])
+            for u in in_adj[v]:
+                del out_adj[u][v]
+            for x in out_adj[v]:
+                del in_adj[x][v]
+            out_adj[v] = {}
+            in_adj[v] = {}
+            rank[v] = order
+            order += 1
+            for u in neighbors:
+                contracted_neighbors[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+
+        hierarchy = cls._from_edges(
+            rank, ch_tail, ch_head, ch_weight, ch_child1, ch_child2, ch_edge,
+            {'weight': weight, 'network_version': network.version}
+        )
+        logger.info(f"Contraction hierarchy ({weight}) built in "
+                    f"{time.perf_counter() - started:.1f}s: {network.edge_count} edges, "
+                    f"{len(ch_weight) - network.edge_count} shortcuts")
+        return hierarchy
+
+    @classmethod
+    def _from_edges(cls, rank, ch_tail, ch_head, ch_weight, ch_child1, ch_child2,
+                    ch_edge, meta) -> 'ContractionHierarchy':
+        node_count = len(rank)
+        ch_tail = np.asarray(ch_tail, dtype=np.int32)
+        ch_head = np.asarray(ch_head, dtype=np.int32)
+        ch_weight = np.asarray(ch_weight, dtype=np.float64)
+
+        arrays = {
+            'rank': rank,
+            'ch_tail': ch_tail,
+            'ch_head': ch_head,
+            'ch_child1': np.asarray(ch_child1, dtype=np.int32),
+            'ch_child2': np.asarray(ch_child2, dtype=np.int32),
+            'ch_edge': np.asarray(ch_edge, dtype=np.int32)
+        }
+        # Восходящие рёбра для прямого и обратного поиска, уложенные подряд по узлам
+        for prefix, upward, group, other in (
+                ('fwd', rank[ch_head] > rank[ch_tail], ch_tail, ch_head),
+                ('bwd', rank[ch_tail] > rank[ch_head], ch_head, ch_tail)):
+            ids = np.flatnonzero(upward)
+            ids = ids[np.argsort(group[ids], kind='stable')]
+            indptr = np.zeros(node_count + 1, dtype=np.int64)
+            np.cumsum(np.bincount(group[ids], minlength=node_count), out=indptr[1:])
+            arrays[f'{prefix}_indptr'] = indptr
+            arrays[f'{prefix}_node'] = other[ids]
+            arrays[f'{prefix}_weight'] = ch_weight[ids]
+            arrays[f'{prefix}_edge'] = ids.astype(np.int32)
+        return cls(arrays, meta)
+
+    def save(self, path: str) -> str:
+        self.meta = save_arrays(path, self.arrays, dict(self.meta, kind='ch'))
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'ContractionHierarchy':
+        arrays, meta, buffer = load_arrays(path)
+        if meta.get('kind') != 'ch':
+            raise ValueError(f'{path} is not a contraction hierarchy file')
+        return cls(arrays, meta, buffer)
+
+    def query(self, source, target) -> Optional[Dict]:
+        """Shortest path as original edge ids: ``{'edges', 'cost', 'settled', 'source', 'target'}``.
+
+        ``source`` and ``target`` are node ids or ``{node: initial distance}``
+        for points snapped between nodes. Returns None when unreachable.
+        """
+        sources = source if isinstance(source, dict) else {source: 0.0}
+        targets = target if isinstance(target, dict) else {target: 0.0}
+        if not isinstance(source, dict) and source == target:
+            return {'edges': [], 'cost': 0.0, 'settled': 0, 'source': source, 'target': target}
+
+        indptrs = (self.fwd_indptr, self.bwd_indptr)
+        nodes = (self.fwd_node, self.bwd_node)
+        weights = (self.fwd_weight, self.bwd_weight)
+        edge_ids = (self.fwd_edge, self.bwd_edge)
+        dists = (dict(sources), dict(targets))
+        preds = ({}, {})
+        heaps = ([(d, v) for v, d in sources.items()], [(d, v) for v, d in targets.items()])
+        for heap in heaps:
+            heapq.heapify(heap)
+        settled = (set(), set())
+        best = float('inf')
+        meet = None
+
+        while heaps[0] or heaps[1]:
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            heap = heaps[side]
+            d, u = heapq.heappop(heap)
+            if d >= best:
+                # Эта сторона больше не может улучшить ответ
+                heap.clear()
+                continue
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+            other = dists[1 - side].get(u)
+            if other is not None and d + other < best:
+                best = d + other
+                meet = u
+
+            dist = dists[side]
+            pred = preds[side]
+            # Stall-on-demand: узел достижим короче через более высокий узел,
+            # значит его рёбра не нужно раскрывать
+            start, end = int(indptrs[1 - side][u]), int(indptrs[1 - side][u + 1])
+            if start != end and any(
+                    dist.get(x, float('inf')) + w < d
+                    for x, w in zip(nodes[1 - side][start:end].tolist(),
+                                    weights[1 - side][start:end].tolist())):
+                continue
+
+            start, end = int(indptrs[side][u]), int(indptrs[side][u + 1])
+            if start == end:
+                continue
+            for v, w, eid in zip(nodes[side][start:end].tolist(),
+                                 weights[side][start:end].tolist(),
+                                 edge_ids[side][start:end].tolist()):
+                nd = d + w
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    pred[v] = eid
+                    heapq.heappush(heap, (nd, v))
+
+        if meet is None:
+            return None
+
+        ch_path = []
+        node = meet
+        while node in preds[0]:
+            eid = preds[0][node]
+            ch_path.append(eid)
+            node = int(self.ch_tail[eid])
+        start_node = node
+        ch_path.reverse()
+        node = meet
+        while node in preds[1]:
+            eid = preds[1][node]
+            ch_path.append(eid)
+            node = int(self.ch_head[eid])
+
+        return {
+            'edges': self.unpack(ch_path),
+            'cost': best,
+            'settled': len(settled[0]) + len(settled[1]),
+            'source': start_node,
+            'target': node
+        }
+
+    def _sweep_levels(self) -> List[tuple]:
+        """Upward edges grouped for the downward sweep of :meth:`distances_to`, built once per process.
+
+        A node's level is one above the highest level of its upward neighbours
+        (0 for nodes without upward edges), so nodes of one level depend only
+        on lower levels. Every entry holds the level's tails, the offsets of
+        their edge groups, heads and weights.
+        """
+        if self._levels is not None:
+            return self._levels
+        node_count = len(self.rank)
+        tails = np.repeat(np.arange(node_count, dtype=np.int32), np.diff(self.fwd_indptr))
+        heads = self.fwd_node
+        level = np.zeros(node_count, dtype=np.int32)
+        while True:
+            updated = np.zeros(node_count, dtype=np.int32)
+            np.maximum.at(updated, tails, level[heads] + 1)
+            if np.array_equal(updated, level):
+                break
+            level = updated
+
+        order = np.argsort(level[tails], kind='stable')
+        bounds = np.searchsorted(level[tails][order], np.arange(1, int(level.max()) + 2))
+        levels = []
+        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            edges = order[start:end]
+            level_tails = tails[edges]
+            groups = np.flatnonzero(np.r_[True, level_tails[1:] != level_tails[:-1]])
+            levels.append((level_tails[groups], groups, heads[edges], self.fwd_weight[edges]))
+        self._levels = levels
+        return levels
+
+    def distances_to(self, target) -> np.ndarray:
+        """Exact distances from every node to ``target`` in this weighting (PHAST).
+
+        A backward upward search from ``target`` (a node id or ``{node: initial
+        distance}``) gives the downward part of every path; one sweep over
+        the upward edges level by level in NumPy adds the upward part.
+        Unreachable nodes get ``inf``. Used as an A* potential when the search
+        runs over weights the hierarchy was not built for; the last result is
+        kept, so alternatives to the same target reuse it.
+        """
+        targets = target if isinstance(target, dict) else {target: 0.0}
+        key = tuple(sorted(targets.items()))
+        last = self._last_distances
+        if last is not None and last[0] == key:
+            return last[1]
+        down = dict(targets)
+        heap = [(d, v) for v, d in targets.items()]
+        heapq.heapify(heap)
+        settled = set()
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            start, end = int(self.bwd_indptr[u]), int(self.bwd_indptr[u + 1])
+            for v, w in zip(self.bwd_node[start:end].tolist(), self.bwd_weight[start:end].tolist()):
+                nd = d + w
+                if nd < down.get(v, float('inf')):
+                    down[v] = nd
+                    heapq.heappush(heap, (nd, v))
+
+        distances = np.full(len(self.rank), np.inf)
+        distances[list(down)] = list(down.values())
+        for tails, groups, heads, weights in self._sweep_levels():
+            upward = np.minimum.reduceat(weights + distances[heads], groups)
+            distances[tails] = np.minimum(distances[tails], upward)
+        distances.flags.writeable = False
+        self._last_distances = (key, distances)
+        return distances
+
+    def unpack(self, ch_path: List[int]) -> List[int]:
+        """Expand CH edges (shortcuts) into original network edge ids"""
+        edges = []
+        stack = list(reversed(ch_path))
+        while stack:
+            eid = stack.pop()
+            child1 = int(self.ch_child1[eid])
+            if child1 < 0:
+                edges.append(int(self.ch_edge[eid]))
+            else:
+                stack.append(int(self.ch_child2[eid]))
+                stack.append(child1)
+        return edges
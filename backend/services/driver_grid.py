@@ -0,0 +1,217 @@
+import math
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from ..config import Config
+from .city_registry import City, city_registry
+from .hex_grid import HexGrid
+
+logger = logging.getLogger(__name__)
+
+# Поток событий локаций водителей (пишут скрипты driver_location), общий для городов
+DRIVER_EVENTS_KEY = 'driver_events'
+# Примерная длина потока: индекс, отставший сильнее, перечитывает снимок
+DRIVER_EVENTS_MAXLEN = 100000
+# Событий за одно чтение потока; полная пачка значит, что индекс отстаёт
+EVENTS_BATCH = 1000
+
+Candidate = Tuple[int, float, Tuple[float, float], str]
+
+
+class DriverGrid:
+    """Available drivers of one city bucketed by hex cells of ``grid``.
+
+    Queries walk rings of cells outward from the query point and stop once
+    the ``limit``-th nearest driver is closer than any cell not yet visited,
+    so a search costs a few dict lookups instead of a Redis round trip.
+    Distances are planar in the grid's local meters.
+    """
+
+    def __init__(self, grid: HexGrid):
+        self.grid = grid
+        self._cells = {}
+        self._drivers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._drivers)
+
+    def upsert(self, driver_id: int, lat: float, lon: float, car_type: str):
+        cell = self.grid.cell(lat, lon)
+        with self._lock:
+            previous = self._drivers.get(driver_id)
+            if previous is not None and previous[0] != cell:
+                self._discard(driver_id, previous[0])
+            self._drivers[driver_id] = (cell, lat, lon, car_type)
+            self._cells.setdefault(cell, {})[driver_id] = (lat, lon, car_type)
+
+    def remove(self, driver_id: int):
+        with self._lock:
+            previous = self._drivers.pop(driver_id, None)
+            if previous is not None:
+                self._discard(driver_id, previous[0])
+
+    def _discard(self, driver_id: int, cell: int):
+        """Remove a driver from a cell; caller holds the lock"""
+        drivers = self._cells.get(cell)
+        if drivers is not None:
+            drivers.pop(driver_id, None)
+            if not drivers:
+                del self._cells[cell]
+
+    def ring(self, lat: float, lon: float, k: int) -> List[Candidate]:
+        """Drivers in cells within ``k`` rings of the point's cell, nearest first"""
+        center = self.grid.cell(lat, lon)
+        found = []
+        with self._lock:
+            for distance in range(k + 1):
+                self._collect(center, distance, lat, lon, None, found)
+        found.sort()
+        return [(driver_id, km, (driver_lon, driver_lat), car_type)
+                for km, driver_id, driver_lon, driver_lat, car_type in found]
+
+    def nearest(self, lat: float, lon: float, limit: int,
+                max_distance: Dict[str, float]) -> List[Candidate]:
+        """Up to ``limit`` nearest drivers as (driver_id, distance_km, (lon, lat), car_type).
+
+        Only car types in ``max_distance`` are returned, each within its
+        distance (km).
+        """
+        if not max_distance:
+            return []
+        size = self.grid.size
+        # Точка на расстоянии d лежит в ячейке не дальше (d + 2 * size) / (1.5 * size) колец
+        max_rings = int(math.ceil((max(max_distance.values()) * 1000 + 2 * size) / (1.5 * size)))
+        center = self.grid.cell(lat, lon)
+        found = []
+        with self._lock:
+            for k in range(max_rings + 1):
+                self._collect(center, k, lat, lon, max_distance, found)
+                if len(found) >= limit:
+                    found.sort()
+                    # Все точки ближе covered уже просмотрены
+                    covered = (1.5 * size * k - 2 * size) / 1000
+                    if found[limit - 1][0] <= covered:
+                        break
+        found.sort()
+        return [(driver_id, km, (driver_lon, driver_lat), car_type)
+                for km, driver_id, driver_lon, driver_lat, car_type in found[:limit]]
+
+    def _collect(self, center: int, k: int, lat: float, lon: float,
+                 max_distance: Optional[Dict[str, float]], found: List):
+        """Append (km, driver_id, lon, lat, car_type) of drivers in ring ``k``; caller holds the lock"""
+        kx, ky = self.grid.kx, self.grid.ky
+        for cell in self.grid.ring(center, k):
+            drivers = self._cells.get(cell)
+            if not drivers:
+                continue
+            for driver_id, (driver_lat, driver_lon, car_type) in drivers.items():
+                km = math.hypot((driver_lon - lon) * kx, (driver_lat - lat) * ky) / 1000
+                if max_distance is not None and km > max_distance.get(car_type, -1):
+                    continue
+                found.append((km, driver_id, driver_lon, driver_lat, car_type))
+
+
+class DriverIndex:
+    """Process-local DriverGrid of every city, kept in sync with Redis.
+
+    The index starts from a snapshot of the available-driver geo sets and
+    then applies the events that the location and sweeper scripts append
+    to the DRIVER_EVENTS_KEY stream in the same atomic step as their
+    writes. ``start`` follows the stream in a daemon thread. If the index
+    falls behind further than the stream keeps, it reloads the snapshot.
+    """
+
+    def __init__(self, redis_client, car_types: List[str], cell_m: float = None):
+        self.redis = redis_client
+        self.car_types = list(car_types)
+        self.cell_m = cell_m or Config.DRIVER_GRID_CELL_M
+        self.grids = {
+            city.name: DriverGrid(HexGrid.for_city(self.cell_m, city))
+            for city in city_registry.cities.values()
+        }
+        self._driver_city = {}
+        self._last_id = '0-0'
+        self._thread = None
+        self._stats = {'events': 0, 'reloads': 0}
+
+    def grid_for(self, city: City) -> DriverGrid:
+        return self.grids[city.name]
+
+    def load(self):
+        """Rebuild the grids from the available-driver geo sets"""
+        # Позиция потока до снимка: события после неё повторно применяются к снимку
+        last = self.redis.xrevrange(DRIVER_EVENTS_KEY, count=1)
+        last_id = last[0][0].decode() if last else '0-0'
+        grids = {name: DriverGrid(grid.grid) for name, grid in self.grids.items()}
+        driver_city = {}
+        for city in city_registry.cities.values():
+            for car_type in self.car_types:
+                key = city.key(f'drivers_available:{car_type}')
+                members = self.redis.zrange(key, 0, -1)
+                if not members:
+                    continue
+                for member, position in zip(members, self.redis.geopos(key, *members)):
+                    if position is None:
+                        continue
+                    driver_id = int(member.decode().split(':')[1])
+                    grids[city.name].upsert(driver_id, position[1], position[0], car_type)
+                    driver_city[driver_id] = city.name
+        self.grids, self._driver_city, self._last_id = grids, driver_city, last_id
+        self._stats['reloads'] += 1
+        logger.info(f"Driver index loaded: {len(driver_city)} available drivers")
+
+    def apply(self, fields: Dict[bytes, bytes]):
+        """Apply one stream event: op=set (available driver with city, lat, lon, car_type),
+        op=busy (a ping of a driver who is not available) or op=del (swept driver)"""
+        driver_id = int(fields[b'driver'].decode().split(':')[1])
+        previous = self._driver_city.pop(driver_id, None)
+        city = fields[b'city'].decode() if fields[b'op'] == b'set' else None
+        if previous is not None and previous != city:
+            self.grids[previous].remove(driver_id)
+        if city in self.grids:
+            self.grids[city].upsert(driver_id, float(fields[b'lat']), float(fields[b'lon']),
+                                    fields[b'car_type'].decode())
+            self._driver_city[driver_id] = city
+        self._stats['events'] += 1
+
+    def sync(self, block_ms: int = None) -> int:
+        """Apply new stream events, waiting up to ``block_ms`` for them; returns the number applied"""
+        response = self.redis.xread({DRIVER_EVENTS_KEY: self._last_id}, count=EVENTS_BATCH,
+                                    block=block_ms)
+        events = response[0][1] if response else []
+        if len(events) == EVENTS_BATCH:
+            # Отстаём: если нужные события уже вытеснены из потока - перечитываем снимок
+            first = self.redis.xrange(DRIVER_EVENTS_KEY, count=1)
+            if first and stream_id(first[0][0].decode()) > stream_id(self._last_id):
+                self.load()
+                return 0
+        for event_id, fields in events:
+            self.apply(fields)
+            self._last_id = event_id.decode()
+        return len(events)
+
+    def _follow(self):
+        while True:
+            try:
+                self.sync(block_ms=1000)
+            except Exception as e:
+                logger.error(f"Error syncing driver index: {str(e)}")
+                time.sleep(1.0)
+
+    def start(self):
+        """Load the snapshot and follow the stream in a daemon thread (once per process)"""
+        if self._thread is None:
+            self.load()
+            self._thread = threading.Thread(target=self._follow, name='driver-index', daemon=True)
+            self._thread.start()
+
+    def get_stats(self) -> Dict:
+        return dict(self._stats, last_id=self._last_id,
+                    drivers={name: len(grid) for name, grid in self.grids.items()})
+
+
+def stream_id(value: str) -> Tuple[int, int]:
+    milliseconds, sequence = value.split('-')
+    return int(milliseconds), int(sequence)
@@ -1,18 +1,84 @@
 from datetime import datetime, timedelta
 import redis
+from redis.exceptions import NoScriptError
 import json
 import logging
-from typing import List, Dict, Optional
-from geopy.distance import geodesic
+import hashlib
+import threading
+from typing import List, Dict, Optional, Tuple
 import numpy as np
 from ..config import Config
 from .osm_service import OSMService
+from .city_registry import city_registry
+from .driver_grid import DRIVER_EVENTS_KEY, DRIVER_EVENTS_MAXLEN, DriverIndex
+from .road_network import haversine_km
+from .trajectory_store import TrajectoryStore
 
 logger = logging.getLogger(__name__)
 
+# Обновление локации одной атомарной командой: KEYS - гео-индекс города, информация
+# и история водителя, гео-индекс свободных водителей его типа авто в городе, время
+# последней локации водителей города, поток событий для DriverIndex, индексы водителя
+# (хэш: гео-индекс, время последней локации и индекс свободных, где он сейчас);
+# ARGV - участник, lon, lat, срок информации, информация, точка истории, размер
+# истории, 1 если водитель свободен, тип авто, город, длина потока, время локации.
+# Из прежних индексов водитель удаляется, только если они сменились (другой город,
+# тип авто или статус), - запись на локацию не растёт с числом городов и типов авто.
+# Время последней локации - по часам Redis, как и срок информации. Каждая локация
+# попадает в поток (set - свободный водитель, busy - остальные): по нему обновляются
+# DriverIndex и хранилище траекторий
+UPDATE_LOCATION_SCRIPT = """
+local previous = redis.call('HMGET', KEYS[7], 'locations', 'last_seen', 'available')
+if previous[1] and previous[1] ~= KEYS[1] then
+    redis.call('ZREM', previous[1], ARGV[1])
+    redis.call('ZREM', previous[2], ARGV[1])
+end
+local available = ''
+if ARGV[8] == '1' then
+    available = KEYS[4]
+end
+if previous[3] and previous[3] ~= '' and previous[3] ~= available then
+    redis.call('ZREM', previous[3], ARGV[1])
+end
+redis.call('HSET', KEYS[7], 'locations', KEYS[1], 'last_seen', KEYS[5], 'available', available)
+redis.call('EXPIRE', KEYS[7], ARGV[4])
+redis.call('GEOADD', KEYS[1], ARGV[2], ARGV[3], ARGV[1])
+redis.call('ZADD', KEYS[5], redis.call('TIME')[1], ARGV[1])
+local op = 'busy'
+if available ~= '' then
+    redis.call('GEOADD', available, ARGV[2], ARGV[3], ARGV[1])
+    op = 'set'
+end
+redis.call('XADD', KEYS[6], 'MAXLEN', '~', ARGV[11], '*', 'op', op, 'driver', ARGV[1],
+           'city', ARGV[10], 'lat', ARGV[3], 'lon', ARGV[2], 'car_type', ARGV[9], 'ts', ARGV[12])
+redis.call('SETEX', KEYS[2], ARGV[4], ARGV[5])
+redis.call('LPUSH', KEYS[3], ARGV[6])
+redis.call('LTRIM', KEYS[3], 0, tonumber(ARGV[7]) - 1)
+return 1
+"""
+UPDATE_LOCATION_SHA = hashlib.sha1(UPDATE_LOCATION_SCRIPT.encode()).hexdigest()
+
+# Удаление пачки водителей без локаций дольше ARGV[1] секунд: KEYS[1] - поток событий,
+# KEYS[2] - время последней локации водителей города, KEYS[3..] - его гео-индексы;
+# ARGV[2] - размер пачки, ARGV[3] - длина потока. Возвращает число удалённых
+SWEEP_STALE_SCRIPT = """
+local cutoff = tonumber(redis.call('TIME')[1]) - tonumber(ARGV[1])
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', cutoff, 'LIMIT', 0, ARGV[2])
+if #stale == 0 then
+    return 0
+end
+for i = 2, #KEYS do
+    redis.call('ZREM', KEYS[i], unpack(stale))
+end
+for _, member in ipairs(stale) do
+    redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[3], '*', 'op', 'del', 'driver', member)
+end
+return #stale
+"""
+
 class DriverLocationService:
-    def __init__(self):
-        self.redis = redis.Redis(
+    def __init__(self, redis_client=None):
+        self.redis = redis_client or redis.Redis(
             host=Config.REDIS_HOST,
             port=Config.REDIS_PORT,
             db=Config.REDIS_DB,
@@ -24,109 +90,313 @@ class DriverLocationService:
         self.LOCATION_EXPIRE = 300  # 5 минут
         self.LOCATION_HISTORY_SIZE = 10
         self.MAX_SEARCH_RADIUS = 10  # км
+        # Поиск свободных водителей начинается с этого радиуса и удваивается до
+        # нужного числа водителей; из каждого индекса берётся не больше limit * OVERFETCH
+        self.SEARCH_START_RADIUS = 1  # км
+        self.SEARCH_OVERFETCH = 2
+        # Кандидатов для проверки по изохроне - не больше
+        self.MAX_ISOCHRONE_CANDIDATES = 200
+        # Водителей за один проход сборщика устаревших (ограничено стеком Lua)
+        self.SWEEP_BATCH_SIZE = 500
+        self._sweep_script = self.redis.register_script(SWEEP_STALE_SCRIPT)
+        # Индекс свободных водителей в памяти процесса, создаётся при первом поиске по нему
+        self.driver_index = None
+        self._driver_index_lock = threading.Lock()
+        # Траектории за прошлые дни (пишет trajectory_store из потока событий)
+        self.trajectories = TrajectoryStore()
+        # max_eta - максимальное время подачи по дорогам (минуты) для поиска по изохроне
         self.DRIVER_TYPES = {
-            'economy': {'max_distance': 3, 'speed': 30},
-            'comfort': {'max_distance': 5, 'speed': 35},
-            'business': {'max_distance': 7, 'speed': 40}
+            'economy': {'max_distance': 3, 'speed': 30, 'max_eta': 6},
+            'comfort': {'max_distance': 5, 'speed': 35, 'max_eta': 9},
+            'business': {'max_distance': 7, 'speed': 40, 'max_eta': 11}
         }
 
     async def update_driver_location(self, driver_id: int, lat: float, lon: float, 
                                    status: str = 'available', car_type: str = 'economy') -> bool:
-        """Обновить местоположение водителя"""
+        """Обновить местоположение водителя (один запрос к Redis)"""
         try:
+            # Полный трек пишет в хранилище траекторий trajectory_store из потока событий
             timestamp = datetime.now().timestamp()
-            location_data = {
-                'driver_id': driver_id,
-                'lat': lat,
-                'lon': lon,
-                'status': status,
-                'car_type': car_type,
-                'timestamp': timestamp
-            }
-            
-            # Сохраняем текущую локацию
-            self.redis.geoadd(
-                'driver_locations',
-                [lon, lat, f'driver:{driver_id}']
-            )
-            
-            # Сохраняем детальную информацию о водителе
-            self.redis.setex(
-                f'driver_info:{driver_id}',
-                self.LOCATION_EXPIRE,
-                json.dumps(location_data)
-            )
-            
-            # Добавляем в историю перемещений
-            history_key = f'driver_history:{driver_id}'
-            self.redis.lpush(history_key, json.dumps({
-                'lat': lat,
-                'lon': lon,
-                'timestamp': timestamp
-            }))
-            self.redis.ltrim(history_key, 0, self.LOCATION_HISTORY_SIZE - 1)
-            
+            self._execute_updates([
+                self._location_update(driver_id, lat, lon, status, car_type, timestamp)
+            ])
             return True
         except Exception as e:
             logger.error(f"Error updating driver location: {str(e)}")
             return False
 
+    async def update_driver_locations(self, batch: List[Dict]) -> Optional[int]:
+        """Обновить местоположения пачки водителей за один запрос к Redis
+
+        batch: [{'driver_id', 'lat', 'lon', 'status'?, 'car_type'?, 'timestamp'?}];
+        некорректные записи пропускаются. Возвращает число принятых, None при ошибке Redis.
+        """
+        try:
+            now = datetime.now().timestamp()
+            updates = []
+            for ping in batch:
+                try:
+                    driver_id = int(ping['driver_id'])
+                    lat, lon = float(ping['lat']), float(ping['lon'])
+                    timestamp = float(ping.get('timestamp') or now)
+                except (KeyError, TypeError, ValueError):
+                    logger.warning(f"Skipping malformed driver location: {ping}")
+                    continue
+                updates.append(self._location_update(
+                    driver_id, lat, lon, ping.get('status', 'available'),
+                    ping.get('car_type', 'economy'), timestamp
+                ))
+            
+            if updates:
+                self._execute_updates(updates)
+            return len(updates)
+        except Exception as e:
+            logger.error(f"Error updating driver locations: {str(e)}")
+            return None
+
+    def _location_update(self, driver_id: int, lat: float, lon: float, status: str,
+                         car_type: str, timestamp: float) -> Tuple[List[str], List]:
+        """Keys and arguments of UPDATE_LOCATION_SCRIPT for one ping"""
+        city = self._city_for(lat, lon)
+        location_data = {
+            'driver_id': driver_id,
+            'lat': lat,
+            'lon': lon,
+            'status': status,
+            'car_type': car_type,
+            'city': city.name,
+            'timestamp': timestamp
+        }
+        keys = [city.key('driver_locations'), f'driver_info:{driver_id}',
+                f'driver_history:{driver_id}', self._available_key(city, car_type),
+                city.key('drivers_last_seen'), DRIVER_EVENTS_KEY, f'driver_keys:{driver_id}']
+        args = [f'driver:{driver_id}', lon, lat, self.LOCATION_EXPIRE, json.dumps(location_data),
+                json.dumps({'lat': lat, 'lon': lon, 'timestamp': timestamp}),
+                self.LOCATION_HISTORY_SIZE, 1 if status == 'available' else 0,
+                car_type, city.name, DRIVER_EVENTS_MAXLEN, timestamp]
+        return keys, args
+
+    @staticmethod
+    def _available_key(city, car_type: str) -> str:
+        """Geo set of available drivers of a car type in a city"""
+        return city.key(f'drivers_available:{car_type}')
+
+    def _execute_updates(self, updates: List[Tuple[List[str], List]]):
+        """Run location updates as one pipeline of EVALSHA calls (one round trip)"""
+        for attempt in range(2):
+            pipe = self.redis.pipeline(transaction=False)
+            for keys, args in updates:
+                pipe.evalsha(UPDATE_LOCATION_SHA, len(keys), *keys, *args)
+            try:
+                return pipe.execute()
+            except NoScriptError:
+                # Кэш скриптов пуст (перезапуск Redis, SCRIPT FLUSH): загружаем и повторяем.
+                # Без скрипта не выполнилась ни одна команда пачки
+                if attempt:
+                    raise
+                self.redis.script_load(UPDATE_LOCATION_SCRIPT)
+
+    def sweep_stale_drivers(self) -> int:
+        """Удалить из гео-индексов водителей, не присылавших локацию дольше LOCATION_EXPIRE
+
+        Удаляет пачками по SWEEP_BATCH_SIZE, каждая пачка - одна атомарная команда,
+        поэтому водитель, приславший локацию во время прохода, не удаляется.
+        Возвращает число удалённых.
+        """
+        removed = 0
+        try:
+            for city in city_registry.cities.values():
+                keys = [DRIVER_EVENTS_KEY, city.key('drivers_last_seen'), city.key('driver_locations')]
+                keys += [self._available_key(city, car_type) for car_type in self.DRIVER_TYPES]
+                while True:
+                    count = self._sweep_script(keys=keys,
+                                               args=[self.LOCATION_EXPIRE, self.SWEEP_BATCH_SIZE,
+                                                     DRIVER_EVENTS_MAXLEN])
+                    removed += count
+                    if count < self.SWEEP_BATCH_SIZE:
+                        break
+            if removed:
+                logger.info(f"Removed {removed} stale drivers from geo sets")
+        except Exception as e:
+            logger.error(f"Error sweeping stale drivers: {str(e)}")
+        return removed
+
+    def get_presence_stats(self) -> Dict:
+        """Размеры гео-индексов и число водителей на связи по городам"""
+        try:
+            # Время последней локации - по часам Redis, граница считается по ним же
+            cutoff = self.redis.time()[0] - self.LOCATION_EXPIRE
+            pipe = self.redis.pipeline(transaction=False)
+            for city in city_registry.cities.values():
+                pipe.zcard(city.key('driver_locations'))
+                pipe.zcount(city.key('drivers_last_seen'), cutoff, '+inf')
+                for car_type in self.DRIVER_TYPES:
+                    pipe.zcard(self._available_key(city, car_type))
+            counts = iter(pipe.execute())
+            
+            stats = {}
+            for city in city_registry.cities.values():
+                geo_set_size, live = next(counts), next(counts)
+                stats[city.name] = {
+                    'geo_set_size': geo_set_size,
+                    'live_drivers': live,
+                    'stale_drivers': max(geo_set_size - live, 0),
+                    'available': {car_type: next(counts) for car_type in self.DRIVER_TYPES}
+                }
+            return stats
+        except Exception as e:
+            logger.error(f"Error getting driver presence stats: {str(e)}")
+            return {}
+
+    @staticmethod
+    def _city_for(lat: float, lon: float):
+        """City of a point; points outside all cities belong to the default one"""
+        return city_registry.city_for(lat, lon) or city_registry.default
+
     async def find_nearest_drivers(self, lat: float, lon: float, radius: float = 5.0,
-                                 car_type: str = None, limit: int = 10) -> List[Dict]:
-        """Найти ближайших водителей с учетом типа автомобиля и радиуса"""
+                                 car_type: str = None, limit: int = 10,
+                                 use_isochrone: bool = False, index: str = None) -> List[Dict]:
+        """Найти ближайших водителей с учетом типа автомобиля и радиуса
+
+        use_isochrone: отбирать по времени подачи по дорогам (max_eta типа авто)
+        из одной обратной изохроны от клиента, а не по прямой (max_distance)
+        index: 'redis' - гео-индексы Redis, 'grid' - индекс в памяти процесса
+        (DriverIndex, без обращений к Redis); по умолчанию Config.DRIVER_INDEX
+        """
         try:
-            # Получаем всех водителей в радиусе
-            drivers = self.redis.georadius(
-                'driver_locations',
-                lon, lat,
-                radius,
-                unit='km',
-                withcoord=True,
-                withdist=True,
-                sort='ASC'
-            )
+            search = (self._grid_available if (index or Config.DRIVER_INDEX) == 'grid'
+                      else self._search_available)
+            if use_isochrone:
+                candidates = search(lat, lon, radius, car_type, self.MAX_ISOCHRONE_CANDIDATES,
+                                    by_max_distance=False)
+                return await self._filter_by_isochrone(lat, lon, candidates, limit)
+            
+            # Свободные водители нужного типа в пределах max_distance, по расстоянию
+            drivers = search(lat, lon, radius, car_type, limit)
             
             result = []
-            for driver in drivers[:limit]:
-                driver_id = driver[0].decode('utf-8').split(':')[1]
-                distance = driver[2]  # в километрах
-                driver_lon, driver_lat = driver[1]
+            for driver_id, distance, (driver_lon, driver_lat), driver_car_type in drivers:
+                # Рассчитываем примерное время прибытия
+                speed = self.DRIVER_TYPES[driver_car_type]['speed']
+                eta_minutes = (distance / speed) * 60
                 
-                # Получаем информацию о водителе
-                info = self.redis.get(f'driver_info:{driver_id}')
-                if info:
-                    driver_info = json.loads(info)
-                    
-                    # Фильтруем по типу автомобиля если указан
-                    if car_type and driver_info['car_type'] != car_type:
-                        continue
-                        
-                    # Проверяем статус и максимальную дистанцию для типа авто
-                    if (driver_info['status'] == 'available' and
-                        distance <= self.DRIVER_TYPES[driver_info['car_type']]['max_distance']):
-                        
-                        # Рассчитываем примерное время прибытия
-                        speed = self.DRIVER_TYPES[driver_info['car_type']]['speed']
-                        eta_minutes = (distance / speed) * 60
-                        
-                        result.append({
-                            'driver_id': int(driver_id),
-                            'distance': round(distance, 2),
-                            'eta_minutes': round(eta_minutes),
-                            'car_type': driver_info['car_type'],
-                            'location': {
-                                'lat': driver_lat,
-                                'lon': driver_lon
-                            }
-                        })
+                result.append({
+                    'driver_id': driver_id,
+                    'distance': round(distance, 2),
+                    'eta_minutes': round(eta_minutes),
+                    'car_type': driver_car_type,
+                    'location': {
+                        'lat': driver_lat,
+                        'lon': driver_lon
+                    }
+                })
             
             return result
         except Exception as e:
             logger.error(f"Error finding nearest drivers: {str(e)}")
             return []
 
+    def _search_available(self, lat: float, lon: float, radius: float, car_type: Optional[str],
+                          limit: int, by_max_distance: bool = True) -> List[Tuple]:
+        """Up to ``limit`` nearest available drivers as (driver_id, distance_km, (lon, lat), car_type).
+
+        Searches the per-car-type geo sets of available drivers in the city of
+        the point, starting at SEARCH_START_RADIUS and doubling up to ``radius``
+        (capped by max_distance of each car type) until ``limit`` drivers
+        qualify. Each round is one pipeline of GEOSEARCH calls and one MGET of
+        driver info, which drops drivers whose info has expired.
+        """
+        city = self._city_for(lat, lon)
+        car_types = [car_type] if car_type else list(self.DRIVER_TYPES)
+        max_radius = {
+            driver_type: min(radius, self.DRIVER_TYPES[driver_type]['max_distance'])
+            if by_max_distance else radius
+            for driver_type in car_types
+        }
+        search_radius = min(self.SEARCH_START_RADIUS, max(max_radius.values()))
+        count = limit * self.SEARCH_OVERFETCH
+        while True:
+            pipe = self.redis.pipeline(transaction=False)
+            for driver_type in car_types:
+                pipe.geosearch(self._available_key(city, driver_type), longitude=lon, latitude=lat,
+                               radius=min(search_radius, max_radius[driver_type]), unit='km',
+                               sort='ASC', count=count, withdist=True, withcoord=True)
+            found = sorted(
+                ((member, distance, coord, driver_type)
+                 for driver_type, members in zip(car_types, pipe.execute())
+                 for member, distance, coord in members),
+                key=lambda candidate: candidate[1]
+            )
+            
+            drivers = []
+            infos = self.redis.mget([f'driver_info:{member.decode().split(":")[1]}'
+                                     for member, _, _, _ in found]) if found else []
+            for (member, distance, coord, driver_type), info in zip(found, infos):
+                # Информация истекла - водитель давно не присылал локацию
+                if not info or json.loads(info)['status'] != 'available':
+                    continue
+                drivers.append((int(member.decode().split(':')[1]), distance, tuple(coord), driver_type))
+            
+            if len(drivers) >= limit or search_radius >= max(max_radius.values()):
+                return drivers[:limit]
+            search_radius = min(search_radius * 2, max(max_radius.values()))
+
+    def _grid_available(self, lat: float, lon: float, radius: float, car_type: Optional[str],
+                        limit: int, by_max_distance: bool = True) -> List[Tuple]:
+        """Same as _search_available, answered by the in-process DriverIndex"""
+        if self.driver_index is None:
+            with self._driver_index_lock:
+                if self.driver_index is None:
+                    index = DriverIndex(self.redis, list(self.DRIVER_TYPES))
+                    index.start()
+                    self.driver_index = index
+        car_types = [car_type] if car_type else list(self.DRIVER_TYPES)
+        max_distance = {
+            driver_type: min(radius, self.DRIVER_TYPES[driver_type]['max_distance'])
+            if by_max_distance else radius
+            for driver_type in car_types
+        }
+        grid = self.driver_index.grid_for(self._city_for(lat, lon))
+        return grid.nearest(lat, lon, limit, max_distance)
+
+    async def _filter_by_isochrone(self, lat: float, lon: float, candidates: List[Tuple],
+                                   limit: int) -> List[Dict]:
+        """Available drivers whose road ETA fits max_eta of their car type, by ETA"""
+        if not candidates:
+            return []
+
+        # Одна изохрона на самое большое время подачи среди типов кандидатов
+        max_eta = max(self.DRIVER_TYPES[candidate[3]]['max_eta'] for candidate in candidates)
+        isochrone = await self.osm_service.isochrone({'lat': lat, 'lon': lon}, max_eta, reverse=True)
+        if not isochrone:
+            return []
+        etas = await self.osm_service.isochrone_etas(
+            isochrone, [{'lat': coord[1], 'lon': coord[0]} for _, _, coord, _ in candidates]
+        )
+
+        result = []
+        for (driver_id, distance, (driver_lon, driver_lat), driver_car_type), eta in zip(candidates, etas):
+            if eta is None or eta > self.DRIVER_TYPES[driver_car_type]['max_eta']:
+                continue
+            result.append({
+                'driver_id': driver_id,
+                'distance': round(distance, 2),
+                'eta_minutes': round(eta),
+                'car_type': driver_car_type,
+                'location': {
+                    'lat': driver_lat,
+                    'lon': driver_lon
+                }
+            })
+        result.sort(key=lambda driver: driver['eta_minutes'])
+        return result[:limit]
+
     async def get_driver_route_history(self, driver_id: int) -> List[Dict]:
         """Получить историю маршрута водителя"""
+        return self.driver_route_history(driver_id)
+
+    def driver_route_history(self, driver_id: int) -> List[Dict]:
+        """Последние точки водителя из Redis, по времени (синхронно)"""
         try:
             history_key = f'driver_history:{driver_id}'
             history = self.redis.lrange(history_key, 0, -1)
@@ -157,74 +427,101 @@ class DriverLocationService:
             if not nearest_drivers:
                 return None
             
-            best_driver = None
-            min_total_time = float('inf')
-            
-            for driver in nearest_drivers:
-                # Рассчитываем маршрут от водителя до клиента
-                pickup_route = await self.osm_service.calculate_routes(
-                    {'lat': driver['location']['lat'], 'lon': driver['location']['lon']},
-                    {'lat': customer_lat, 'lon': customer_lon}
-                )
-                
-                if not pickup_route:
-                    continue
-                
-                # Рассчитываем маршрут от клиента до места назначения
-                destination_route = await self.osm_service.calculate_routes(
-                    {'lat': customer_lat, 'lon': customer_lon},
-                    {'lat': destination_lat, 'lon': destination_lon}
+            # Маршрут клиент -> назначение одинаков для всех водителей
+            destination_route = await self.osm_service.calculate_routes(
+                {'lat': customer_lat, 'lon': customer_lon},
+                {'lat': destination_lat, 'lon': destination_lon},
+                alternatives=1
+            )
+
+            if not destination_route:
+                return None
+
+            # Время подачи всех кандидатов одним обратным поиском от клиента
+            pickup_etas = await self.osm_service.calculate_pickup_etas(
+                {'lat': customer_lat, 'lon': customer_lon},
+                [driver['location'] for driver in nearest_drivers]
+            )
+
+            candidates = [
+                (eta, driver) for eta, driver in zip(pickup_etas, nearest_drivers)
+                if eta is not None
+            ]
+            if not candidates:
+                return None
+            _, driver = min(candidates, key=lambda candidate: candidate[0])
+
+            # Полный маршрут подачи строим только для выбранного водителя
+            pickup_route = await self.osm_service.calculate_routes(
+                {'lat': driver['location']['lat'], 'lon': driver['location']['lon']},
+                {'lat': customer_lat, 'lon': customer_lon},
+                alternatives=1
+            )
+
+            if not pickup_route:
+                return None
+
+            # Общее время поездки (подача + маршрут до назначения)
+            total_time = pickup_route[0]['duration'] + destination_route[0]['duration']
+
+            best_driver = {
+                **driver,
+                'pickup_route': pickup_route[0],
+                'destination_route': destination_route[0],
+                'total_time': round(total_time),
+                'total_distance': round(
+                    pickup_route[0]['distance'] + destination_route[0]['distance'],
+                    2
                 )
-                
-                if not destination_route:
-                    continue
-                
-                # Общее время поездки (подача + маршрут до назначения)
-                total_time = pickup_route[0]['duration'] + destination_route[0]['duration']
-                
-                if total_time < min_total_time:
-                    min_total_time = total_time
-                    best_driver = {
-                        **driver,
-                        'pickup_route': pickup_route[0],
-                        'destination_route': destination_route[0],
-                        'total_time': round(total_time),
-                        'total_distance': round(
-                            pickup_route[0]['distance'] + destination_route[0]['distance'],
-                            2
-                        )
-                    }
-            
+            }
+
             return best_driver
         except Exception as e:
             logger.error(f"Error calculating optimal driver: {str(e)}")
             return None
 
+    async def get_driver_trajectory(self, driver_id: int, start_date: datetime,
+                                    end_date: datetime = None) -> List[Dict]:
+        """Получить точки водителя за период: хранилище траекторий и свежая история Redis"""
+        return self.driver_trajectory(driver_id, start_date, end_date)
+
+    def driver_trajectory(self, driver_id: int, start_date: datetime,
+                          end_date: datetime = None) -> List[Dict]:
+        """То же, что get_driver_trajectory, синхронно (дашборды, отчёты)"""
+        try:
+            timestamps, lats, lons = self.trajectories.read(driver_id, start_date, end_date)
+            points = [{'lat': lat, 'lon': lon, 'timestamp': ts}
+                      for ts, lat, lon in zip(timestamps.tolist(), lats.tolist(), lons.tolist())]
+            
+            # Последние точки ещё не записаны в хранилище
+            stored_until = points[-1]['timestamp'] if points else start_date.timestamp()
+            end = (end_date or datetime.now()).timestamp()
+            points += [p for p in self.driver_route_history(driver_id)
+                       if stored_until < p['timestamp'] <= end]
+            return points
+        except Exception as e:
+            logger.error(f"Error getting driver trajectory: {str(e)}")
+            return []
+
     async def get_driver_analytics(self, driver_id: int, 
                                  start_date: datetime = None) -> Dict:
         """Получить аналитику по водителю"""
+        return self.driver_analytics(driver_id, start_date)
+
+    def driver_analytics(self, driver_id: int, start_date: datetime = None) -> Dict:
+        """То же, что get_driver_analytics, синхронно (дашборды, отчёты)"""
         try:
             if not start_date:
                 start_date = datetime.now() - timedelta(days=1)
                 
-            history = await self.get_driver_route_history(driver_id)
-            if not history:
-                return {}
-                
-            # Фильтруем точки по дате
-            points = [p for p in history if datetime.fromtimestamp(p['timestamp']) >= start_date]
+            points = self.driver_trajectory(driver_id, start_date)
             if len(points) < 2:
                 return {}
                 
             # Рассчитываем пройденное расстояние
-            total_distance = 0
-            for i in range(len(points) - 1):
-                p1 = points[i]
-                p2 = points[i + 1]
-                total_distance += geodesic(
-                    (p1['lat'], p1['lon']),
-                    (p2['lat'], p2['lon'])
-                ).kilometers
+            lats = np.array([p['lat'] for p in points])
+            lons = np.array([p['lon'] for p in points])
+            total_distance = float(haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:]).sum())
                 
             # Рассчитываем среднюю скорость
             time_diff = points[-1]['timestamp'] - points[0]['timestamp']
@@ -0,0 +1,43 @@
+import sys
+import time
+import logging
+import argparse
+from ..config import Config
+from .driver_location import DriverLocationService
+
+logger = logging.getLogger(__name__)
+
+
+def run(service: DriverLocationService, interval: float):
+    """Sweep stale drivers every ``interval`` seconds until interrupted"""
+    logger.info(f"Driver sweeper started, every {interval:.0f}s, "
+                f"drivers expire after {service.LOCATION_EXPIRE}s")
+    while True:
+        started = time.monotonic()
+        service.sweep_stale_drivers()
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Remove drivers without recent locations from the driver geo sets'
+    )
+    parser.add_argument('--interval', type=float, default=Config.DRIVER_SWEEP_INTERVAL,
+                        help='seconds between sweeps (default: %(default)s)')
+    parser.add_argument('--once', action='store_true', help='sweep once and exit')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+
+    service = DriverLocationService()
+    if args.once:
+        print(service.sweep_stale_drivers())
+        return 0
+    try:
+        run(service, args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
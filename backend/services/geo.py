@@ -1,37 +1,42 @@
-import osmnx as ox
-from geopy.geocoders import Nominatim
+from .city_graph import geocode_address, get_route_network, hierarchy_for, reverse_geocode
+from .city_registry import city_registry
+from .osm_service import geocoding_client, routing_pool, run_search
+from .polyline import line_geometry, route_points
+from .routing import path_coordinates, path_total, shortest_path, snap_endpoint
 from geopy.distance import geodesic
 import folium
 import math
+import asyncio
 import logging
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-# Initialize geocoder with longer timeout
-geocoder = Nominatim(user_agent='taximore', timeout=10)
-
-def get_coordinates(address):
-    """Get coordinates from address"""
+def get_coordinates(address, near=None):
+    """Get coordinates from address, looked up in the city of the ``near`` (lat, lon) point"""
+    # City addresses come from the local address index without a network call
+    city = city_registry.city_for(*near) if near else None
+    local = geocode_address(address, city)
+    if local:
+        return {'lat': local['lat'], 'lon': local['lon'], 'address': local['address']}
+
+    # Nominatim is shared with the backend: one cache and one rate limit for all processes
+    return geocoding_client.geocode(address)
+
+async def calculate_route(origin, destination, engine=None, geometry='coordinates', tolerance=None):
+    """Calculate route between two points using OSM
+
+    Addresses are geocoded in a thread and the search runs in the routing
+    daemon or pool, so the caller's event loop is never blocked.
+    engine: 'ch', 'astar' or 'dijkstra' (default Config.ROUTING_ENGINE)
+    geometry: 'coordinates', 'polyline' or 'array'; tolerance simplifies the line (meters)
+    """
     try:
-        location = geocoder.geocode(address)
-        if location:
-            return {
-                'lat': location.latitude,
-                'lon': location.longitude,
-                'address': location.address
-            }
-        return None
-    except Exception as e:
-        logger.error(f"Error geocoding address: {str(e)}")
-        return None
+        loop = asyncio.get_running_loop()
 
-async def calculate_route(origin, destination):
-    """Calculate route between two points using OSM"""
-    try:
         # Convert addresses to coordinates if needed
         if isinstance(origin, str):
-            origin_loc = get_coordinates(origin)
+            origin_loc = await loop.run_in_executor(None, get_coordinates, origin)
             if not origin_loc:
                 return None
             origin = (origin_loc['lat'], origin_loc['lon'])
@@ -39,73 +44,71 @@ async def calculate_route(origin, destination):
             origin = (origin['lat'], origin['lon'])
 
         if isinstance(destination, str):
-            dest_loc = get_coordinates(destination)
+            # The destination is looked up in the pickup city first
+            dest_loc = await loop.run_in_executor(None, get_coordinates, destination, origin)
             if not dest_loc:
                 return None
             destination = (dest_loc['lat'], dest_loc['lon'])
         elif isinstance(destination, dict):
             destination = (destination['lat'], destination['lon'])
 
-        # Calculate the bounding box that encompasses both points
-        min_lat = min(origin[0], destination[0])
-        max_lat = max(origin[0], destination[0])
-        min_lon = min(origin[1], destination[1])
-        max_lon = max(origin[1], destination[1])
-
-        # Add a small buffer to the bounding box
-        buffer_deg = 0.02  # About 2km at most latitudes
-        bbox = [
-            min_lat - buffer_deg,
-            min_lon - buffer_deg,
-            max_lat + buffer_deg,
-            max_lon + buffer_deg
-        ]
-
-        # Get the street network within the bounding box
-        graph = ox.graph_from_bbox(
-            bbox[0], bbox[2], bbox[1], bbox[3],
-            network_type='drive',
-            simplify=True
-        )
-
-        # Find the nearest nodes to origin and destination
-        orig_node = ox.nearest_nodes(graph, origin[1], origin[0])
-        dest_node = ox.nearest_nodes(graph, destination[1], destination[0])
-
-        # Calculate the shortest path
-        route = ox.shortest_path(graph, orig_node, dest_node, weight='length')
-        
-        if not route:
-            return None
+        return await run_search(search_route, tuple(origin), tuple(destination),
+                                engine, geometry, tolerance)
 
-        # Calculate route details
-        edge_lengths = ox.utils_graph.get_route_edge_attributes(graph, route, 'length')
-        total_length = sum(edge_lengths) / 1000  # Convert to kilometers
+    except asyncio.TimeoutError:
+        logger.error(f"Route calculation timed out after {routing_pool.timeout}s")
+        return None
+    except Exception as e:
+        logger.error(f"Error calculating route: {str(e)}")
+        return None
 
-        # Get route coordinates
-        route_coords = [[graph.nodes[node]['y'], graph.nodes[node]['x']] for node in route]
+def search_route(origin, destination, engine, geometry, tolerance):
+    """Route of calculate_route between two (lat, lon) points (runs in the routing pool)"""
+    # Use the pickup city network (or tiles along the trip outside the city)
+    network = get_route_network(origin, destination)
+    if network is None:
+        return None
 
-        # Estimate duration (assuming average speed of 40 km/h in city)
-        duration_minutes = (total_length / 40) * 60
+    # Snap origin and destination onto the nearest edges
+    orig_snap = network.snap_edge(origin[0], origin[1])
+    dest_snap = network.snap_edge(destination[0], destination[1])
 
-        return {
-            'distance': total_length,
-            'duration': duration_minutes,
-            'start_location': {'lat': origin[0], 'lng': origin[1]},
-            'end_location': {'lat': destination[0], 'lng': destination[1]},
-            'route_coordinates': route_coords,
-            'start_address': geocoder.reverse((origin[0], origin[1])).address if isinstance(origin, tuple) else origin,
-            'end_address': geocoder.reverse((destination[0], destination[1])).address if isinstance(destination, tuple) else destination
-        }
+    # Calculate the shortest path
+    path = shortest_path(network, snap_endpoint(network, orig_snap, origin=True),
+                         snap_endpoint(network, dest_snap, origin=False), 'length',
+                         hierarchy_for(network, 'length'), engine)
 
-    except Exception as e:
-        logger.error(f"Error calculating route: {str(e)}")
+    if not path:
         return None
 
+    # Calculate route details
+    total_length = path_total(network, path, network.edge_length) / 1000  # Convert to kilometers
+
+    # Get route geometry in the requested format
+    route_geometry = line_geometry(path_coordinates(network, path, orig_snap, dest_snap),
+                                   geometry, tolerance)
+
+    # Estimate duration (assuming average speed of 40 km/h in city)
+    duration_minutes = (total_length / 40) * 60
+
+    return {
+        'distance': total_length,
+        'duration': duration_minutes,
+        'start_location': {'lat': origin[0], 'lng': origin[1]},
+        'end_location': {'lat': destination[0], 'lng': destination[1]},
+        **route_geometry,
+        'start_address': reverse_geocode(origin[0], origin[1], network),
+        'end_address': reverse_geocode(destination[0], destination[1], network)
+    }
+
 def generate_map(route):
     """Generate map with route"""
     try:
-        if not route or 'route_coordinates' not in route:
+        if not route:
+            return None
+        # Geometry may come as a list, an array or an encoded polyline
+        coordinates = route_points(route)
+        if not len(coordinates):
             return None
 
         # Create map centered at the midpoint of the route
@@ -129,7 +132,7 @@ def generate_map(route):
 
         # Add route line
         folium.PolyLine(
-            route['route_coordinates'],
+            coordinates,
             weight=3,
             color='blue',
             opacity=0.8
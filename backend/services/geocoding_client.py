@@ -0,0 +1,248 @@
+import re
+import json
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# Корзина токенов в Redis: одна на все процессы (gunicorn, боты). Токены
+# выдаются в долг, поэтому ожидающие обслуживаются в порядке обращения.
+# Возвращает время ожидания в миллисекундах или -1, если ждать дольше max_wait.
+TOKEN_BUCKET_LUA = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate / 1000) - 1
+local wait = 0
+if tokens < 0 then
+    wait = math.ceil(-tokens * 1000 / rate)
+    if wait > max_wait then
+        return -1
+    end
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst + 1) * 1000 / rate) + max_wait)
+return wait
+"""
+
+# Сохранённое в Redis значение для адреса, который геокодер не нашёл
+NOT_FOUND = 'null'
+
+
+def normalize_query(address: str) -> str:
+    """Cache key part of an address: lowercase with collapsed whitespace"""
+    return re.sub(r'\s+', ' ', address.strip().lower())
+
+
+class RedisTokenBucket:
+    """Rate limiter shared by all processes through a Redis token bucket.
+
+    Falls back to a per-process bucket with the same rate while Redis is
+    unavailable.
+    """
+
+    def __init__(self, redis_client, key: str, rate: float, burst: int = 1):
+        self.redis = redis_client
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self._script = redis_client.register_script(TOKEN_BUCKET_LUA)
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def acquire(self, max_wait: float) -> bool:
+        """Take a token, sleeping until it is due; False if that is longer than max_wait seconds"""
+        try:
+            wait_ms = int(self._script(keys=[self.key],
+                                       args=[self.rate, self.burst, int(max_wait * 1000)]))
+            wait = wait_ms / 1000 if wait_ms >= 0 else None
+        except Exception as e:
+            logger.error(f"Error acquiring geocoding rate limit: {str(e)}")
+            wait = self._acquire_local(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def _acquire_local(self, max_wait: float) -> Optional[float]:
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate) - 1
+            wait = max(0.0, -tokens / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens, self._updated = tokens, now
+            return wait
+
+
+class GeocodingClient:
+    """Remote geocoder (Nominatim) behind a Redis cache, single-flight and rate limit.
+
+    Concurrent lookups of one address share a single remote call: threads of
+    a process wait for the leader's result, other processes wait for it to
+    appear in Redis. Addresses the geocoder could not find are cached for
+    ``negative_ttl`` so they are not re-queried on every order.
+    """
+
+    def __init__(self, redis_client, geocoder, limiter: RedisTokenBucket = None,
+                 ttl: int = None, negative_ttl: int = None, max_wait: float = None,
+                 concurrency: int = None, prefix: str = 'geocode'):
+        self.redis = redis_client
+        self.geocoder = geocoder
+        self.ttl = ttl if ttl is not None else Config.GEOCODE_CACHE_TTL
+        self.negative_ttl = negative_ttl if negative_ttl is not None else Config.GEOCODE_NEGATIVE_TTL
+        self.max_wait = max_wait if max_wait is not None else Config.GEOCODE_MAX_WAIT
+        self.concurrency = concurrency or Config.GEOCODE_CONCURRENCY
+        self.prefix = prefix
+        self.limiter = limiter or RedisTokenBucket(
+            redis_client, f'{prefix}:ratelimit', Config.GEOCODE_RATE, Config.GEOCODE_BURST
+        )
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stats = {
+            'hits': 0, 'negative_hits': 0, 'misses': 0, 'coalesced': 0,
+            'remote_calls': 0, 'rate_limited': 0, 'errors': 0
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _read_cache(self, key: str):
+        """(found, value) from Redis; value is None for a cached 'not found'"""
+        try:
+            cached = self.redis.get(key)
+        except Exception as e:
+            logger.error(f"Error reading geocoding cache: {str(e)}")
+            return False, None
+        if cached is None:
+            return False, None
+        value = json.loads(cached)
+        self._count('hits' if value is not None else 'negative_hits')
+        return True, value
+
+    def geocode(self, address: str) -> Optional[Dict]:
+        """Coordinates of an address as {'lat', 'lon', 'address'} or None"""
+        query = normalize_query(address)
+        if not query:
+            return None
+        key = f'{self.prefix}:{query}'
+        found, value = self._read_cache(key)
+        if found:
+            return value
+
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = Future()
+            else:
+                self._stats['coalesced'] += 1
+        if not leader:
+            return call.result()
+
+        try:
+            result = self._lookup(key, address)
+        except Exception as e:
+            logger.error(f"Error geocoding address: {str(e)}")
+            result = None
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        call.set_result(result)
+        return result
+
+    def _lookup(self, key: str, address: str) -> Optional[Dict]:
+        # Тот же адрес уже запрашивает другой процесс - ждём его результат в Redis
+        lock_key = f'{key}:lock'
+        try:
+            owner = self.redis.set(lock_key, 1, nx=True, px=int((self.max_wait + 10) * 1000))
+        except Exception as e:
+            logger.error(f"Error locking geocoding lookup: {str(e)}")
+            owner = True
+        if not owner:
+            self._count('coalesced')
+            deadline = time.monotonic() + self.max_wait
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                found, value = self._read_cache(key)
+                if found:
+                    return value
+
+        self._count('misses')
+        try:
+            return self._remote_lookup(key, address)
+        finally:
+            if owner:
+                try:
+                    self.redis.delete(lock_key)
+                except Exception as e:
+                    logger.error(f"Error unlocking geocoding lookup: {str(e)}")
+
+    def _remote_lookup(self, key: str, address: str) -> Optional[Dict]:
+        if not self.limiter.acquire(self.max_wait):
+            # Лимит исчерпан - не кэшируем, адрес запросим в следующий раз
+            self._count('rate_limited')
+            return None
+
+        self._count('remote_calls')
+        try:
+            location = self.geocoder.geocode(address)
+        except Exception as e:
+            logger.error(f"Error geocoding address: {str(e)}")
+            self._count('errors')
+            return None
+
+        result = None
+        if location:
+            result = {
+                'lat': location.latitude,
+                'lon': location.longitude,
+                'address': location.address
+            }
+        try:
+            if result is not None:
+                self.redis.setex(key, self.ttl, json.dumps(result))
+            else:
+                self.redis.setex(key, self.negative_ttl, NOT_FOUND)
+        except Exception as e:
+            logger.error(f"Error writing geocoding cache: {str(e)}")
+        return result
+
+    async def geocode_many(self, addresses: List[str]) -> List[Optional[Dict]]:
+        """Geocode a batch of addresses with at most ``concurrency`` lookups at a time"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                        thread_name_prefix='geocode')
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def lookup(address: str) -> Optional[Dict]:
+            async with semaphore:
+                return await loop.run_in_executor(self._executor, self.geocode, address)
+
+        unique = list(dict.fromkeys(addresses))
+        results = await asyncio.gather(*(lookup(address) for address in unique))
+        by_address = dict(zip(unique, results))
+        return [by_address[address] for address in addresses]
+
+    def get_stats(self) -> Dict:
+        """Cache, coalescing and rate limit counters of this process"""
+        with self._lock:
+            return dict(self._stats, inflight=len(self._inflight))
@@ -0,0 +1,261 @@
+"""Offline builder for the road network artifact.
+
+Production processes only map the prebuilt file; graphs are never built on
+the request path. Run after updating the OSM extract::
+
+    python -m backend.services.graph_builder cache/osm/region.osm.pbf
+    python -m backend.services.graph_builder cache/osm/city.graphml -o cache/osm/city.rnet
+    python -m backend.services.graph_builder --download
+
+Contraction hierarchies for 'time' and 'length' are built next to the
+network (city.time.ch, city.length.ch) unless --skip-ch is given. Address
+points of .osm/.pbf extracts and downloads go to city.addr for the offline
+reverse geocoder unless --skip-addresses is given.
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+import osmnx as ox
+import networkx as nx
+from ..config import Config
+from .road_network import DEFAULT_SPEED_LIMITS, HIGHWAY_CLASSES, RoadNetwork
+from .speed_profiles import default_speed_profiles
+from .contraction import ContractionHierarchy, hierarchy_path
+from .address_index import AddressIndex, address_index_path
+from .city_registry import city_registry
+
+logger = logging.getLogger(__name__)
+
+BUILDER_VERSION = 1
+
+# Дороги, по которым не ездят автомобили (graph_from_xml не фильтрует по типу сети)
+NON_DRIVE_HIGHWAYS = {
+    'footway', 'pedestrian', 'path', 'steps', 'cycleway', 'bridleway',
+    'corridor', 'elevator', 'escalator', 'platform', 'proposed',
+    'construction', 'abandoned', 'raceway', 'bus_guideway', 'track'
+}
+
+
+def _is_drive_edge(data: Dict) -> bool:
+    highway = data.get('highway')
+    if isinstance(highway, list):
+        return any(h not in NON_DRIVE_HIGHWAYS for h in highway)
+    return highway is not None and highway not in NON_DRIVE_HIGHWAYS
+
+
+def _convert_pbf(path: str, workdir: str) -> str:
+    """Convert .osm.pbf to .osm XML with osmium-tool"""
+    if not shutil.which('osmium'):
+        raise RuntimeError('osmium-tool is required to read .osm.pbf extracts (apt install osmium-tool)')
+    xml_path = os.path.join(workdir, 'extract.osm')
+    subprocess.run(['osmium', 'cat', path, '-o', xml_path, '--overwrite'], check=True)
+    return xml_path
+
+
+def read_graph(path: str) -> nx.MultiDiGraph:
+    """Read a drive graph from .osm, .osm.pbf or GraphML"""
+    if path.endswith('.graphml'):
+        return ox.load_graphml(path)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if path.endswith('.pbf'):
+            path = _convert_pbf(path, workdir)
+        graph = ox.graph_from_xml(path, simplify=True, retain_all=False)
+
+    non_drive = [(u, v, k) for u, v, k, data in graph.edges(keys=True, data=True)
+                 if not _is_drive_edge(data)]
+    graph.remove_edges_from(non_drive)
+    graph.remove_nodes_from([node for node, degree in graph.degree() if degree == 0])
+    return graph
+
+
+def download_graph(bounds: Dict) -> nx.MultiDiGraph:
+    """Download the drive graph for bounds from Overpass"""
+    return ox.graph_from_bbox(
+        bounds['north'], bounds['south'], bounds['east'], bounds['west'],
+        network_type='drive',
+        simplify=True
+    )
+
+
+def _address_tags(element) -> Tuple[Optional[str], Optional[str]]:
+    tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+    return tags.get('addr:street'), tags.get('addr:housenumber')
+
+
+def read_addresses(path: str) -> Dict[str, list]:
+    """Address points (nodes and building centroids) from an .osm XML extract.
+
+    Two streaming passes: ways with addresses and their node ids first, then
+    coordinates of those nodes, so the whole extract is never held in memory.
+    """
+    addresses = {'lat': [], 'lon': [], 'street': [], 'housenumber': []}
+    ways = []
+    needed = set()
+    for _, element in ET.iterparse(path):
+        if element.tag == 'node':
+            street, housenumber = _address_tags(element)
+            if street and housenumber:
+                addresses['lat'].append(float(element.get('lat')))
+                addresses['lon'].append(float(element.get('lon')))
+                addresses['street'].append(street)
+                addresses['housenumber'].append(housenumber)
+            element.clear()
+        elif element.tag == 'way':
+            street, housenumber = _address_tags(element)
+            if street and housenumber:
+                refs = [int(nd.get('ref')) for nd in element.iter('nd')]
+                if len(refs) > 1 and refs[0] == refs[-1]:
+                    # Замкнутый контур здания: первая точка повторяется в конце
+                    refs.pop()
+                ways.append((refs, street, housenumber))
+                needed.update(refs)
+            element.clear()
+
+    coords = {}
+    for _, element in ET.iterparse(path):
+        if element.tag == 'node':
+            node_id = int(element.get('id'))
+            if node_id in needed:
+                coords[node_id] = (float(element.get('lat')), float(element.get('lon')))
+            element.clear()
+
+    for refs, street, housenumber in ways:
+        points = [coords[ref] for ref in refs if ref in coords]
+        if not points:
+            continue
+        addresses['lat'].append(sum(p[0] for p in points) / len(points))
+        addresses['lon'].append(sum(p[1] for p in points) / len(points))
+        addresses['street'].append(street)
+        addresses['housenumber'].append(housenumber)
+    return addresses
+
+
+def download_addresses(bounds: Dict) -> Dict[str, list]:
+    """Address points for bounds from Overpass"""
+    features = ox.features_from_bbox(
+        bounds['north'], bounds['south'], bounds['east'], bounds['west'],
+        tags={'addr:housenumber': True}
+    )
+    features = features.dropna(subset=['addr:street', 'addr:housenumber'])
+    points = features.geometry.representative_point()
+    return {
+        'lat': points.y.tolist(),
+        'lon': points.x.tolist(),
+        'street': features['addr:street'].astype(str).tolist(),
+        'housenumber': features['addr:housenumber'].astype(str).tolist()
+    }
+
+
+def build_addresses(addresses: Dict[str, list], source: str) -> AddressIndex:
+    return AddressIndex.build(
+        addresses['lat'], addresses['lon'], addresses['street'], addresses['housenumber'],
+        meta={'source': os.path.basename(source), 'builder_version': BUILDER_VERSION}
+    )
+
+
+def build_network(graph: nx.MultiDiGraph, source: str,
+                  speed_limits: Dict[str, int] = None,
+                  bounds: Dict = None) -> RoadNetwork:
+    """Convert graph to RoadNetwork with vectorized speeds and travel times"""
+    speed_limits = speed_limits or DEFAULT_SPEED_LIMITS
+    network = RoadNetwork.from_networkx(graph, speed_limits)
+    network.meta.update({
+        'source': os.path.basename(source),
+        'builder_version': BUILDER_VERSION,
+        'speed_limits': dict(speed_limits),
+        'bounds': bounds or {
+            'south': float(network.node_lat.min()), 'north': float(network.node_lat.max()),
+            'west': float(network.node_lon.min()), 'east': float(network.node_lon.max())
+        }
+    })
+    # Сетка для привязки координат хранится в артефакте и не строится в воркерах
+    network.add_spatial_index()
+    # Профили скоростей по часам недели: пока по классу дороги
+    network.set_speed_profiles(default_speed_profiles(len(HIGHWAY_CLASSES)), network.edge_highway)
+    return network
+
+
+def _parse_bounds(value: str) -> Dict:
+    north, south, east, west = (float(v) for v in value.split(','))
+    return {'north': north, 'south': south, 'east': east, 'west': west}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='taximore-build-graph',
+        description='Build the mmap-able road network artifact from an OSM extract'
+    )
+    parser.add_argument('source', nargs='?',
+                        help='.osm, .osm.pbf or .graphml file')
+    parser.add_argument('--download', action='store_true',
+                        help='download the drive graph for the bounds from Overpass')
+    parser.add_argument('--city',
+                        help='city from CITIES_FILE: default bounds and artifact path (default: first city)')
+    parser.add_argument('--bounds', type=_parse_bounds,
+                        help='north,south,east,west (default: bounds of the city)')
+    parser.add_argument('-o', '--output',
+                        help='artifact path (default: network_path of the city)')
+    parser.add_argument('--skip-ch', action='store_true',
+                        help='do not build contraction hierarchies')
+    parser.add_argument('--skip-addresses', action='store_true',
+                        help='do not build the address index')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+    if not args.source and not args.download:
+        parser.error('either a source file or --download is required')
+    city = city_registry.get(args.city) if args.city else city_registry.default
+    if city is None:
+        parser.error(f'unknown city {args.city}')
+    args.output = args.output or city.network_path
+
+    started = time.perf_counter()
+    addresses = None
+    if args.download:
+        bounds = args.bounds or city.bounds
+        graph = download_graph(bounds)
+        source = 'overpass:{north},{south},{east},{west}'.format(**bounds)
+        if not args.skip_addresses:
+            addresses = download_addresses(bounds)
+    else:
+        bounds = args.bounds
+        source = args.source
+        with tempfile.TemporaryDirectory() as workdir:
+            path = _convert_pbf(source, workdir) if source.endswith('.pbf') else source
+            graph = read_graph(path)
+            if not args.skip_addresses and not path.endswith('.graphml'):
+                addresses = read_addresses(path)
+    logger.info(f"Graph read in {time.perf_counter() - started:.1f}s: "
+                f"{len(graph)} nodes, {graph.number_of_edges()} edges")
+
+    network = build_network(graph, source, bounds=bounds)
+    network.save(args.output)
+    logger.info(f"Network {network.version} written to {args.output} "
+                f"({network.nbytes / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+
+    if addresses is not None:
+        path = address_index_path(args.output)
+        address_index = build_addresses(addresses, source)
+        address_index.save(path)
+        logger.info(f"Address index written to {path}: {address_index.count} addresses")
+    elif not args.skip_addresses:
+        logger.warning("GraphML has no address data, reverse geocoding will use street names only")
+
+    if not args.skip_ch:
+        for weight in ('time', 'length'):
+            path = hierarchy_path(args.output, weight)
+            ContractionHierarchy.build(network, weight).save(path)
+            logger.info(f"Contraction hierarchy ({weight}) written to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import math
+from typing import List, Tuple
+import numpy as np
+from ..config import Config
+from .spatial_index import METERS_PER_DEG_LAT, METERS_PER_DEG_LON
+
+SQRT3 = math.sqrt(3.0)
+# Соседи ячейки в осевых координатах, по кругу
+DIRECTIONS = ((1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1))
+
+
+class HexGrid:
+    """Pointy-top hexagonal cells of ``size_m`` (center to corner) around a fixed origin.
+
+    Points are projected to local meters like the spatial index; a cell is
+    addressed by its axial coordinates ``(q, r)`` packed into one int64, so
+    cell ids from different processes and calls are directly comparable as
+    long as the origin and size are the same.
+    """
+
+    def __init__(self, size_m: float, lat0: float, lon0: float):
+        self.size = size_m
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self.kx = METERS_PER_DEG_LON * math.cos(math.radians(lat0))
+        self.ky = METERS_PER_DEG_LAT
+
+    @classmethod
+    def for_city(cls, size_m: float, city=None) -> 'HexGrid':
+        """Grid centered on the bounds of a city (Config.CITY_BOUNDS if not given)"""
+        bounds = city.bounds if city is not None else Config.CITY_BOUNDS
+        return cls(size_m, (bounds['north'] + bounds['south']) / 2,
+                   (bounds['east'] + bounds['west']) / 2)
+
+    @staticmethod
+    def pack(q, r) -> np.ndarray:
+        q = np.asarray(q, dtype=np.int64)
+        r = np.asarray(r, dtype=np.int64)
+        return (q << 32) | (r & 0xFFFFFFFF)
+
+    @staticmethod
+    def unpack(cells) -> Tuple[np.ndarray, np.ndarray]:
+        cells = np.asarray(cells, dtype=np.int64)
+        r = cells & 0xFFFFFFFF
+        return cells >> 32, np.where(r >= 1 << 31, r - (1 << 32), r)
+
+    def cells(self, lats, lons) -> np.ndarray:
+        """Cell id of each point"""
+        x = (np.asarray(lons, dtype=np.float64) - self.lon0) * self.kx
+        y = (np.asarray(lats, dtype=np.float64) - self.lat0) * self.ky
+        q = (SQRT3 / 3 * x - y / 3) / self.size
+        r = (2 / 3 * y) / self.size
+        # Округление в кубических координатах (q + r + s = 0)
+        s = -q - r
+        rq, rr, rs = np.round(q), np.round(r), np.round(s)
+        dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+        fix_q = (dq > dr) & (dq > ds)
+        fix_r = ~fix_q & (dr > ds)
+        rq = np.where(fix_q, -rr - rs, rq)
+        rr = np.where(fix_r, -rq - rs, rr)
+        return self.pack(rq.astype(np.int64), rr.astype(np.int64))
+
+    def cell(self, lat: float, lon: float) -> int:
+        """Cell id of one point; same as ``cells`` without NumPy overhead for hot paths"""
+        x = (lon - self.lon0) * self.kx
+        y = (lat - self.lat0) * self.ky
+        q = (SQRT3 / 3 * x - y / 3) / self.size
+        r = (2 / 3 * y) / self.size
+        s = -q - r
+        rq, rr, rs = round(q), round(r), round(s)
+        dq, dr, ds = abs(rq - q), abs(rr - r), abs(rs - s)
+        if dq > dr and dq > ds:
+            rq = -rr - rs
+        elif dr > ds:
+            rr = -rq - rs
+        return (int(rq) << 32) | (int(rr) & 0xFFFFFFFF)
+
+    @staticmethod
+    def ring(cell: int, k: int) -> List[int]:
+        """Cells at hex distance exactly ``k`` from a cell (the cell itself for k=0)"""
+        if k == 0:
+            return [cell]
+        r = cell & 0xFFFFFFFF
+        r = r - (1 << 32) if r >= 1 << 31 else r
+        q = (cell >> 32) + DIRECTIONS[4][0] * k
+        r += DIRECTIONS[4][1] * k
+        ring = []
+        for dq, dr in DIRECTIONS:
+            for _ in range(k):
+                ring.append((q << 32) | (r & 0xFFFFFFFF))
+                q += dq
+                r += dr
+        return ring
+
+    def centers(self, cells) -> Tuple[np.ndarray, np.ndarray]:
+        """Latitudes and longitudes of cell centers"""
+        q, r = self.unpack(cells)
+        x = self.size * (SQRT3 * q + SQRT3 / 2 * r)
+        y = self.size * 1.5 * r
+        return self.lat0 + y / self.ky, self.lon0 + x / self.kx
+
+    def polygon(self, cell: int) -> List[List[float]]:
+        """[[lat, lon], ...] corners of a cell"""
+        lat, lon = self.centers([cell])
+        angles = np.radians(60 * np.arange(6) - 30)
+        lats = lat[0] + self.size * np.sin(angles) / self.ky
+        lons = lon[0] + self.size * np.cos(angles) / self.kx
+        return np.column_stack((lats, lons)).tolist()
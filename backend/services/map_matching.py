@@ -0,0 +1,378 @@
+"""Offline map matching of driver GPS traces into learned edge speeds.
+
+Run nightly over days of the trajectory store (backend.services.trajectory_store)::
+
+    python -m backend.services.map_matching 2026-10-16
+    python -m backend.services.map_matching 2026-10-10 2026-10-16 --workers 8 --append
+
+Traces are matched onto the city network with a hidden Markov model:
+candidate edges for all points of a task come from one vectorized grid
+index query, emissions follow the GPS error and transitions compare the
+route distance between consecutive fixes with the straight line. Edges the
+matched route passes completely give observed traversal times, which are
+aggregated per edge and hour of week into a SpeedTable (city.speeds).
+Processes mapping the city network apply it as speed profiles.
+"""
+import os
+import sys
+import math
+import time
+import heapq
+import logging
+import argparse
+import multiprocessing
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from ..config import Config
+from .road_network import RoadNetwork
+from .speed_profiles import HOURS_PER_WEEK, hour_of_week
+from .speed_table import SpeedTable, speed_table_path
+from .trajectory_store import TrajectoryStore
+
+logger = logging.getLogger(__name__)
+
+# Погрешность GPS (σ), радиус поиска и число рёбер-кандидатов точки
+GPS_SIGMA_M = 10.0
+CANDIDATE_RADIUS_M = 50.0
+MAX_CANDIDATES = 5
+
+# Масштаб штрафа за разницу длины маршрута и прямой между точками (β), метры
+TRANSITION_BETA_M = 30.0
+
+# Точки ближе этого к предыдущей принятой точке пропускаются
+MIN_POINT_SPACING_M = 2 * GPS_SIGMA_M
+
+# Разрыв по времени, после которого трек делится на поездки, секунды
+MAX_GAP_S = 120.0
+
+# Во сколько раз скорость между точками может превысить максимальную скорость сети
+MAX_SPEED_FACTOR = 1.5
+
+# Наблюдения с множителем времени вне этих пределов отбрасываются (стоянки, выбросы)
+MIN_OBSERVED_FACTOR = 0.2
+MAX_OBSERVED_FACTOR = 20.0
+
+# Поездок в одном задании процесса
+TRIPS_PER_TASK = 200
+
+_worker_matcher = None
+
+
+def read_traces(store: TrajectoryStore,
+                days: List[date]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Driver ids, unix timestamps, lats and lons of days of the store, ordered by driver and time"""
+    chunks = [store.read_day(day) for day in days]
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), np.empty(0)
+    drivers, timestamps, lats, lons = (np.concatenate(parts) for parts in zip(*chunks))
+    order = np.lexsort((timestamps, drivers))
+    return drivers[order], timestamps[order], lats[order], lons[order]
+
+
+def split_trips(drivers: np.ndarray, timestamps: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end indices of trips: runs of one driver without gaps over MAX_GAP_S"""
+    breaks = np.flatnonzero((np.diff(drivers) != 0) | (np.diff(timestamps) > MAX_GAP_S)) + 1
+    starts = np.concatenate(([0], breaks)).astype(np.int64)
+    ends = np.concatenate((breaks, [len(timestamps)])).astype(np.int64)
+    keep = ends - starts >= 2
+    return starts[keep], ends[keep]
+
+
+class MapMatcher:
+    """HMM map matcher over a RoadNetwork producing full edge traversals with times"""
+
+    def __init__(self, network: RoadNetwork):
+        self.network = network
+        self.index = network.spatial_index
+        self.max_speed = network.max_speed_kmh / 3.6 * MAX_SPEED_FACTOR
+        self.stats = {'points': 0, 'trips': 0, 'breaks': 0, 'observations': 0}
+
+    def _downsample(self, x: np.ndarray, y: np.ndarray, start: int, end: int) -> List[int]:
+        kept = [start]
+        last_x, last_y = x[start], y[start]
+        for i in range(start + 1, end):
+            if math.hypot(x[i] - last_x, y[i] - last_y) >= MIN_POINT_SPACING_M:
+                kept.append(i)
+                last_x, last_y = x[i], y[i]
+        return kept
+
+    def _search(self, source: int, targets: set, limit: float) -> Dict[int, Tuple[float, List[int]]]:
+        """Bounded Dijkstra by length: {target: (distance, edges)} for targets within limit"""
+        network = self.network
+        indptr, edge_head, edge_length = network.indptr, network.edge_head, network.edge_length
+        dist = {source: 0.0}
+        pred_edge = {}
+        settled = set()
+        heap = [(0.0, source)]
+        remaining = set(targets)
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            if d > limit:
+                break
+            settled.add(u)
+            remaining.discard(u)
+            start, end = int(indptr[u]), int(indptr[u + 1])
+            for edge, v, w in zip(range(start, end), edge_head[start:end].tolist(),
+                                  edge_length[start:end].tolist()):
+                nd = d + w
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    pred_edge[v] = edge
+                    heapq.heappush(heap, (nd, v))
+
+        found = {}
+        for target in targets:
+            if target not in settled:
+                continue
+            edges, node = [], target
+            while node != source:
+                edge = pred_edge[node]
+                edges.append(edge)
+                node = int(network.edge_tail[edge])
+            edges.reverse()
+            found[target] = (dist[target], edges)
+        return found
+
+    def _transitions(self, prev: Dict, cur: Dict, dt: float, straight: float):
+        """Log transition probabilities (prev x cur) and the route of every possible pair"""
+        limit = min(dt * self.max_speed, 2 * straight + 2 * CANDIDATE_RADIUS_M + 100)
+        log_prob = np.full((len(prev['edges']), len(cur['edges'])), -np.inf)
+        routes = {}
+        cur_tails = set(cur['tails'])
+        trees = {}
+        for a, (edge_a, frac_a, head, length_a) in enumerate(
+                zip(prev['edges'], prev['fractions'], prev['heads'], prev['lengths'])):
+            for b, (edge_b, frac_b, tail, length_b) in enumerate(
+                    zip(cur['edges'], cur['fractions'], cur['tails'], cur['lengths'])):
+                if edge_a == edge_b and frac_b >= frac_a:
+                    distance, edges = (frac_b - frac_a) * length_a, None
+                else:
+                    if head not in trees:
+                        trees[head] = self._search(head, cur_tails, limit)
+                    reached = trees[head].get(tail)
+                    if reached is None:
+                        continue
+                    distance = (1 - frac_a) * length_a + reached[0] + frac_b * length_b
+                    edges = reached[1]
+                if distance > limit:
+                    continue
+                log_prob[a, b] = -abs(distance - straight) / TRANSITION_BETA_M
+                routes[a, b] = (distance, edges)
+        return log_prob, routes
+
+    def _match_trip(self, steps: List[Dict]) -> List[List[Tuple]]:
+        """Viterbi over the candidate steps of a trip.
+
+        Returns matched segments (the chain breaks where no transition is
+        possible), each a list of ``(step, candidate, route from the previous
+        state)``.
+        """
+        segments = []
+        score = -0.5 * (steps[0]['distance'] / GPS_SIGMA_M) ** 2
+        back, routes, first = [], [], 0
+
+        def backtrack():
+            states = [int(np.argmax(score))]
+            for best_prev in reversed(back):
+                states.append(int(best_prev[states[-1]]))
+            states.reverse()
+            chain = [(first, states[0], None)]
+            for j in range(1, len(states)):
+                chain.append((first + j, states[j], routes[j - 1][states[j - 1], states[j]]))
+            return chain
+
+        for i in range(1, len(steps)):
+            dt = steps[i]['t'] - steps[i - 1]['t']
+            straight = math.hypot(steps[i]['x'] - steps[i - 1]['x'], steps[i]['y'] - steps[i - 1]['y'])
+            log_prob, pair_routes = self._transitions(steps[i - 1], steps[i], dt, straight)
+            total = score[:, None] + log_prob
+            best_prev = np.argmax(total, axis=0)
+            best = total[best_prev, np.arange(total.shape[1])]
+            if not np.isfinite(best).any():
+                self.stats['breaks'] += 1
+                segments.append(backtrack())
+                score = -0.5 * (steps[i]['distance'] / GPS_SIGMA_M) ** 2
+                back, routes, first = [], [], i
+                continue
+            score = best - 0.5 * (steps[i]['distance'] / GPS_SIGMA_M) ** 2
+            back.append(best_prev)
+            routes.append(pair_routes)
+        segments.append(backtrack())
+        return segments
+
+    def _traversals(self, steps: List[Dict], chain: List[Tuple]) -> List[Tuple[int, float, float]]:
+        """(edge, enter time, travel time) of edges passed completely along a matched chain"""
+        network = self.network
+        pieces = []
+        for (step_a, state_a, _), (step_b, state_b, route) in zip(chain, chain[1:]):
+            t_a, t_b = steps[step_a]['t'], steps[step_b]['t']
+            edge_a, frac_a = steps[step_a]['edges'][state_a], steps[step_a]['fractions'][state_a]
+            edge_b, frac_b = steps[step_b]['edges'][state_b], steps[step_b]['fractions'][state_b]
+            distance, edges = route
+            if edges is None:
+                pieces.append((edge_a, frac_a, frac_b, t_a, t_b))
+                continue
+            # Между точками скорость считается постоянной
+            speed = distance / (t_b - t_a) if distance > 0 else 0.0
+            t = t_a
+            parts = [(edge_a, frac_a, 1.0)] + [(e, 0.0, 1.0) for e in edges] + [(edge_b, 0.0, frac_b)]
+            for edge, start, end in parts:
+                length = (end - start) * float(network.edge_length[edge])
+                t_end = t + length / speed if speed > 0 else t
+                pieces.append((edge, start, end, t, t_end))
+                t = t_end
+
+        traversals = []
+        current = None
+        for edge, start, end, t_start, t_end in pieces:
+            if current is not None and current[0] == edge and abs(current[2] - start) < 1e-9:
+                current = (edge, current[1], end, current[3], t_end)
+                continue
+            if current is not None and current[1] == 0.0 and current[2] == 1.0:
+                traversals.append((current[0], current[3], current[4] - current[3]))
+            current = (edge, start, end, t_start, t_end)
+        if current is not None and current[1] == 0.0 and current[2] == 1.0:
+            traversals.append((current[0], current[3], current[4] - current[3]))
+        return traversals
+
+    def match(self, timestamps, lats, lons, starts, ends) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Observations of trips given as index ranges: (speed keys, traversal times, counts)"""
+        x, y = self.index.project(lats, lons)
+        kept_by_trip = [self._downsample(x, y, int(s), int(e)) for s, e in zip(starts, ends)]
+        kept = np.array([i for trip in kept_by_trip for i in trip], dtype=np.int64)
+        self.stats['points'] += len(timestamps)
+        self.stats['trips'] += len(kept_by_trip)
+
+        # Кандидаты для всех точек задания одним запросом к сетке
+        candidates = self.index.candidate_edges_many(lats[kept], lons[kept],
+                                                     CANDIDATE_RADIUS_M, MAX_CANDIDATES)
+        bounds = np.searchsorted(candidates['point'], np.arange(len(kept) + 1))
+        # Поиск переходов работает со списками Python: без скалярной индексации numpy
+        candidate_edges = candidates['edge'].tolist()
+        candidate_fractions = candidates['fraction'].tolist()
+        candidate_tails = self.network.edge_tail[candidates['edge']].tolist()
+        candidate_heads = self.network.edge_head[candidates['edge']].tolist()
+        candidate_lengths = self.network.edge_length[candidates['edge']].tolist()
+
+        edges, enter_times, durations = [], [], []
+        position = 0
+        for trip in kept_by_trip:
+            steps = []
+            for point in trip:
+                lo, hi = bounds[position], bounds[position + 1]
+                position += 1
+                if lo == hi:
+                    continue
+                steps.append({
+                    't': float(timestamps[point]), 'x': float(x[point]), 'y': float(y[point]),
+                    'edges': candidate_edges[lo:hi], 'fractions': candidate_fractions[lo:hi],
+                    'tails': candidate_tails[lo:hi], 'heads': candidate_heads[lo:hi],
+                    'lengths': candidate_lengths[lo:hi], 'distance': candidates['distance'][lo:hi]
+                })
+            if len(steps) < 2:
+                continue
+            for chain in self._match_trip(steps):
+                for edge, enter, duration in self._traversals(steps, chain):
+                    edges.append(edge)
+                    enter_times.append(enter)
+                    durations.append(duration)
+
+        edges = np.array(edges, dtype=np.int64)
+        durations = np.array(durations, dtype=np.float64)
+        factor = durations / np.maximum(self.network.edge_time[edges], 1e-3)
+        valid = (factor >= MIN_OBSERVED_FACTOR) & (factor <= MAX_OBSERVED_FACTOR)
+        hours = np.array([hour_of_week(datetime.fromtimestamp(t)) for t in enter_times],
+                         dtype=np.int64)
+        self.stats['observations'] += int(valid.sum())
+        keys = edges[valid] * HOURS_PER_WEEK + hours[valid]
+        return keys, durations[valid], np.ones(len(keys), dtype=np.int64)
+
+
+def _init_worker(network_path: str):
+    global _worker_matcher
+    _worker_matcher = MapMatcher(RoadNetwork.load(network_path))
+
+
+def _match_task(task):
+    timestamps, lats, lons, starts, ends = task
+    return _worker_matcher.match(timestamps, lats, lons, starts, ends)
+
+
+def match_traces(network_path: str, days: List[date], workers: int = None,
+                 store: TrajectoryStore = None) -> SpeedTable:
+    """Map-match driver trajectories of days against a saved network and aggregate a SpeedTable"""
+    started = time.perf_counter()
+    network = RoadNetwork.load(network_path)
+    drivers, timestamps, lats, lons = read_traces(store or TrajectoryStore(), days)
+    starts, ends = split_trips(drivers, timestamps)
+    logger.info(f"Read {len(timestamps)} points, {len(starts)} trips "
+                f"in {time.perf_counter() - started:.1f}s")
+
+    tasks = []
+    for first in range(0, len(starts), TRIPS_PER_TASK):
+        task_starts, task_ends = starts[first:first + TRIPS_PER_TASK], ends[first:first + TRIPS_PER_TASK]
+        index = np.concatenate([np.arange(s, e) for s, e in zip(task_starts, task_ends)])
+        offsets = np.concatenate(([0], np.cumsum(task_ends - task_starts)))
+        tasks.append((timestamps[index], lats[index], lons[index], offsets[:-1], offsets[1:]))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        _init_worker(network_path)
+        results = [_match_task(task) for task in tasks]
+    else:
+        # Сеть открывается через mmap в каждом процессе, страницы общие
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(network_path,)) as pool:
+            results = pool.map(_match_task, tasks)
+
+    table = SpeedTable.from_observations(
+        np.concatenate([r[0] for r in results]) if results else [],
+        np.concatenate([r[1] for r in results]) if results else [],
+        np.concatenate([r[2] for r in results]) if results else [],
+        meta={
+            'network_version': network.version,
+            'sources': [day.isoformat() for day in days]
+        }
+    )
+    logger.info(f"Matched {len(starts)} trips into {table.observations} edge traversals "
+                f"({len(table.speed_key)} edge-hours) in {time.perf_counter() - started:.1f}s")
+    return table
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='taximore-match-traces',
+        description='Learn edge speeds by map-matching driver GPS traces'
+    )
+    parser.add_argument('days', nargs='+', type=date.fromisoformat, metavar='YYYY-MM-DD',
+                        help='days of driver trajectories to match')
+    parser.add_argument('--trajectories', default=Config.TRAJECTORY_DIR,
+                        help='trajectory store directory (default: %(default)s)')
+    parser.add_argument('--network', default=Config.OSM_CITY_NETWORK_PATH,
+                        help='network artifact (default: %(default)s)')
+    parser.add_argument('-o', '--output',
+                        help='speed table path (default: next to the network, .speeds)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='matching processes (default: %(default)s)')
+    parser.add_argument('--append', action='store_true',
+                        help='add observations to an existing speed table of the same network')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+    output = args.output or speed_table_path(args.network)
+    table = match_traces(args.network, args.days, args.workers, TrajectoryStore(args.trajectories))
+    if args.append and os.path.exists(output):
+        previous = SpeedTable.load(output)
+        if previous.network_version == table.network_version:
+            table = SpeedTable.merge([previous, table])
+        else:
+            logger.warning(f"{output} was learned for network {previous.network_version}, replacing it")
+    table.save(output)
+    logger.info(f"Speed table written to {output}: {table.observations} observations")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
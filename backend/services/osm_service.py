@@ -1,17 +1,32 @@
-import osmnx as ox
 import networkx as nx
 from geopy.geocoders import Nominatim
 from geopy.distance import geodesic
 import folium
-import math
 import logging
-from datetime import datetime, timedelta
-import json
+from datetime import datetime
 import os
-from functools import lru_cache
+import asyncio
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Tuple, Optional
 import redis
 from ..config import Config
+from .city_registry import city_registry
+from .city_graph import (
+    geocode_address, get_bbox_network, get_city_hierarchy, get_city_network, get_route_network,
+    hierarchy_for, reverse_geocode
+)
+from .road_network import DEFAULT_SPEED_LIMITS, RoadNetwork, haversine_km
+from .geocoding_client import GeocodingClient
+from .hex_grid import HexGrid
+from .polyline import ROUTE_PRECISION, encode_polyline, route_geometry, route_points
+from .route_cache import RouteCache
+from .routing_client import RoutingClient, RoutingDaemonError
+from .routing_pool import RoutingPool
+from .speed_profiles import hour_of_week
+from .routing import (
+    alternative_paths, many_to_one, path_coordinates, path_total, reachable, snap_endpoint
+)
 import numpy as np
 
 logger = logging.getLogger(__name__)
@@ -23,185 +38,423 @@ redis_client = redis.Redis(
     db=Config.REDIS_DB
 )
 
+# Кэш маршрутов общий для всех экземпляров OSMService процесса
+route_cache = RouteCache(redis_client)
+
+# Nominatim за кэшем, объединением одинаковых запросов и общим лимитом частоты
+geocoding_client = GeocodingClient(
+    redis_client, Nominatim(user_agent=Config.OSM_USER_AGENT, timeout=10)
+)
+
+# Изохроны: LRU процесса по (версия сети, узел, минуты, час недели, направление);
+# наборы узлов крупные, поэтому в Redis не кладутся
+_isochrone_cache = OrderedDict()
+_isochrone_cache_lock = threading.Lock()
+
+
+def warm_up_routing_worker():
+    """Routing pool initializer: map the default city network and its hierarchies once per worker"""
+    if get_city_network() is not None:
+        for weight in ('time', 'length'):
+            get_city_hierarchy(weight)
+
+
+def search_routes(origin_point: Tuple[float, float], destination_point: Tuple[float, float],
+                  alternatives: int, engine: Optional[str], hour: int,
+                  speed_limits: Dict) -> Optional[List[Dict]]:
+    """Routes with geometry as polyline, as stored in the route cache (runs in the routing pool)"""
+    # Сеть города посадки общая для процесса, для загородных поездок - сеть из тайлов
+    network = get_route_network(origin_point, destination_point, speed_limits)
+    if not network:
+        return None
+
+    # Привязываем точки к ближайшим рёбрам: маршрут начинается и
+    # заканчивается в точках проекции, а не в ближайших перекрёстках
+    orig_snap = network.snap_edge(*origin_point)
+    dest_snap = network.snap_edge(*destination_point)
+
+    # Время проезда рёбер по профилям скоростей на час отправления
+    time_weights = network.time_weights(hour)
+
+    # Одинаковые поездки (вокзал, аэропорт) берём из кэша вместе с адресами
+    cache_key = route_cache.make_key(network.weights_version, orig_snap, dest_snap,
+                                     'time', f'h{hour}', alternatives)
+    cached = route_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Основной маршрут (кратчайший по времени) и альтернативы через штрафы рёбер.
+    # Общий для всех дорог множитель часа не меняет порядок путей, поэтому
+    # ищем по свободному потоку (иерархия CH); иначе - по весам часа A* с
+    # расстояниями иерархии в качестве потенциала (ch_astar)
+    search_weights = None if network.uniform_time_factor(hour) is not None else time_weights
+    paths = alternative_paths(network, snap_endpoint(network, orig_snap, origin=True),
+                              snap_endpoint(network, dest_snap, origin=False),
+                              alternatives, 'time', hierarchy_for(network, 'time'), engine,
+                              weights=search_weights,
+                              max_speed_kmh=network.max_speed_at(hour))
+    if len(paths) < alternatives:
+        logger.info(f"Found {len(paths)} of {alternatives} routes")
+
+    # Адреса берутся из локального индекса, без запросов к Nominatim
+    start_address = reverse_geocode(origin_point[0], origin_point[1], network)
+    end_address = reverse_geocode(destination_point[0], destination_point[1], network)
+
+    routes = []
+    for path in paths:
+        # Рассчитываем детали маршрута
+        total_length = path_total(network, path, network.edge_length) / 1000  # км
+        total_time = path_total(network, path, time_weights)  # секунды
+        free_flow_time = path_total(network, path, network.edge_time)
+        traffic_level = round(total_time / free_flow_time, 2) if free_flow_time > 0 else 1.0
+
+        # Геометрия хранится закодированной: в кэше и ответах она в разы меньше списка точек
+        route_polyline = encode_polyline(path_coordinates(network, path, orig_snap, dest_snap),
+                                         ROUTE_PRECISION)
+
+        routes.append({
+            'distance': round(total_length, 2),
+            'duration': round(total_time / 60, 1),  # минуты
+            'traffic_level': traffic_level,
+            'start_location': {'lat': origin_point[0], 'lng': origin_point[1]},
+            'end_location': {'lat': destination_point[0], 'lng': destination_point[1]},
+            'route_polyline': route_polyline,
+            'start_address': start_address,
+            'end_address': end_address
+        })
+
+    if not routes:
+        return None
+    route_cache.set(cache_key, routes)
+    return routes
+
+
+def search_isochrone(lat: float, lon: float, minutes: float, hour: int, reverse: bool,
+                     speed_limits: Dict) -> Optional[Dict]:
+    """Isochrone of OSMService.isochrone, cached per worker process (runs in the routing pool)"""
+    network = get_route_network((lat, lon), (lat, lon), speed_limits)
+    if not network:
+        return None
+    node = network.nearest_node(lat, lon)
+
+    key = (network.weights_version, node, minutes, hour, reverse)
+    with _isochrone_cache_lock:
+        cached = _isochrone_cache.get(key)
+        if cached is not None:
+            _isochrone_cache.move_to_end(key)
+            return cached
+
+    nodes, costs = reachable(network, node, minutes * 60, weights=network.time_weights(hour),
+                             reverse=reverse)
+    grid = HexGrid.for_city(Config.ISOCHRONE_CELL_M, city_registry.city_for(lat, lon))
+    cells = np.unique(grid.cells(network.node_lat[nodes], network.node_lon[nodes]))
+    result = {
+        'center': {'lat': lat, 'lon': lon},
+        'minutes': minutes,
+        'hour': hour,
+        'reverse': reverse,
+        'network_version': network.version,
+        'nodes': nodes,
+        'costs': costs,
+        'cells': cells.tolist(),
+        'polygons': [grid.polygon(cell) for cell in cells.tolist()]
+    }
+
+    with _isochrone_cache_lock:
+        _isochrone_cache[key] = result
+        while len(_isochrone_cache) > Config.ISOCHRONE_CACHE_SIZE:
+            _isochrone_cache.popitem(last=False)
+    return result
+
+
+def search_pickup_etas(customer: Dict, drivers: List[Dict], hour: int,
+                       speed_limits: Dict) -> List[Optional[float]]:
+    """Pickup ETAs of OSMService.calculate_pickup_etas (runs in the routing pool)"""
+    lats = np.array([driver['lat'] for driver in drivers] + [customer['lat']])
+    lons = np.array([driver['lon'] for driver in drivers] + [customer['lon']])
+    network = get_route_network((lats.min(), lons.min()), (lats.max(), lons.max()),
+                                speed_limits)
+    if not network:
+        return [None] * len(drivers)
+
+    # Привязка всех водителей и клиента одним вызовом
+    snapped = network.spatial_index.snap_edges_many(lats, lons)
+    endpoints = [
+        snap_endpoint(network, {'edge': int(edge), 'fraction': float(fraction)}, origin=True)
+        for edge, fraction in zip(snapped['edge'][:-1], snapped['fraction'][:-1])
+    ]
+    target = snap_endpoint(
+        network, {'edge': int(snapped['edge'][-1]), 'fraction': float(snapped['fraction'][-1])},
+        origin=False
+    )
+
+    costs = many_to_one(network, endpoints, target, 'time',
+                        network.time_weights(hour))
+    return [
+        round(cost / 60, 1) if cost is not None else None  # минуты
+        for cost in costs
+    ]
+
+
+def search_eta_matrix(sources: List[Dict], targets: List[Dict], hour: int,
+                      speed_limits: Dict) -> Optional[List[List[Optional[float]]]]:
+    """Travel times in minutes from every source to every target, one backward search per target"""
+    points = sources + targets
+    lats = np.array([point['lat'] for point in points])
+    lons = np.array([point['lon'] for point in points])
+    network = get_route_network((lats.min(), lons.min()), (lats.max(), lons.max()),
+                                speed_limits)
+    if not network:
+        return None
+
+    snapped = network.spatial_index.snap_edges_many(lats, lons)
+    endpoints = [
+        snap_endpoint(network, {'edge': int(edge), 'fraction': float(fraction)}, origin=i < len(sources))
+        for i, (edge, fraction) in enumerate(zip(snapped['edge'], snapped['fraction']))
+    ]
+    weights = network.time_weights(hour)
+    columns = [
+        many_to_one(network, endpoints[:len(sources)], target, 'time', weights)
+        for target in endpoints[len(sources):]
+    ]
+    return [
+        [round(column[i] / 60, 1) if column[i] is not None else None for column in columns]
+        for i in range(len(sources))
+    ]
+
+
+def search_snap(points: List[Dict], speed_limits: Dict) -> Optional[Dict]:
+    """Nearest node and nearest edge of each point (arrays) with the network version"""
+    lats = np.array([point['lat'] for point in points])
+    lons = np.array([point['lon'] for point in points])
+    network = get_route_network((lats.min(), lons.min()), (lats.max(), lons.max()),
+                                speed_limits)
+    if not network:
+        return None
+    nodes, node_distance = network.snap_many(lats, lons)
+    return dict(network.spatial_index.snap_edges_many(lats, lons),
+                node=nodes, node_distance=node_distance, network_version=network.version)
+
+
+# Маршрутизация в отдельных процессах: поиск не блокирует цикл событий ботов и сервисов
+routing_pool = RoutingPool(initializer=warm_up_routing_worker)
+
+# С ROUTING_SOCKET поиск выполняет демон маршрутизации (routing_daemon) - одна
+# копия сети на сервер; без него или при его недоступности - локальный пул
+routing_client = RoutingClient(Config.ROUTING_SOCKET) if Config.ROUTING_SOCKET else None
+
+# Вызовы демона этого процесса и поиски, переданные пулу после сбоя демона, по причинам
+_daemon_stats = {'calls': 0, 'unavailable': 0, 'timeouts': 0, 'errors': 0}
+_daemon_stats_lock = threading.Lock()
+
+
+def _count_daemon(name: str):
+    with _daemon_stats_lock:
+        _daemon_stats[name] += 1
+
+
+def get_daemon_stats() -> Dict:
+    """Routing daemon calls of this process and local fallbacks by reason"""
+    with _daemon_stats_lock:
+        fallbacks = _daemon_stats['unavailable'] + _daemon_stats['timeouts'] + _daemon_stats['errors']
+        return dict(_daemon_stats, fallbacks=fallbacks, enabled=routing_client is not None)
+
+
+async def run_search(fn, *args):
+    """Run a search_* function in the routing daemon if configured, otherwise in the local pool.
+
+    If the daemon is unavailable, times out or returns an error, the search
+    runs in the local pool instead.
+    """
+    if routing_client is not None:
+        _count_daemon('calls')
+        try:
+            return await routing_client.call(fn.__name__, *args)
+        except (ConnectionError, FileNotFoundError) as e:
+            _count_daemon('unavailable')
+            logger.error(f"Routing daemon is unavailable, searching locally: {str(e)}")
+        except asyncio.TimeoutError:
+            _count_daemon('timeouts')
+            logger.error(f"Routing daemon timed out after {routing_client.timeout}s, searching locally")
+        except RoutingDaemonError as e:
+            _count_daemon('errors')
+            logger.error(f"Routing daemon failed {fn.__name__}, searching locally: {str(e)}")
+    return await routing_pool.run(fn, *args)
+
+
 class OSMService:
     def __init__(self):
-        self.geocoder = Nominatim(user_agent='taximore', timeout=10)
+        self.geocoder = geocoding_client
         # Настройка для сохранения кэша графов
         self.cache_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'cache', 'osm')
         os.makedirs(self.cache_dir, exist_ok=True)
         
         # Настройки для расчета маршрутов
-        self.speed_limits = {
-            'motorway': 110,
-            'trunk': 90,
-            'primary': 60,
-            'secondary': 50,
-            'tertiary': 40,
-            'residential': 30,
-            'living_street': 20
-        }
-        
-        # Коэффициенты пробок по времени суток
-        self.traffic_coefficients = {
-            'morning_rush': 1.5,  # 7:00-10:00
-            'evening_rush': 1.7,  # 17:00-20:00
-            'night': 0.8,         # 23:00-5:00
-            'normal': 1.0         # остальное время
-        }
-
-    @lru_cache(maxsize=1000)
-    def get_coordinates(self, address: str) -> Optional[Dict]:
-        """Get coordinates from address with caching"""
-        cache_key = f'geocode:{address}'
-        cached = redis_client.get(cache_key)
-        
-        if cached:
-            return json.loads(cached)
-            
-        try:
-            location = self.geocoder.geocode(address)
-            if location:
-                result = {
-                    'lat': location.latitude,
-                    'lon': location.longitude,
-                    'address': location.address
-                }
-                # Кэшируем на 24 часа
-                redis_client.setex(cache_key, 86400, json.dumps(result))
-                return result
-            return None
-        except Exception as e:
-            logger.error(f"Error geocoding address: {str(e)}")
-            return None
+        self.speed_limits = dict(DEFAULT_SPEED_LIMITS)
 
-    def get_traffic_coefficient(self, time: datetime = None) -> float:
-        """Get traffic coefficient based on time"""
-        if time is None:
-            time = datetime.now()
-            
-        hour = time.hour
-        
-        if 7 <= hour < 10:
-            return self.traffic_coefficients['morning_rush']
-        elif 17 <= hour < 20:
-            return self.traffic_coefficients['evening_rush']
-        elif 23 <= hour or hour < 5:
-            return self.traffic_coefficients['night']
-        else:
-            return self.traffic_coefficients['normal']
-
-    def get_cached_graph(self, bbox: Tuple[float, float, float, float]) -> Optional[nx.MultiDiGraph]:
-        """Get cached street network graph"""
-        cache_key = f"graph:{':'.join(map(str, bbox))}"
-        graph_path = os.path.join(self.cache_dir, f"{cache_key}.graphml")
-        
-        if os.path.exists(graph_path):
-            try:
-                return ox.load_graphml(graph_path)
-            except Exception as e:
-                logger.error(f"Error loading cached graph: {str(e)}")
-                
-        try:
-            graph = ox.graph_from_bbox(
-                bbox[0], bbox[2], bbox[1], bbox[3],
-                network_type='drive',
-                simplify=True
+    def get_coordinates(self, address: str, near: Dict = None) -> Optional[Dict]:
+        """Get coordinates from address with caching, in the city of ``near`` if given"""
+        # Адреса города ищем в локальном индексе, Nominatim - только для остальных
+        city = city_registry.city_for(near['lat'], near['lon']) if near else None
+        local = geocode_address(address, city)
+        if local:
+            return {'lat': local['lat'], 'lon': local['lon'], 'address': local['address']}
+        return self.geocoder.geocode(address)
+
+    async def get_coordinates_many(self, addresses: List[str],
+                                   near: Dict = None) -> List[Optional[Dict]]:
+        """Get coordinates for a batch of addresses, remote lookups run concurrently"""
+        city = city_registry.city_for(near['lat'], near['lon']) if near else None
+        results = []
+        for address in addresses:
+            local = geocode_address(address, city)
+            results.append(
+                {'lat': local['lat'], 'lon': local['lon'], 'address': local['address']}
+                if local else None
             )
-            # Добавляем информацию о скорости и времени проезда
-            for _, _, data in graph.edges(data=True):
-                highway = data.get('highway', 'residential')
-                length = data.get('length', 0)
-                speed = self.speed_limits.get(highway, 30)
-                data['speed'] = speed
-                data['time'] = length / (speed * 1000 / 3600)  # время в часах
-                
-            # Сохраняем граф в кэш
-            ox.save_graphml(graph, graph_path)
-            return graph
-        except Exception as e:
-            logger.error(f"Error creating graph: {str(e)}")
-            return None
+        remote = [address for address, result in zip(addresses, results) if result is None]
+        found = iter(await self.geocoder.geocode_many(remote))
+        return [result if result is not None else next(found) for result in results]
+
+    def get_cached_graph(self, bbox: Tuple[float, float, float, float]) -> Optional[RoadNetwork]:
+        """Get cached street network for bbox"""
+        city = city_registry.city_for(bbox[0], bbox[1])
+        if city is not None and city.contains(bbox[2], bbox[3]):
+            network = get_city_network(city)
+            if network is not None:
+                return network
+        return get_bbox_network(bbox, self.speed_limits)
 
     async def calculate_routes(self, origin: Dict, destination: Dict, 
-                           alternatives: int = 3) -> Optional[List[Dict]]:
-        """Calculate multiple routes between two points using OSM"""
+                           alternatives: int = 3, engine: str = None,
+                           departure: datetime = None, geometry: str = 'coordinates',
+                           tolerance: float = None) -> Optional[List[Dict]]:
+        """Calculate multiple routes between two points using OSM
+
+        The search runs in the routing pool, the event loop only awaits it.
+        engine: 'ch', 'astar' or 'dijkstra' (default Config.ROUTING_ENGINE)
+        departure: departure time for the speed profiles (default now)
+        geometry: 'coordinates', 'polyline' or 'array' (see polyline.route_geometry)
+        tolerance: simplify the route line to this many meters
+        """
         try:
             # Конвертируем координаты
             origin_point = (origin['lat'], origin['lon'])
             destination_point = (destination['lat'], destination['lon'])
 
-            # Рассчитываем bbox
-            min_lat = min(origin_point[0], destination_point[0])
-            max_lat = max(origin_point[0], destination_point[0])
-            min_lon = min(origin_point[1], destination_point[1])
-            max_lon = max(origin_point[1], destination_point[1])
-
-            buffer_deg = 0.02
-            bbox = (
-                min_lat - buffer_deg,
-                min_lon - buffer_deg,
-                max_lat + buffer_deg,
-                max_lon + buffer_deg
-            )
-
-            # Получаем граф
-            graph = self.get_cached_graph(bbox)
-            if not graph:
+            routes = await run_search(search_routes, origin_point, destination_point,
+                                      alternatives, engine, hour_of_week(departure),
+                                      self.speed_limits)
+            if not routes:
                 return None
+            return [
+                self._route_response(route, origin_point, destination_point, geometry, tolerance)
+                for route in routes
+            ]
 
-            # Находим ближайшие узлы
-            orig_node = ox.nearest_nodes(graph, origin_point[1], origin_point[0])
-            dest_node = ox.nearest_nodes(graph, destination_point[1], destination_point[0])
-
-            # Получаем коэффициент пробок
-            traffic_coef = self.get_traffic_coefficient()
-
-            routes = []
-            # Рассчитываем основной и альтернативные маршруты
-            for k in range(alternatives):
-                try:
-                    if k == 0:
-                        # Основной маршрут (кратчайший по времени)
-                        route = nx.shortest_path(graph, orig_node, dest_node, weight='time')
-                    else:
-                        # Альтернативные маршруты с избеганием части рёбер основного маршрута
-                        temp_graph = graph.copy()
-                        # Увеличиваем вес некоторых рёбер основного маршрута
-                        for i in range(len(route)-1):
-                            if temp_graph.has_edge(route[i], route[i+1]):
-                                temp_graph[route[i]][route[i+1]][0]['time'] *= 1.5
-                        route = nx.shortest_path(temp_graph, orig_node, dest_node, weight='time')
-
-                    # Рассчитываем детали маршрута
-                    edge_lengths = ox.utils_graph.get_route_edge_attributes(graph, route, 'length')
-                    edge_times = ox.utils_graph.get_route_edge_attributes(graph, route, 'time')
-                    
-                    total_length = sum(edge_lengths) / 1000  # км
-                    total_time = sum(edge_times) * traffic_coef  # часы
+        except asyncio.TimeoutError:
+            logger.error(f"Route calculation timed out after {routing_pool.timeout}s")
+            return None
+        except Exception as e:
+            logger.error(f"Error calculating routes: {str(e)}")
+            return None
 
-                    route_coords = [[graph.nodes[node]['y'], graph.nodes[node]['x']] for node in route]
+    @staticmethod
+    def _route_response(route: Dict, origin_point: Tuple[float, float],
+                        destination_point: Tuple[float, float], geometry: str,
+                        tolerance: Optional[float]) -> Dict:
+        """Cached route with request endpoints and geometry in the requested format"""
+        # Записи кэша, сделанные до перехода на polyline, хранят список точек
+        polyline = route.get('route_polyline') or encode_polyline(route['route_coordinates'],
+                                                                   ROUTE_PRECISION)
+        response = {key: value for key, value in route.items()
+                    if key not in ('route_polyline', 'route_coordinates')}
+        response.update(route_geometry(polyline, geometry, tolerance))
+        response['start_location'] = {'lat': origin_point[0], 'lng': origin_point[1]}
+        response['end_location'] = {'lat': destination_point[0], 'lng': destination_point[1]}
+        return response
 
-                    routes.append({
-                        'distance': round(total_length, 2),
-                        'duration': round(total_time * 60, 1),  # минуты
-                        'traffic_level': traffic_coef,
-                        'start_location': {'lat': origin_point[0], 'lng': origin_point[1]},
-                        'end_location': {'lat': destination_point[0], 'lng': destination_point[1]},
-                        'route_coordinates': route_coords,
-                        'start_address': self.geocoder.reverse((origin_point[0], origin_point[1])).address,
-                        'end_address': self.geocoder.reverse((destination_point[0], destination_point[1])).address
-                    })
+    async def isochrone(self, point: Dict, minutes: float, depart_time: datetime = None,
+                        reverse: bool = False) -> Optional[Dict]:
+        """Area reachable from a point within ``minutes`` at departure time.
 
-                except nx.NetworkXNoPath:
-                    logger.warning(f"No alternative route {k} found")
-                    continue
+        With ``reverse`` - the area from which the point is reached (drivers
+        able to get to a pickup). Returns the reachable ``nodes`` with their
+        ``costs`` in seconds (arrays sorted by node) and a hexagon
+        approximation: cell ids in ``cells`` and their corners in ``polygons``.
+        """
+        try:
+            return await run_search(search_isochrone, point['lat'], point['lon'], minutes,
+                                    hour_of_week(depart_time), reverse, self.speed_limits)
+        except asyncio.TimeoutError:
+            logger.error(f"Isochrone calculation timed out after {routing_pool.timeout}s")
+            return None
+        except Exception as e:
+            logger.error(f"Error calculating isochrone: {str(e)}")
+            return None
 
-            return routes if routes else None
+    async def isochrone_etas(self, isochrone: Dict, points: List[Dict]) -> List[Optional[float]]:
+        """Travel time in minutes for points inside an isochrone (None outside), no search per point"""
+        try:
+            if not points:
+                return []
+            snapped = await self.snap_points(points)
+            if not snapped or snapped['network_version'] != isochrone['network_version']:
+                return [None] * len(points)
+            nodes = isochrone['nodes']
+            position = np.minimum(np.searchsorted(nodes, snapped['node']), max(len(nodes) - 1, 0))
+            inside = (nodes[position] == snapped['node']) if len(nodes) else np.zeros(len(points), dtype=bool)
+            return [
+                round(float(isochrone['costs'][i]) / 60, 1) if ok else None  # минуты
+                for i, ok in zip(position.tolist(), inside.tolist())
+            ]
+        except Exception as e:
+            logger.error(f"Error calculating isochrone ETAs: {str(e)}")
+            return [None] * len(points)
 
+    async def snap_points(self, points: List[Dict]) -> Optional[Dict]:
+        """Nearest ``node`` and nearest ``edge``/``fraction`` (arrays) of points on the road network"""
+        try:
+            if not points:
+                return None
+            return await run_search(search_snap, points, self.speed_limits)
         except Exception as e:
-            logger.error(f"Error calculating routes: {str(e)}")
+            logger.error(f"Error snapping points: {str(e)}")
             return None
 
+    async def eta_matrix(self, sources: List[Dict], targets: List[Dict],
+                         departure: datetime = None) -> Optional[List[List[Optional[float]]]]:
+        """Travel times in minutes, rows - sources, columns - targets (None without a route)"""
+        try:
+            if not sources or not targets:
+                return [[] for _ in sources]
+            return await run_search(search_eta_matrix, sources, targets, hour_of_week(departure),
+                                    self.speed_limits)
+        except asyncio.TimeoutError:
+            logger.error(f"ETA matrix calculation timed out after {routing_pool.timeout}s")
+            return None
+        except Exception as e:
+            logger.error(f"Error calculating ETA matrix: {str(e)}")
+            return None
+
+    async def calculate_pickup_etas(self, customer: Dict, drivers: List[Dict]) -> List[Optional[float]]:
+        """Pickup time in minutes from each driver location to the customer
+
+        One backward search from the customer covers all drivers; no route
+        geometry or addresses are built. None for drivers without a route.
+        """
+        try:
+            if not drivers:
+                return []
+            return await run_search(search_pickup_etas, customer, drivers, hour_of_week(),
+                                    self.speed_limits)
+        except asyncio.TimeoutError:
+            logger.error(f"Pickup ETA calculation timed out after {routing_pool.timeout}s")
+            return [None] * len(drivers)
+        except Exception as e:
+            logger.error(f"Error calculating pickup ETAs: {str(e)}")
+            return [None] * len(drivers)
+
     def generate_map(self, routes: List[Dict], zoom: int = 13) -> str:
         """Generate map with multiple routes"""
         try:
@@ -220,7 +473,7 @@ class OSMService:
 
             # Добавляем маршруты на карту
             for i, route in enumerate(routes):
-                coordinates = route['route_coordinates']
+                coordinates = route_points(route)
                 color = colors[i % len(colors)]
                 
                 # Добавляем маршрут
@@ -296,19 +549,13 @@ class OSMService:
             lat_grid = np.linspace(bbox[0], bbox[2], grid_size)
             lon_grid = np.linspace(bbox[1], bbox[3], grid_size)
             
-            coverage_matrix = np.zeros((grid_size, grid_size))
-            
-            # Рассчитываем покрытие
-            for i, lat in enumerate(lat_grid):
-                for j, lon in enumerate(lon_grid):
-                    for point in points:
-                        distance = geodesic(
-                            (lat, lon),
-                            (point['lat'], point['lon'])
-                        ).kilometers
-                        if distance <= radius_km:
-                            coverage_matrix[i, j] = 1
-                            break
+            # Рассчитываем покрытие: расстояния от узлов сетки до всех точек одним массивом
+            grid_lat, grid_lon = np.meshgrid(lat_grid, lon_grid, indexing='ij')
+            distances = haversine_km(
+                grid_lat[:, :, None], grid_lon[:, :, None],
+                np.array(lats)[None, None, :], np.array(lons)[None, None, :]
+            )
+            coverage_matrix = (distances <= radius_km).any(axis=2)
             
             coverage_percentage = (coverage_matrix.sum() / (grid_size * grid_size)) * 100
             
@@ -329,15 +576,14 @@ class OSMService:
                           num_points: int = 10) -> List[Dict]:
         """Найти оптимальные точки для размещения водителей"""
         try:
-            # Получаем граф дорог для области
-            graph = self.get_cached_graph(area_bbox)
-            if not graph:
+            # Получаем сеть дорог для области
+            network = self.get_cached_graph(area_bbox)
+            if not network:
                 return []
             
-            # Получаем все узлы графа
-            nodes = list(graph.nodes(data=True))
-            
-            # Рассчитываем центральность узлов
+            # Центральность считается только по подграфу узлов области
+            nodes = network.nodes_in_bbox(area_bbox)
+            graph = network.to_networkx(nodes)
             centrality = nx.betweenness_centrality(graph)
             
             # Сортируем узлы по центральности
@@ -352,10 +598,10 @@ class OSMService:
             min_distance_km = 0.5  # Минимальное расстояние между точками
             
             for node_id, _ in sorted_nodes:
-                node = graph.nodes[node_id]
+                lat, lon = network.node_coords(node_id)
                 point = {
-                    'lat': node['y'],
-                    'lon': node['x']
+                    'lat': lat,
+                    'lon': lon
                 }
                 
                 # Проверяем расстояние до уже выбранных точек
@@ -0,0 +1,121 @@
+import math
+from typing import Dict, List
+import numpy as np
+from .spatial_index import METERS_PER_DEG_LAT, METERS_PER_DEG_LON
+
+# Точность координат маршрутов: 6 знаков (~0.1 м), как polyline6 в OSRM
+ROUTE_PRECISION = 6
+
+GEOMETRY_FORMATS = ('coordinates', 'polyline', 'array')
+
+
+def encode_polyline(coords, precision: int = 5) -> str:
+    """Encoded polyline (Google algorithm) of [[lat, lon], ...] or an (n, 2) array"""
+    points = np.round(np.asarray(coords, dtype=np.float64).reshape(-1, 2) * 10 ** precision)
+    deltas = np.diff(points.astype(np.int64), axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    values = deltas.ravel()
+    # Зигзаг-кодирование знака, затем группы по 5 бит, начиная с младших
+    values = np.where(values < 0, ~(values << 1), values << 1)
+    chars = []
+    for value in values.tolist():
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return ''.join(chars)
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> np.ndarray:
+    """(n, 2) float64 array of [lat, lon] from an encoded polyline"""
+    values = []
+    result = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        result |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            result = shift = 0
+    if len(values) % 2:
+        raise ValueError('Malformed polyline: odd number of values')
+    deltas = np.array(values, dtype=np.int64).reshape(-1, 2)
+    return np.cumsum(deltas, axis=0) / 10 ** precision
+
+
+def simplify_line(coords, tolerance_m: float) -> np.ndarray:
+    """Douglas-Peucker simplification of [[lat, lon], ...] with tolerance in meters.
+
+    Points are projected to local meters around the line; the first and last
+    points are always kept.
+    """
+    points = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    count = len(points)
+    if count < 3 or not tolerance_m or tolerance_m <= 0:
+        return points.copy()
+
+    lat0 = float(points[:, 0].mean())
+    xy = np.column_stack((
+        (points[:, 1] - points[0, 1]) * METERS_PER_DEG_LON * math.cos(math.radians(lat0)),
+        (points[:, 0] - points[0, 0]) * METERS_PER_DEG_LAT
+    ))
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    # Стек отрезков вместо рекурсии: длинные маршруты не упираются в глубину стека
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start = xy[first]
+        segment = xy[last] - start
+        offsets = xy[first + 1:last] - start
+        length2 = float(segment @ segment)
+        if length2 > 0:
+            t = np.clip(offsets @ segment / length2, 0.0, 1.0)
+            offsets = offsets - t[:, None] * segment
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return points[keep]
+
+
+def line_geometry(coords, geometry: str = 'coordinates', tolerance_m: float = None) -> Dict:
+    """Route geometry fields from [[lat, lon], ...] points.
+
+    geometry: 'coordinates' - ``route_coordinates`` as [[lat, lon], ...],
+    'array' - ``route_coordinates`` as an (n, 2) float64 array,
+    'polyline' - ``route_polyline`` string with ROUTE_PRECISION digits.
+    ``tolerance_m`` simplifies the line with Douglas-Peucker first.
+    """
+    if geometry not in GEOMETRY_FORMATS:
+        raise ValueError(f'Unknown route geometry format: {geometry}')
+    points = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if tolerance_m:
+        points = simplify_line(points, tolerance_m)
+    if geometry == 'polyline':
+        return {'route_polyline': encode_polyline(points, ROUTE_PRECISION)}
+    if geometry == 'array':
+        return {'route_coordinates': points}
+    return {'route_coordinates': points.tolist()}
+
+
+def route_geometry(polyline: str, geometry: str = 'coordinates',
+                   tolerance_m: float = None) -> Dict:
+    """Route geometry fields (see line_geometry) from a full-resolution route polyline"""
+    if geometry == 'polyline' and not tolerance_m:
+        return {'route_polyline': polyline}
+    return line_geometry(decode_polyline(polyline, ROUTE_PRECISION), geometry, tolerance_m)
+
+
+def route_points(route: Dict) -> List[List[float]]:
+    """Route line as [[lat, lon], ...] from any of the geometry formats (for maps)"""
+    coordinates = route.get('route_coordinates')
+    if coordinates is not None:
+        return coordinates.tolist() if isinstance(coordinates, np.ndarray) else coordinates
+    if route.get('route_polyline'):
+        return decode_polyline(route['route_polyline'], ROUTE_PRECISION).tolist()
+    return []
@@ -1,5 +1,5 @@
 from ..models import FareRule
-from .geo import is_point_in_city
+from .city_registry import city_registry
 
 async def calculate_fare(route, car_class='standard'):
     """Calculate fare for a route"""
@@ -18,28 +18,12 @@ async def calculate_fare(route, car_class='standard'):
     # Get route details
     distance = route['distance']  # in kilometers
     
-    # Check if route is within city
-    start_in_city = is_point_in_city(
-        route['start_location']['lat'],
-        route['start_location']['lng'],
-        {
-            'north': 56.5,  # Примерные координаты города
-            'south': 56.0,
-            'west': 92.5,
-            'east': 93.0
-        }
-    )
-    
-    end_in_city = is_point_in_city(
-        route['end_location']['lat'],
-        route['end_location']['lng'],
-        {
-            'north': 56.5,
-            'south': 56.0,
-            'west': 92.5,
-            'east': 93.0
-        }
-    )
+    # Check if route is within the fare zone of the pickup city
+    start = route['start_location']
+    end = route['end_location']
+    city = city_registry.city_for(start['lat'], start['lng']) or city_registry.default
+    start_in_city = city.in_fare_zone(start['lat'], start['lng'])
+    end_in_city = city.in_fare_zone(end['lat'], end['lng'])
     
     # Calculate fare based on location
     if start_in_city and end_in_city:
@@ -0,0 +1,456 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .spatial_index import SpatialIndex, build_grid
+from .speed_profiles import HOURS_PER_WEEK, default_speed_profiles
+
+logger = logging.getLogger(__name__)
+
+# Формат файла: magic, версия формата, длина JSON-заголовка, заголовок, массивы
+MAGIC = b'TXRNET\x00\x00'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+EARTH_RADIUS_KM = 6371.0088
+
+# Скорости по умолчанию для классов дорог, км/ч
+DEFAULT_SPEED_LIMITS = {
+    'motorway': 110,
+    'trunk': 90,
+    'primary': 60,
+    'secondary': 50,
+    'tertiary': 40,
+    'residential': 30,
+    'living_street': 20
+}
+DEFAULT_SPEED = 30
+
+# Классы дорог в порядке кодов edge_highway; последний код - прочие дороги
+HIGHWAY_CLASSES = [
+    'motorway', 'trunk', 'primary', 'secondary',
+    'tertiary', 'residential', 'living_street', 'other'
+]
+
+# Сколько массивов весов по часам недели держать в памяти процесса
+TIME_WEIGHTS_CACHE = 4
+
+# Обязательные массивы сети и их типы
+ARRAY_DTYPES = {
+    'node_osmid': np.int64,
+    'node_lat': np.float64,
+    'node_lon': np.float64,
+    'indptr': np.int64,
+    'edge_tail': np.int32,
+    'edge_head': np.int32,
+    'edge_length': np.float32,
+    'edge_time': np.float32,
+    'edge_highway': np.uint8,
+    'rev_indptr': np.int64,
+    'rev_edges': np.int32
+}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance in kilometers"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def highway_code(highway) -> int:
+    """Map OSM highway tag (or list of tags) to edge_highway code"""
+    if isinstance(highway, list):
+        highway = highway[0] if highway else None
+    if highway in HIGHWAY_CLASSES:
+        return HIGHWAY_CLASSES.index(highway)
+    return len(HIGHWAY_CLASSES) - 1
+
+
+def class_speeds(speed_limits: Dict[str, int], default_speed: int = DEFAULT_SPEED) -> np.ndarray:
+    """Speed (km/h) per highway class code"""
+    return np.array(
+        [speed_limits.get(name, default_speed) for name in HIGHWAY_CLASSES],
+        dtype=np.float32
+    )
+
+
+def save_arrays(path: str, arrays: Dict[str, np.ndarray], meta: Dict) -> Dict:
+    """Write named arrays and JSON metadata to an aligned binary file.
+
+    ``meta['version']`` defaults to a content hash, so artifacts built from the
+    same data get the same version. Returns the metadata actually written.
+    """
+    meta = dict(meta)
+    digest = hashlib.sha1()
+    for array in arrays.values():
+        digest.update(np.ascontiguousarray(array).tobytes())
+    meta.setdefault('version', digest.hexdigest()[:16])
+    meta.setdefault('created_at', datetime.now().isoformat())
+
+    # Смещения массивов считаются от начала файла, поэтому пересчитываем
+    # раскладку, пока длина заголовка не перестанет меняться
+    header = b''
+    while True:
+        layout = {}
+        offset = 16 + len(header)
+        for name, array in arrays.items():
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            layout[name] = {
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                'offset': offset
+            }
+            offset += array.nbytes
+        encoded = json.dumps({'meta': meta, 'arrays': layout}).encode('utf-8')
+        encoded += b' ' * (ALIGNMENT - len(encoded) % ALIGNMENT)
+        if len(encoded) == len(header):
+            header = encoded
+            break
+        header = encoded
+
+    tmp_path = f'{path}.tmp'
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<II', FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.write(b'\x00' * (layout[name]['offset'] - f.tell()))
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp_path, path)
+    return meta
+
+
+def load_arrays(path: str) -> Tuple[Dict[str, np.ndarray], Dict, mmap.mmap]:
+    """Map a file written by save_arrays; arrays are read-only views of the mmap"""
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:8] != MAGIC:
+        raise ValueError(f'{path} is not a road network file')
+    format_version, header_len = struct.unpack('<II', buffer[8:16])
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported road network format version {format_version}')
+    header = json.loads(buffer[16:16 + header_len].decode('utf-8'))
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        arrays[name] = np.frombuffer(
+            buffer, dtype=dtype, count=count, offset=spec['offset']
+        ).reshape(spec['shape'])
+    return arrays, header['meta'], buffer
+
+
+class RoadNetwork:
+    """Compact directed road network: node coordinates and CSR adjacency in NumPy arrays.
+
+    Edges are sorted by tail node, so edge ``e`` of node ``u`` lives in
+    ``indptr[u]:indptr[u + 1]`` and ``edge_head[e]`` is its target. Nodes are
+    sorted by OSM id. ``rev_edges`` groups edge ids by head node for backward
+    searches. Networks saved with :meth:`save` are opened with mmap, so all
+    processes on a host share the same pages.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict = None, buffer=None):
+        self.arrays = arrays
+        self.meta = meta or {}
+        self._buffer = buffer
+        self._spatial_index = None
+        self._time_weights = {}
+        self._time_weights_lock = threading.Lock()
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_osmid)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_head)
+
+    @property
+    def version(self) -> str:
+        return self.meta.get('version', '')
+
+    @property
+    def weights_version(self) -> str:
+        """Version of the network together with speed profiles applied after loading (cache keys of travel times)"""
+        speeds = self.meta.get('speeds_version')
+        return f'{self.version}.{speeds}' if speeds else self.version
+
+    @property
+    def max_speed_kmh(self) -> float:
+        """Highest edge speed, used as the travel-time lower bound for A*"""
+        if 'max_speed_kmh' not in self.meta:
+            speeds = self.edge_length / np.maximum(self.edge_time, 1e-6) * 3.6
+            self.meta['max_speed_kmh'] = float(speeds.max()) if len(speeds) else DEFAULT_SPEED
+        return self.meta['max_speed_kmh']
+
+    @property
+    def spatial_index(self):
+        """Grid index for snapping points, stored in the artifact or built on first use"""
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex.for_network(self)
+        return self._spatial_index
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays.values())
+
+    @classmethod
+    def from_arrays(cls, osmids, lats, lons, tails, heads, lengths,
+                    times=None, highway=None, speed_limits: Dict[str, int] = None,
+                    meta: Dict = None, street=None) -> 'RoadNetwork':
+        """Build network from node arrays and edge lists given as node positions
+
+        ``street`` optionally gives each edge an index into ``meta['streets']``
+        (-1 for unnamed edges); it is stored as the ``edge_street`` array.
+        """
+        osmids = np.asarray(osmids, dtype=np.int64)
+        node_order = np.argsort(osmids, kind='stable')
+        node_rank = np.empty_like(node_order)
+        node_rank[node_order] = np.arange(len(node_order))
+
+        tails = node_rank[np.asarray(tails, dtype=np.int64)]
+        heads = node_rank[np.asarray(heads, dtype=np.int64)]
+        lengths = np.asarray(lengths, dtype=np.float32)
+        if highway is None:
+            highway = np.full(len(tails), len(HIGHWAY_CLASSES) - 1, dtype=np.uint8)
+        highway = np.asarray(highway, dtype=np.uint8)
+        if times is None:
+            # Время проезда в секундах по скорости класса дороги
+            speeds = class_speeds(speed_limits or DEFAULT_SPEED_LIMITS)
+            times = lengths / (speeds[highway] / 3.6)
+        times = np.asarray(times, dtype=np.float32)
+
+        edge_order = np.lexsort((heads, tails))
+        tails = tails[edge_order]
+        heads = heads[edge_order]
+        node_count = len(osmids)
+
+        indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=node_count), out=indptr[1:])
+        rev_indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads, minlength=node_count), out=rev_indptr[1:])
+
+        arrays = {
+            'node_osmid': osmids[node_order],
+            'node_lat': np.asarray(lats, dtype=np.float64)[node_order],
+            'node_lon': np.asarray(lons, dtype=np.float64)[node_order],
+            'indptr': indptr,
+            'edge_tail': tails.astype(np.int32),
+            'edge_head': heads.astype(np.int32),
+            'edge_length': lengths[edge_order],
+            'edge_time': times[edge_order],
+            'edge_highway': highway[edge_order],
+            'rev_indptr': rev_indptr,
+            'rev_edges': np.argsort(heads, kind='stable').astype(np.int32)
+        }
+        if street is not None:
+            arrays['edge_street'] = np.asarray(street, dtype=np.int32)[edge_order]
+        return cls(arrays, dict(meta or {}))
+
+    @classmethod
+    def from_networkx(cls, graph, speed_limits: Dict[str, int] = None) -> 'RoadNetwork':
+        """Convert an osmnx MultiDiGraph into a compact network"""
+        osmids = np.fromiter(graph.nodes, dtype=np.int64, count=len(graph))
+        position = {node: i for i, node in enumerate(graph.nodes)}
+        lats = np.array([float(data['y']) for _, data in graph.nodes(data=True)])
+        lons = np.array([float(data['x']) for _, data in graph.nodes(data=True)])
+
+        edge_count = graph.number_of_edges()
+        tails = np.empty(edge_count, dtype=np.int64)
+        heads = np.empty(edge_count, dtype=np.int64)
+        lengths = np.empty(edge_count, dtype=np.float32)
+        highway = np.empty(edge_count, dtype=np.uint8)
+        street = np.full(edge_count, -1, dtype=np.int32)
+        streets = {}
+        for i, (u, v, data) in enumerate(graph.edges(data=True)):
+            tails[i] = position[u]
+            heads[i] = position[v]
+            lengths[i] = float(data.get('length', 0))
+            highway[i] = highway_code(data.get('highway'))
+            name = data.get('name')
+            if isinstance(name, list):
+                name = name[0] if name else None
+            if name:
+                street[i] = streets.setdefault(str(name), len(streets))
+
+        return cls.from_arrays(osmids, lats, lons, tails, heads, lengths,
+                               highway=highway, speed_limits=speed_limits,
+                               meta={'streets': list(streets)}, street=street)
+
+    def save(self, path: str) -> str:
+        """Write network to a binary file suitable for mmap loading"""
+        self.meta = save_arrays(path, self.arrays, self.meta)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'RoadNetwork':
+        """Open a saved network with mmap (read-only, shared between processes)"""
+        arrays, meta, buffer = load_arrays(path)
+        missing = [name for name in ARRAY_DTYPES if name not in arrays]
+        if missing:
+            raise ValueError(f"{path} is missing arrays: {', '.join(missing)}")
+        return cls(arrays, meta, buffer)
+
+    def node_index(self, osmid: int) -> Optional[int]:
+        """Position of node with given OSM id"""
+        i = int(np.searchsorted(self.node_osmid, osmid))
+        if i < self.node_count and self.node_osmid[i] == osmid:
+            return i
+        return None
+
+    def node_coords(self, node: int) -> Tuple[float, float]:
+        return float(self.node_lat[node]), float(self.node_lon[node])
+
+    def add_spatial_index(self):
+        """Store the snapping grid in the network arrays so it is saved with the artifact"""
+        arrays, grid = build_grid(self)
+        for name, array in arrays.items():
+            self.arrays[name] = array
+            setattr(self, name, array)
+        self.meta['grid'] = grid
+        self._spatial_index = None
+
+    def set_speed_profiles(self, profiles: np.ndarray, edge_profile: np.ndarray):
+        """Store hour-of-week travel time multipliers, shape (profiles, 168), and a profile per edge"""
+        profiles = np.asarray(profiles, dtype=np.float32)
+        edge_profile = np.asarray(edge_profile, dtype=np.uint16)
+        if profiles.ndim != 2 or profiles.shape[1] != HOURS_PER_WEEK:
+            raise ValueError(f'Speed profiles must have shape (n, {HOURS_PER_WEEK})')
+        if len(edge_profile) != self.edge_count or edge_profile.max(initial=0) >= len(profiles):
+            raise ValueError('Edge profile ids do not match the network or the profiles')
+        self.arrays['speed_profiles'] = self.speed_profiles = profiles
+        self.arrays['edge_profile'] = self.edge_profile = edge_profile
+        # Версия сети описывает файл, а маршруты зависят и от профилей
+        digest = hashlib.sha1(profiles.tobytes())
+        digest.update(edge_profile.tobytes())
+        self.meta['speeds_version'] = digest.hexdigest()[:16]
+        with self._time_weights_lock:
+            self._time_weights.clear()
+
+    def _profiles(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Profiles and per-edge profile ids; networks without them get one default profile per road class"""
+        if 'speed_profiles' in self.arrays:
+            return self.speed_profiles, self.edge_profile
+        return default_speed_profiles(len(HIGHWAY_CLASSES)), self.edge_highway
+
+    def time_weights(self, hour: int) -> np.ndarray:
+        """Edge travel times (seconds) for an hour of week, computed once per hour and kept in a small cache"""
+        with self._time_weights_lock:
+            weights = self._time_weights.get(hour)
+        if weights is None:
+            profiles, edge_profile = self._profiles()
+            weights = self.edge_time * profiles[:, hour][edge_profile]
+            weights.flags.writeable = False
+            with self._time_weights_lock:
+                while len(self._time_weights) >= TIME_WEIGHTS_CACHE:
+                    self._time_weights.pop(next(iter(self._time_weights)))
+                self._time_weights[hour] = weights
+        return weights
+
+    def uniform_time_factor(self, hour: int) -> Optional[float]:
+        """Multiplier of an hour if all profiles share it (shortest paths equal free-flow ones), else None"""
+        factors = self._profiles()[0][:, hour]
+        return float(factors[0]) if np.all(factors == factors[0]) else None
+
+    def max_speed_at(self, hour: int) -> float:
+        """Upper bound of edge speeds for an hour of week, for the A* lower bound over time_weights"""
+        return self.max_speed_kmh / float(self._profiles()[0][:, hour].min())
+
+    def nearest_node(self, lat: float, lon: float) -> int:
+        """Nearest graph node to a point"""
+        return self.spatial_index.snap(lat, lon)
+
+    def snap_many(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest nodes and distances in meters for arrays of points"""
+        return self.spatial_index.snap_many(lats, lons)
+
+    def snap_edge(self, lat: float, lon: float) -> Dict:
+        """Nearest edge to a point: ``edge``, ``fraction`` from its tail, projection ``lat``/``lon``"""
+        return self.spatial_index.snap_edge(lat, lon)
+
+    def nodes_in_bbox(self, bbox: Tuple[float, float, float, float]) -> np.ndarray:
+        """Node positions inside (min_lat, min_lon, max_lat, max_lon)"""
+        mask = ((self.node_lat >= bbox[0]) & (self.node_lat <= bbox[2]) &
+                (self.node_lon >= bbox[1]) & (self.node_lon <= bbox[3]))
+        return np.flatnonzero(mask)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Check if point lies within the network bounding box"""
+        bounds = self.meta.get('bounds')
+        if not bounds:
+            bounds = {
+                'south': float(self.node_lat.min()), 'north': float(self.node_lat.max()),
+                'west': float(self.node_lon.min()), 'east': float(self.node_lon.max())
+            }
+            self.meta['bounds'] = bounds
+        return (bounds['south'] <= lat <= bounds['north'] and
+                bounds['west'] <= lon <= bounds['east'])
+
+    def out_edges(self, node: int) -> range:
+        return range(int(self.indptr[node]), int(self.indptr[node + 1]))
+
+    def in_edges(self, node: int) -> np.ndarray:
+        return self.rev_edges[self.rev_indptr[node]:self.rev_indptr[node + 1]]
+
+    def street_name(self, edge: int) -> Optional[str]:
+        """Street name of an edge if the network was built with names"""
+        if 'edge_street' not in self.arrays:
+            return None
+        street = int(self.edge_street[edge])
+        return self.meta['streets'][street] if street >= 0 else None
+
+    def reverse_edge(self, edge: int) -> Optional[int]:
+        """Edge running the opposite way between the same nodes (two-way streets)"""
+        tail, head = int(self.edge_tail[edge]), int(self.edge_head[edge])
+        start, end = int(self.indptr[head]), int(self.indptr[head + 1])
+        matches = np.flatnonzero(self.edge_head[start:end] == tail)
+        return start + int(matches[0]) if len(matches) else None
+
+    def edge_weights(self, weight: str = 'time') -> np.ndarray:
+        """Per-edge weight array: 'time' (seconds) or 'length' (meters)"""
+        if weight == 'length':
+            return self.edge_length
+        return self.edge_time
+
+    def path_nodes(self, edges: List[int], source: int = None) -> List[int]:
+        """Node sequence of a path given by edge ids"""
+        if not edges:
+            return [source] if source is not None else []
+        edges = np.asarray(edges, dtype=np.int64)
+        return [int(self.edge_tail[edges[0]])] + self.edge_head[edges].tolist()
+
+    def path_coordinates(self, nodes: List[int]) -> List[List[float]]:
+        """[[lat, lon], ...] for a node sequence"""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        return np.column_stack((self.node_lat[nodes], self.node_lon[nodes])).tolist()
+
+    def to_networkx(self, nodes: np.ndarray = None):
+        """Build a networkx DiGraph (optionally induced by ``nodes``) for graph analytics"""
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        if nodes is None:
+            nodes = np.arange(self.node_count)
+        keep = np.zeros(self.node_count, dtype=bool)
+        keep[nodes] = True
+        for node in nodes.tolist():
+            graph.add_node(node, y=float(self.node_lat[node]), x=float(self.node_lon[node]))
+        edges = np.flatnonzero(keep[self.edge_tail] & keep[self.edge_head])
+        graph.add_weighted_edges_from(
+            zip(self.edge_tail[edges].tolist(), self.edge_head[edges].tolist(),
+                self.edge_length[edges].tolist()),
+            weight='length'
+        )
+        return graph
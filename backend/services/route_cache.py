@@ -0,0 +1,105 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# Шаг, с которым доля пройденного ребра входит в ключ: поездки от соседних
+# подъездов одного торгового центра или вокзала попадают в одну запись
+FRACTION_STEP = 0.1
+
+
+class RouteCache:
+    """Two-tier cache of calculated routes: in-process LRU in front of Redis.
+
+    Keys include the network version, so routes built on an old graph
+    artifact are never served after a rebuild. Entries of several networks
+    (cities, tile-stitched trips) share the cache; entries of a replaced
+    version are no longer read and leave the local LRU as it fills, Redis
+    entries expire by TTL.
+    """
+
+    def __init__(self, redis_client, max_entries: int = None, ttl: int = None,
+                 prefix: str = 'route'):
+        self.redis = redis_client
+        self.max_entries = max_entries if max_entries is not None else Config.ROUTE_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else Config.ROUTE_CACHE_TTL
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'local_hits': 0, 'redis_hits': 0, 'misses': 0,
+            'evictions': 0, 'redis_errors': 0
+        }
+
+    def make_key(self, network_version: str, origin: Dict, destination: Dict,
+                 weighting: str, time_bucket: str, alternatives: int = 1) -> str:
+        """Key from snapped edges (see RoadNetwork.snap_edge), weighting and traffic bucket"""
+        def position(snapped: Dict) -> Tuple[int, int]:
+            return snapped['edge'], int(round(snapped['fraction'] / FRACTION_STEP))
+
+        return '{}:{}:{}.{}:{}.{}:{}:{}:{}'.format(
+            self.prefix, network_version, *position(origin), *position(destination),
+            weighting, time_bucket, alternatives
+        )
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._stats['local_hits'] += 1
+                return value
+
+        try:
+            cached = self.redis.get(key)
+        except Exception as e:
+            logger.error(f"Error reading route cache: {str(e)}")
+            cached = None
+            with self._lock:
+                self._stats['redis_errors'] += 1
+
+        with self._lock:
+            if cached is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['redis_hits'] += 1
+        value = json.loads(cached)
+        self._put_local(key, value)
+        return value
+
+    def set(self, key: str, value: List[Dict]):
+        self._put_local(key, value)
+        try:
+            self.redis.setex(key, self.ttl, json.dumps(value))
+        except Exception as e:
+            logger.error(f"Error writing route cache: {str(e)}")
+            with self._lock:
+                self._stats['redis_errors'] += 1
+
+    def _put_local(self, key: str, value: List[Dict]):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Hit/miss/eviction counters of this process and the local LRU size"""
+        with self._lock:
+            lookups = self._stats['local_hits'] + self._stats['redis_hits'] + self._stats['misses']
+            hits = self._stats['local_hits'] + self._stats['redis_hits']
+            return dict(
+                self._stats,
+                size=len(self._entries),
+                max_entries=self.max_entries,
+                hit_rate=round(hits / lookups, 3) if lookups else 0.0
+            )
@@ -0,0 +1,605 @@
+import math
+import time
+import heapq
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+from ..config import Config
+from .road_network import EARTH_RADIUS_KM, RoadNetwork
+
+logger = logging.getLogger(__name__)
+
+# Точка маршрута: узел сети или привязка к ребру из snap_endpoint
+Endpoint = Union[int, Dict[int, Tuple[int, float]]]
+
+ENGINES = ('ch', 'astar', 'dijkstra')
+
+# Запас, чтобы округления не сделали нижнюю оценку A* больше реального пути
+LOWER_BOUND_FACTOR = 0.99
+
+# Альтернативные маршруты: штраф рёбер найденных путей, доля общей длины с
+# основным маршрутом, выше которой вариант отбрасывается, и число попыток на вариант
+ALTERNATIVE_PENALTY = 1.5
+ALTERNATIVE_MAX_OVERLAP = 0.7
+ALTERNATIVE_ATTEMPTS = 3
+
+# Статистика поисков процесса по движкам: число запросов, settled-узлы, время
+_search_stats = {}
+_search_stats_lock = threading.Lock()
+
+
+def _unwind(network: RoadNetwork, pred_edge: Dict[int, int], node: int) -> Tuple[List[int], int]:
+    """Edge ids of the path recorded in pred_edge that ends at node, and its start node"""
+    edges = []
+    edge_tail = network.edge_tail
+    while node in pred_edge:
+        edge = pred_edge[node]
+        edges.append(edge)
+        node = int(edge_tail[edge])
+    edges.reverse()
+    return edges, node
+
+
+def snap_endpoint(network: RoadNetwork, snapped: Dict, origin: bool = True) -> Dict[int, Tuple[int, float]]:
+    """Search endpoint for a point snapped onto an edge (see RoadNetwork.snap_edge).
+
+    Maps every node the search may start from (``origin``) or finish at to the
+    partial edge ``(edge, share)`` between it and the projection point. Two-way
+    streets contribute both directions.
+    """
+    edge, fraction = snapped['edge'], snapped['fraction']
+    tail, head = int(network.edge_tail[edge]), int(network.edge_head[edge])
+    endpoint = {head: (edge, 1 - fraction)} if origin else {tail: (edge, fraction)}
+    reverse = network.reverse_edge(edge)
+    if reverse is not None:
+        if origin:
+            endpoint.setdefault(tail, (reverse, fraction))
+        else:
+            endpoint.setdefault(head, (reverse, 1 - fraction))
+    return endpoint
+
+
+def _seeds(point: Endpoint, weights: np.ndarray) -> Dict[int, float]:
+    """Initial search distances: a node id or a snapped endpoint with partial edge costs"""
+    if isinstance(point, dict):
+        return {node: share * float(weights[edge]) for node, (edge, share) in point.items()}
+    return {int(point): 0.0}
+
+
+def dijkstra(network: RoadNetwork, source: Endpoint, target: Endpoint,
+             weights: np.ndarray = None, penalties: Dict[int, float] = None) -> Optional[Dict]:
+    """Point-to-point Dijkstra over the CSR adjacency.
+
+    ``source`` and ``target`` are node ids or snapped endpoints.
+    ``penalties`` overrides the weight of individual edges without copying
+    ``weights``. Returns ``{'edges': [...], 'cost': float, 'settled': int,
+    'source': node, 'target': node}`` or None when the target is unreachable.
+    """
+    if weights is None:
+        weights = network.edge_time
+    indptr = network.indptr
+    edge_head = network.edge_head
+
+    dist = _seeds(source, weights)
+    targets = _seeds(target, weights)
+    pred_edge = {}
+    settled = set()
+    heap = [(d, node) for node, d in dist.items()]
+    heapq.heapify(heap)
+    best = float('inf')
+    meet = None
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d >= best:
+            break
+        if u in settled:
+            continue
+        settled.add(u)
+        if u in targets and d + targets[u] < best:
+            best = d + targets[u]
+            meet = u
+        start, end = int(indptr[u]), int(indptr[u + 1])
+        edge_weights = weights[start:end].tolist()
+        if penalties:
+            edge_weights = [penalties.get(edge, w) for edge, w in zip(range(start, end), edge_weights)]
+        for edge, v, w in zip(range(start, end), edge_head[start:end].tolist(), edge_weights):
+            nd = d + w
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                pred_edge[v] = edge
+                heapq.heappush(heap, (nd, v))
+
+    if meet is None:
+        return None
+    edges, start_node = _unwind(network, pred_edge, meet)
+    return {
+        'edges': edges,
+        'cost': best,
+        'settled': len(settled),
+        'source': start_node,
+        'target': meet
+    }
+
+
+def _straight_line_m(lat1: float, lon1: float, cos_lat1: float, lat2: float, lon2: float) -> float:
+    sin_dlat = math.sin(math.radians(lat2 - lat1) / 2)
+    sin_dlon = math.sin(math.radians(lon2 - lon1) / 2)
+    a = sin_dlat * sin_dlat + cos_lat1 * math.cos(math.radians(lat2)) * sin_dlon * sin_dlon
+    return 2000 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bidirectional_astar(network: RoadNetwork, source: Endpoint, target: Endpoint,
+                        weights: np.ndarray = None, weight: str = 'time',
+                        max_speed_kmh: float = None,
+                        penalties: Dict[int, float] = None) -> Optional[Dict]:
+    """Bidirectional A* with a straight-line lower bound.
+
+    For ``weight='time'`` the bound is the geodesic distance driven at
+    ``max_speed_kmh`` (network maximum by default); for ``'length'`` it is the
+    geodesic distance itself. ``weights`` and ``penalties`` (per-edge
+    overrides) must not go below the base weighting. ``source`` and
+    ``target`` are node ids or snapped endpoints. Both searches use
+    the averaged potential ``(h_t - h_s) / 2``, so the search stops once the
+    two smallest keys add up to the best path found.
+    """
+    if weights is None:
+        weights = network.edge_weights(weight)
+    if not isinstance(source, dict) and source == target:
+        return {'edges': [], 'cost': 0.0, 'settled': 0, 'source': source, 'target': target}
+    sources = _seeds(source, weights)
+    targets = _seeds(target, weights)
+
+    if weight == 'length':
+        scale = LOWER_BOUND_FACTOR
+    else:
+        scale = LOWER_BOUND_FACTOR * 3.6 / (max_speed_kmh or network.max_speed_kmh)
+
+    node_lat = network.node_lat
+    node_lon = network.node_lon
+    # Потенциал допустим относительно любой точки; берём первые узлы концов
+    s_lat, s_lon = network.node_coords(next(iter(sources)))
+    t_lat, t_lon = network.node_coords(next(iter(targets)))
+    cos_s, cos_t = math.cos(math.radians(s_lat)), math.cos(math.radians(t_lat))
+    potentials = {}
+
+    def potential(v):
+        p = potentials.get(v)
+        if p is None:
+            lat, lon = float(node_lat[v]), float(node_lon[v])
+            p = scale * (_straight_line_m(t_lat, t_lon, cos_t, lat, lon) -
+                         _straight_line_m(s_lat, s_lon, cos_s, lat, lon)) / 2
+            potentials[v] = p
+        return p
+
+    indptr = network.indptr
+    edge_head = network.edge_head
+    edge_tail = network.edge_tail
+    rev_indptr = network.rev_indptr
+    rev_edges = network.rev_edges
+
+    # Прямой поиск с потенциалом p, обратный с -p
+    dists = (dict(sources), dict(targets))
+    preds = ({}, {})
+    heaps = ([(d + potential(v), v) for v, d in sources.items()],
+             [(d - potential(v), v) for v, d in targets.items()])
+    for heap in heaps:
+        heapq.heapify(heap)
+    settled = (set(), set())
+    best = float('inf')
+    meet = None
+    for v, d in sources.items():
+        if v in targets and d + targets[v] < best:
+            best = d + targets[v]
+            meet = v
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        _, u = heapq.heappop(heaps[side])
+        if u in settled[side]:
+            continue
+        settled[side].add(u)
+        dist = dists[side]
+        d = dist[u]
+
+        if side == 0:
+            start, end = int(indptr[u]), int(indptr[u + 1])
+            edges = range(start, end)
+            neighbors = edge_head[start:end].tolist()
+            edge_weights = weights[start:end].tolist()
+            sign = 1
+        else:
+            in_edges = rev_edges[rev_indptr[u]:rev_indptr[u + 1]]
+            edges = in_edges.tolist()
+            neighbors = edge_tail[in_edges].tolist()
+            edge_weights = weights[in_edges].tolist()
+            sign = -1
+        if penalties:
+            edge_weights = [penalties.get(edge, w) for edge, w in zip(edges, edge_weights)]
+
+        for edge, v, w in zip(edges, neighbors, edge_weights):
+            nd = d + w
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                preds[side][v] = edge
+                heapq.heappush(heaps[side], (nd + sign * potential(v), v))
+                other = dists[1 - side].get(v)
+                if other is not None and nd + other < best:
+                    best = nd + other
+                    meet = v
+
+    if meet is None:
+        return None
+
+    edges, start_node = _unwind(network, preds[0], meet)
+    node = meet
+    while node in preds[1]:
+        edge = preds[1][node]
+        edges.append(edge)
+        node = int(edge_head[edge])
+    return {
+        'edges': edges,
+        'cost': best,
+        'settled': len(settled[0]) + len(settled[1]),
+        'source': start_node,
+        'target': node
+    }
+
+
+def hierarchy_astar(network: RoadNetwork, source: Endpoint, target: Endpoint, hierarchy,
+                    weights: np.ndarray, max_speed_kmh: float = None,
+                    penalties: Dict[int, float] = None) -> Optional[Dict]:
+    """A* over custom weights with exact hierarchy distances as the potential.
+
+    The hierarchy gives shortest free-flow distances from every node to
+    ``target`` (:meth:`ContractionHierarchy.distances_to`); scaled by the smallest
+    multiplier of ``weights`` over the hierarchy weighting (derived from
+    ``max_speed_kmh`` for time as in :func:`bidirectional_astar`) they stay a
+    consistent lower bound. Learned speed profiles and ``penalties`` change
+    the weights of single edges, so the potential follows real road distances
+    instead of straight lines and the search settles far fewer nodes.
+    """
+    if not isinstance(source, dict) and source == target:
+        return {'edges': [], 'cost': 0.0, 'settled': 0, 'source': source, 'target': target}
+    scale = LOWER_BOUND_FACTOR
+    if hierarchy.weight == 'time' and max_speed_kmh:
+        scale *= network.max_speed_kmh / max_speed_kmh
+    free_flow = network.edge_weights(hierarchy.weight)
+    potentials = scale * hierarchy.distances_to(_seeds(target, free_flow))
+
+    indptr = network.indptr
+    edge_head = network.edge_head
+    dist = _seeds(source, weights)
+    targets = _seeds(target, weights)
+    pred_edge = {}
+    settled = set()
+    heap = [(d + float(potentials[node]), node) for node, d in dist.items()]
+    heapq.heapify(heap)
+    best = float('inf')
+    meet = None
+    while heap:
+        key, u = heapq.heappop(heap)
+        if key >= best:
+            break
+        if u in settled:
+            continue
+        settled.add(u)
+        d = dist[u]
+        if u in targets and d + targets[u] < best:
+            best = d + targets[u]
+            meet = u
+        start, end = int(indptr[u]), int(indptr[u + 1])
+        edge_weights = weights[start:end].tolist()
+        if penalties:
+            edge_weights = [penalties.get(edge, w) for edge, w in zip(range(start, end), edge_weights)]
+        heads = edge_head[start:end]
+        for edge, v, w, p in zip(range(start, end), heads.tolist(), edge_weights,
+                                 potentials[heads].tolist()):
+            nd = d + w
+            # Из узлов с бесконечным потенциалом цель недостижима
+            if nd < dist.get(v, float('inf')) and p != float('inf'):
+                dist[v] = nd
+                pred_edge[v] = edge
+                heapq.heappush(heap, (nd + p, v))
+
+    if meet is None:
+        return None
+    edges, start_node = _unwind(network, pred_edge, meet)
+    return {
+        'edges': edges,
+        'cost': best,
+        'settled': len(settled),
+        'source': start_node,
+        'target': meet
+    }
+
+
+def _record_search(engine: str, result: Optional[Dict], elapsed_ms: float):
+    with _search_stats_lock:
+        stats = _search_stats.setdefault(
+            engine, {'queries': 0, 'not_found': 0, 'settled': 0, 'elapsed_ms': 0.0}
+        )
+        stats['queries'] += 1
+        stats['elapsed_ms'] += elapsed_ms
+        if result is None:
+            stats['not_found'] += 1
+        else:
+            stats['settled'] += result['settled']
+
+
+def get_search_stats() -> Dict[str, Dict]:
+    """Per-engine search statistics of this process with averages"""
+    with _search_stats_lock:
+        report = {}
+        for engine, stats in _search_stats.items():
+            queries = stats['queries'] or 1
+            report[engine] = dict(
+                stats,
+                avg_settled=round(stats['settled'] / queries, 1),
+                avg_elapsed_ms=round(stats['elapsed_ms'] / queries, 3)
+            )
+        return report
+
+
+def _direct_path(network: RoadNetwork, source: Endpoint, target: Endpoint,
+                 weights: np.ndarray) -> Optional[Dict]:
+    """Path along a single edge when both endpoints are snapped onto it in driving order"""
+    if not isinstance(source, dict) or not isinstance(target, dict):
+        return None
+    best = None
+    for edge, share in source.values():
+        for target_edge, target_share in target.values():
+            if edge != target_edge or share + target_share < 1:
+                continue
+            cost = (share + target_share - 1) * float(weights[edge])
+            if best is None or cost < best['cost']:
+                best = {
+                    'edges': [], 'cost': cost, 'settled': 0, 'source': None, 'target': None,
+                    'partial': [(edge, share + target_share - 1)]
+                }
+    return best
+
+
+def shortest_path(network: RoadNetwork, source: Endpoint, target: Endpoint,
+                  weight: str = 'time', hierarchy=None, engine: str = None,
+                  weights: np.ndarray = None,
+                  penalties: Dict[int, float] = None,
+                  max_speed_kmh: float = None) -> Optional[Dict]:
+    """Shortest path by 'time' or 'length' with the selected engine.
+
+    ``engine`` is 'ch', 'astar' or 'dijkstra' (default Config.ROUTING_ENGINE).
+    'ch' needs a hierarchy built for this network and weighting and falls back
+    to 'astar' otherwise. A search over custom ``weights`` (such as
+    RoadNetwork.time_weights) or with per-edge ``penalties`` cannot use the
+    hierarchy directly and runs as 'ch_astar' (:func:`hierarchy_astar`).
+    Weights faster than free flow need ``max_speed_kmh`` for the A* bound. ``source`` and
+    ``target`` are node ids or snapped endpoints from :func:`snap_endpoint`;
+    ``partial`` then lists the ``(edge, share)`` pieces of edges driven at
+    both ends. The result gets ``engine`` and ``elapsed_ms`` next to the
+    settled-node count.
+    """
+    engine = engine or Config.ROUTING_ENGINE
+    if engine == 'ch':
+        if (hierarchy is None or hierarchy.weight != weight or
+                hierarchy.network_version != network.version):
+            engine = 'astar'
+        elif weights is not None or penalties:
+            engine = 'ch_astar'
+    if weights is None:
+        weights = network.edge_weights(weight)
+
+    started = time.perf_counter()
+    if engine == 'ch_astar':
+        result = hierarchy_astar(network, source, target, hierarchy, weights,
+                                 max_speed_kmh, penalties)
+    elif engine == 'ch':
+        result = hierarchy.query(_seeds(source, weights) if isinstance(source, dict) else source,
+                                 _seeds(target, weights) if isinstance(target, dict) else target)
+    elif engine == 'dijkstra':
+        result = dijkstra(network, source, target, weights, penalties)
+    else:
+        result = bidirectional_astar(network, source, target, weights, weight,
+                                     max_speed_kmh, penalties)
+
+    if result is not None:
+        result['partial'] = []
+        if isinstance(source, dict):
+            result['partial'].append(source[result['source']])
+        if isinstance(target, dict):
+            result['partial'].append(target[result['target']])
+    direct = _direct_path(network, source, target, weights)
+    if direct is not None and (result is None or direct['cost'] <= result['cost']):
+        result = direct
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    _record_search(engine, result, elapsed_ms)
+    if result is not None:
+        result['engine'] = engine
+        result['elapsed_ms'] = round(elapsed_ms, 3)
+        logger.debug(f"{engine} search: {result['settled']} settled, {elapsed_ms:.2f} ms")
+    return result
+
+
+def many_to_one(network: RoadNetwork, sources: List[Endpoint], target: Endpoint,
+                weight: str = 'time', weights: np.ndarray = None,
+                max_cost: float = None) -> List[Optional[float]]:
+    """Costs from many sources to one target with a single backward Dijkstra.
+
+    The search grows from ``target`` over the reverse adjacency and stops once
+    every source node is settled or distances exceed ``max_cost``. Returns a
+    cost per source, None for unreachable ones.
+    """
+    if weights is None:
+        weights = network.edge_weights(weight)
+    started = time.perf_counter()
+    rev_indptr = network.rev_indptr
+    rev_edges = network.rev_edges
+    edge_tail = network.edge_tail
+
+    # Узел начала -> [(номер источника, стоимость части ребра)]
+    pending = {}
+    costs = [None] * len(sources)
+    for i, source in enumerate(sources):
+        for node, offset in _seeds(source, weights).items():
+            pending.setdefault(node, []).append((i, offset))
+        direct = _direct_path(network, source, target, weights)
+        if direct is not None:
+            costs[i] = direct['cost']
+
+    dist = _seeds(target, weights)
+    heap = [(d, node) for node, d in dist.items()]
+    heapq.heapify(heap)
+    settled = set()
+    remaining = len(pending)
+    while heap and remaining:
+        d, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        if max_cost is not None and d > max_cost:
+            break
+        settled.add(u)
+        if u in pending:
+            remaining -= 1
+            for i, offset in pending[u]:
+                if costs[i] is None or d + offset < costs[i]:
+                    costs[i] = d + offset
+        in_edges = rev_edges[rev_indptr[u]:rev_indptr[u + 1]]
+        for v, w in zip(edge_tail[in_edges].tolist(), weights[in_edges].tolist()):
+            nd = d + w
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _record_search('many_to_one', {'settled': len(settled)}, elapsed_ms)
+    logger.debug(f"many_to_one search for {len(sources)} sources: {len(settled)} settled, "
+                 f"{elapsed_ms:.2f} ms")
+    return costs
+
+
+def reachable(network: RoadNetwork, source: Endpoint, max_cost: float,
+              weight: str = 'time', weights: np.ndarray = None,
+              reverse: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Nodes reachable from ``source`` within ``max_cost`` (one-to-all, bounded).
+
+    With ``reverse`` the search runs over the reverse adjacency and returns
+    nodes from which ``source`` is reached within ``max_cost`` (drivers that
+    can get to a pickup point). Returns node ids sorted ascending and their
+    costs.
+    """
+    if weights is None:
+        weights = network.edge_weights(weight)
+    started = time.perf_counter()
+    if reverse:
+        indptr, adjacent, ends = network.rev_indptr, network.rev_edges, network.edge_tail
+    else:
+        indptr, adjacent, ends = network.indptr, None, network.edge_head
+
+    dist = _seeds(source, weights)
+    heap = [(d, node) for node, d in dist.items()]
+    heapq.heapify(heap)
+    settled = {}
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > max_cost:
+            break
+        if u in settled:
+            continue
+        settled[u] = d
+        start, end = int(indptr[u]), int(indptr[u + 1])
+        edges = adjacent[start:end] if reverse else slice(start, end)
+        for v, w in zip(ends[edges].tolist(), weights[edges].tolist()):
+            nd = d + w
+            if nd <= max_cost and nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+
+    nodes = np.fromiter(settled.keys(), dtype=np.int64, count=len(settled))
+    costs = np.fromiter(settled.values(), dtype=np.float64, count=len(settled))
+    order = np.argsort(nodes)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _record_search('reachable', {'settled': len(settled)}, elapsed_ms)
+    return nodes[order], costs[order]
+
+
+def path_total(network: RoadNetwork, path: Dict, values: np.ndarray) -> float:
+    """Sum of a per-edge array (edge_length, edge_time, ...) along a path with its partial edges"""
+    total = float(values[path['edges']].astype(np.float64).sum()) if path['edges'] else 0.0
+    for edge, share in path.get('partial', []):
+        total += share * float(values[edge])
+    return total
+
+
+def path_coordinates(network: RoadNetwork, path: Dict,
+                     origin: Dict = None, destination: Dict = None) -> List[List[float]]:
+    """[[lat, lon], ...] of a path, starting and ending at snapped projection points if given"""
+    coords = []
+    if origin is not None:
+        coords.append([origin['lat'], origin['lon']])
+    if path['edges'] or path.get('source') is not None:
+        coords.extend(network.path_coordinates(network.path_nodes(path['edges'], path['source'])))
+    if destination is not None:
+        coords.append([destination['lat'], destination['lon']])
+    return coords
+
+
+def path_overlap(network: RoadNetwork, edges: List[int], reference: List[int]) -> float:
+    """Share of the path length that runs over edges of the reference path"""
+    if not edges:
+        return 1.0
+    edges = np.asarray(edges, dtype=np.int64)
+    lengths = network.edge_length[edges]
+    total = float(lengths.sum())
+    if total <= 0:
+        return 1.0
+    shared = np.isin(edges, np.asarray(reference, dtype=np.int64))
+    return float(lengths[shared].sum()) / total
+
+
+def alternative_paths(network: RoadNetwork, source: Endpoint, target: Endpoint, count: int = 3,
+                      weight: str = 'time', hierarchy=None, engine: str = None,
+                      penalty: float = ALTERNATIVE_PENALTY,
+                      max_overlap: float = ALTERNATIVE_MAX_OVERLAP,
+                      weights: np.ndarray = None, max_speed_kmh: float = None) -> List[Dict]:
+    """Primary path plus up to ``count - 1`` alternatives by the penalty method.
+
+    Edges of every path found are penalized in a sparse overlay (edge id ->
+    weight), so the network and its weight arrays are never copied or
+    modified. Candidates sharing more than ``max_overlap`` of their length with
+    the primary path are dropped. ``cost`` of every returned path is measured
+    on the unpenalized weights. ``weights`` and ``max_speed_kmh`` are passed
+    to :func:`shortest_path`.
+    """
+    primary = shortest_path(network, source, target, weight, hierarchy, engine,
+                            weights, max_speed_kmh=max_speed_kmh)
+    if primary is None:
+        return []
+    paths = [primary]
+    if count <= 1 or not primary['edges']:
+        return paths
+
+    base_weights = weights if weights is not None else network.edge_weights(weight)
+    penalties = {}
+    seen = {tuple(primary['edges'])}
+    candidate = primary
+    for _ in range(ALTERNATIVE_ATTEMPTS * (count - 1)):
+        for edge in candidate['edges']:
+            penalties[edge] = penalties.get(edge, float(base_weights[edge])) * penalty
+        candidate = shortest_path(network, source, target, weight, hierarchy, engine,
+                                  weights=base_weights, penalties=penalties,
+                                  max_speed_kmh=max_speed_kmh)
+        if candidate is None:
+            break
+        key = tuple(candidate['edges'])
+        if key in seen:
+            continue
+        seen.add(key)
+        if path_overlap(network, candidate['edges'], primary['edges']) > max_overlap:
+            continue
+        candidate['cost'] = path_total(network, candidate, base_weights)
+        paths.append(candidate)
+        if len(paths) >= count:
+            break
+    return paths
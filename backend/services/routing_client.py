@@ -0,0 +1,92 @@
+import json
+import asyncio
+import logging
+from typing import Any, List, Tuple
+import numpy as np
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# Предел длины строки протокола: изохроны и матрицы бывают в мегабайты
+MAX_LINE_BYTES = 64 * 1024 * 1024
+
+
+class RoutingDaemonError(RuntimeError):
+    """Error returned by the routing daemon for one call"""
+
+
+def _encode_default(value):
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__': value.tolist(), 'dtype': str(value.dtype)}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _decode_object(value: dict):
+    if '__ndarray__' in value:
+        return np.array(value['__ndarray__'], dtype=value['dtype'])
+    return value
+
+
+def dumps(message) -> bytes:
+    """One protocol line: JSON with NumPy arrays tagged, newline-terminated"""
+    return json.dumps(message, default=_encode_default, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def loads(line: bytes):
+    return json.loads(line, object_hook=_decode_object)
+
+
+class RoutingClient:
+    """Thin client of the routing daemon (see routing_daemon) over a Unix socket.
+
+    The protocol is JSON lines: a request ``{"id", "method", "args"}`` gets a
+    response ``{"id", "result"}`` or ``{"id", "error"}``; a JSON array of
+    requests is a batch answered with an array in one round trip. A
+    connection is opened per call, so the client works from any event loop
+    (bots, ``asyncio.run`` in Flask views).
+    """
+
+    def __init__(self, socket_path: str, timeout: float = None):
+        self.socket_path = socket_path
+        self.timeout = timeout if timeout is not None else Config.ROUTING_TIMEOUT
+
+    async def _roundtrip(self, message):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(self.socket_path, limit=MAX_LINE_BYTES), self.timeout
+        )
+        try:
+            writer.write(dumps(message))
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+        finally:
+            writer.close()
+        if not line:
+            raise ConnectionError('Routing daemon closed the connection')
+        return loads(line)
+
+    @staticmethod
+    def _result(response: dict):
+        if 'error' in response:
+            raise RoutingDaemonError(response['error'])
+        return response.get('result')
+
+    async def call(self, method: str, *args) -> Any:
+        """Result of one daemon method; raises RoutingDaemonError if it failed"""
+        return self._result(await self._roundtrip({'id': 0, 'method': method, 'args': args}))
+
+    async def call_many(self, calls: List[Tuple[str, tuple]]) -> List[Any]:
+        """Results of several calls sent as one batch; failed calls give RoutingDaemonError instances"""
+        if not calls:
+            return []
+        responses = await self._roundtrip([
+            {'id': i, 'method': method, 'args': args} for i, (method, args) in enumerate(calls)
+        ])
+        results = [None] * len(calls)
+        for response in responses:
+            try:
+                results[response['id']] = self._result(response)
+            except RoutingDaemonError as e:
+                results[response['id']] = e
+        return results
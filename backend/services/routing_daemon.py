@@ -0,0 +1,127 @@
+import os
+import sys
+import asyncio
+import logging
+import argparse
+from typing import Dict
+from ..config import Config
+from .geo import search_route
+from .osm_service import (
+    routing_pool, search_eta_matrix, search_isochrone, search_pickup_etas, search_routes,
+    search_snap
+)
+from .routing_client import MAX_LINE_BYTES, RoutingClient, dumps, loads
+from .routing_pool import RoutingPool
+
+logger = logging.getLogger(__name__)
+
+# Сокет по умолчанию, если ROUTING_SOCKET не задан
+DEFAULT_SOCKET = os.path.join(os.path.dirname(__file__), '..', '..', 'cache', 'routing.sock')
+
+# Методы, доступные клиентам: имя функции поиска -> функция
+METHODS = {
+    fn.__name__: fn
+    for fn in (search_routes, search_route, search_pickup_etas, search_eta_matrix,
+               search_isochrone, search_snap)
+}
+
+
+class RoutingDaemon:
+    """Routing service owning the road network, route cache and indexes of a host.
+
+    Serves the search_* functions of osm_service and geo to RoutingClient
+    over a Unix socket. Searches run in the daemon's routing pool, whose
+    workers map the network; batches are executed concurrently.
+    """
+
+    def __init__(self, socket_path: str, pool: RoutingPool = None):
+        self.socket_path = socket_path
+        self.pool = pool or routing_pool
+        self.connections = 0
+        self.calls = {}
+
+    async def _execute(self, request: Dict) -> Dict:
+        request_id = request.get('id')
+        method = request.get('method')
+        try:
+            if method == 'stats':
+                return {'id': request_id, 'result': self.get_stats()}
+            fn = METHODS.get(method)
+            if fn is None:
+                raise ValueError(f'Unknown method {method}')
+            self.calls[method] = self.calls.get(method, 0) + 1
+            result = await self.pool.run(fn, *request.get('args', []))
+            return {'id': request_id, 'result': result}
+        except Exception as e:
+            logger.error(f"Error serving {method}: {str(e)}")
+            return {'id': request_id, 'error': f'{type(e).__name__}: {str(e)}'}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = loads(line)
+                if isinstance(request, list):
+                    response = await asyncio.gather(*(self._execute(item) for item in request))
+                else:
+                    response = await self._execute(request)
+                writer.write(dumps(response))
+                await writer.drain()
+        except Exception as e:
+            logger.error(f"Error handling routing connection: {str(e)}")
+        finally:
+            writer.close()
+
+    def get_stats(self) -> Dict:
+        return {
+            'connections': self.connections,
+            'calls': dict(self.calls),
+            'pool': self.pool.get_stats()
+        }
+
+    async def start(self) -> asyncio.AbstractServer:
+        # Сокет от прошлого запуска мешает bind
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, self.socket_path,
+                                                 limit=MAX_LINE_BYTES)
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"Routing daemon listening on {self.socket_path}, "
+                    f"{self.pool.workers} routing workers")
+        return server
+
+    async def serve_forever(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Routing daemon serving route queries over a Unix socket')
+    parser.add_argument('--socket', default=Config.ROUTING_SOCKET or DEFAULT_SOCKET,
+                        help='Unix socket path')
+    parser.add_argument('--workers', type=int, default=Config.ROUTING_WORKERS,
+                        help='routing worker processes')
+    parser.add_argument('--stats', action='store_true', help='print stats of a running daemon')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    if args.stats:
+        print(asyncio.run(RoutingClient(args.socket).call('stats')))
+        return 0
+
+    pool = RoutingPool(workers=args.workers, initializer=routing_pool.initializer)
+    try:
+        asyncio.run(RoutingDaemon(args.socket, pool).serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown(wait=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingOverloaded(RuntimeError):
+    """Raised instead of queueing when the pool already has max_pending tasks"""
+
+
+class RoutingPool:
+    """Process pool for CPU-bound routing work, awaitable from the event loop.
+
+    Each worker process maps the road network once (``initializer``) and
+    serves route searches, so a long search no longer blocks the bots'
+    and services' event loops. At most ``max_pending`` tasks are queued or
+    running; further calls fail fast with RoutingOverloaded. A call that
+    times out or is cancelled is dropped from the queue if it has not
+    started; a search already running in a worker completes and its result
+    is discarded. With ``workers=0`` tasks run one at a time in a thread of
+    the current process (development, tests).
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None, timeout: float = None,
+                 initializer: Callable = None):
+        self.workers = workers if workers is not None else Config.ROUTING_WORKERS
+        self.max_pending = max_pending if max_pending is not None else Config.ROUTING_MAX_PENDING
+        self.timeout = timeout if timeout is not None else Config.ROUTING_TIMEOUT
+        self.initializer = initializer
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0, 'completed': 0, 'failed': 0,
+            'timeouts': 0, 'cancelled': 0, 'rejected': 0, 'restarts': 0
+        }
+
+    def _create_executor(self):
+        if self.workers <= 0:
+            return ThreadPoolExecutor(max_workers=1, thread_name_prefix='routing')
+        # spawn: дочерние процессы не наследуют потоки и соединения Redis родителя
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=self.initializer)
+
+    def _submit(self, fn: Callable, args: tuple):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                raise RoutingOverloaded(f'Routing queue is full ({self.max_pending} tasks)')
+            if self._executor is None:
+                self._executor = self._create_executor()
+            try:
+                future = self._executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # Упавший процесс (например, по памяти) ломает весь пул - пересоздаём
+                logger.error("Routing pool is broken, restarting workers")
+                self._stats['restarts'] += 1
+                self._executor.shutdown(wait=False)
+                self._executor = self._create_executor()
+                future = self._executor.submit(fn, *args)
+            self._pending += 1
+            self._stats['submitted'] += 1
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _task_done(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                self._stats['cancelled'] += 1
+            elif future.exception() is not None:
+                self._stats['failed'] += 1
+            else:
+                self._stats['completed'] += 1
+
+    async def run(self, fn: Callable, *args, timeout: float = None):
+        """Run a picklable module-level function in the pool and await its result.
+
+        Raises RoutingOverloaded when the queue is full and asyncio.TimeoutError
+        after ``timeout`` seconds (default ROUTING_TIMEOUT).
+        """
+        future = self._submit(fn, args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future),
+                                          timeout if timeout is not None else self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, pending=self._pending, workers=self.workers,
+                        max_pending=self.max_pending)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
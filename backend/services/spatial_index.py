@@ -0,0 +1,339 @@
+import math
+import logging
+from typing import Dict, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Размер ячейки сетки в метрах; рёбра разбиваются на отрезки по полячейки
+GRID_CELL_M = 200.0
+METERS_PER_DEG_LAT = 110574.0
+METERS_PER_DEG_LON = 111320.0
+
+GRID_ARRAYS = ('grid_node_indptr', 'grid_node_items', 'grid_edge_indptr', 'grid_edge_items')
+
+
+class PointIndex:
+    """Uniform grid over points in local metric coordinates.
+
+    Points are bucketed by grid cell in CSR layout (``indptr``/``items``).
+    Queries look at the 3x3 block of cells around each point, which is exact
+    for matches within one cell; farther points fall back to a full scan.
+    """
+
+    def __init__(self, lats, lons, indptr: np.ndarray, items: np.ndarray, grid: Dict):
+        self.grid = grid
+        self.cell = grid['cell_m']
+        self.rows = grid['rows']
+        self.cols = grid['cols']
+        self.lat0 = grid['lat0']
+        self.lon0 = grid['lon0']
+        self.kx = METERS_PER_DEG_LON * math.cos(math.radians(self.lat0))
+        self.ky = METERS_PER_DEG_LAT
+        self.indptr = indptr
+        self.items = items
+        self.point_x, self.point_y = self.project(lats, lons)
+
+    @classmethod
+    def build(cls, lats, lons, cell_m: float = GRID_CELL_M) -> 'PointIndex':
+        indptr, items, grid = build_point_grid(lats, lons, cell_m)
+        return cls(lats, lons, indptr, items, grid)
+
+    def project(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """Local equirectangular coordinates in meters"""
+        x = (np.asarray(lons, dtype=np.float64) - self.lon0) * self.kx
+        y = (np.asarray(lats, dtype=np.float64) - self.lat0) * self.ky
+        return x, y
+
+    def unproject(self, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        return self.lat0 + np.asarray(y) / self.ky, self.lon0 + np.asarray(x) / self.kx
+
+    def _cells(self, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        col = np.floor((x - self.grid['min_x']) / self.cell).astype(np.int64)
+        row = np.floor((y - self.grid['min_y']) / self.cell).astype(np.int64)
+        return row, col
+
+    def _candidates(self, x, y, indptr, items) -> Tuple[np.ndarray, np.ndarray]:
+        """(point index, item) pairs for the 3x3 cell block around each point"""
+        row, col = self._cells(x, y)
+        point_ids, candidates = [], []
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                r, c = row + dr, col + dc
+                valid = (r >= 0) & (r < self.rows) & (c >= 0) & (c < self.cols)
+                cell = np.where(valid, r * self.cols + c, 0)
+                starts = np.where(valid, indptr[cell], 0)
+                counts = np.where(valid, indptr[cell + 1] - starts, 0)
+                total = int(counts.sum())
+                if not total:
+                    continue
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                point_ids.append(np.repeat(np.arange(len(x)), counts))
+                candidates.append(items[np.repeat(starts, counts) + offsets])
+        if not point_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(point_ids), np.concatenate(candidates).astype(np.int64)
+
+    def _block(self, x: float, y: float, indptr, items) -> np.ndarray:
+        """Items of the 3x3 cell block around a single point"""
+        row = int((y - self.grid['min_y']) // self.cell)
+        col = int((x - self.grid['min_x']) // self.cell)
+        chunks = []
+        for r in range(max(row - 1, 0), min(row + 2, self.rows)):
+            c0, c1 = max(col - 1, 0), min(col + 2, self.cols)
+            if c0 < c1:
+                # Ячейки одной строки блока лежат подряд
+                chunks.append(items[indptr[r * self.cols + c0]:indptr[r * self.cols + c1]])
+        return np.concatenate(chunks).astype(np.int64) if chunks else np.empty(0, dtype=np.int64)
+
+    @staticmethod
+    def _argmin_per_point(point_ids, distances, count) -> Tuple[np.ndarray, np.ndarray]:
+        """Index into the candidate arrays of the best candidate per point (-1 if none)"""
+        best = np.full(count, -1, dtype=np.int64)
+        best_dist = np.full(count, np.inf)
+        if len(point_ids):
+            order = np.lexsort((distances, point_ids))
+            points, first = np.unique(point_ids[order], return_index=True)
+            best[points] = order[first]
+            best_dist[points] = distances[order[first]]
+        return best, best_dist
+
+    def nearest_many(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest point and distance in meters for each query point"""
+        x, y = self.project(np.atleast_1d(lats), np.atleast_1d(lons))
+        point_ids, candidates = self._candidates(x, y, self.indptr, self.items)
+        distances = np.hypot(self.point_x[candidates] - x[point_ids],
+                             self.point_y[candidates] - y[point_ids])
+        best, best_dist = self._argmin_per_point(point_ids, distances, len(x))
+        nearest = np.where(best >= 0, candidates[np.maximum(best, 0)] if len(candidates) else -1, -1)
+
+        for i in np.flatnonzero(best_dist > self.cell):
+            # Точка далеко от всех точек индекса: полный перебор
+            distances = np.hypot(self.point_x - x[i], self.point_y - y[i])
+            nearest[i] = int(np.argmin(distances))
+            best_dist[i] = float(distances[nearest[i]])
+        return nearest, best_dist
+
+    def nearest(self, lat: float, lon: float) -> Tuple[int, float]:
+        """Nearest point to a single query point and the distance in meters"""
+        x, y = (lon - self.lon0) * self.kx, (lat - self.lat0) * self.ky
+        candidates = self._block(x, y, self.indptr, self.items)
+        if len(candidates):
+            distances = np.hypot(self.point_x[candidates] - x, self.point_y[candidates] - y)
+            best = int(np.argmin(distances))
+            if distances[best] <= self.cell:
+                return int(candidates[best]), float(distances[best])
+        nearest, distances = self.nearest_many([lat], [lon])
+        return int(nearest[0]), float(distances[0])
+
+
+class SpatialIndex(PointIndex):
+    """Grid index over network nodes and edges for snapping points to the network.
+
+    Besides the node grid each cell lists the edges passing through it (edges
+    are sampled every half cell), so nearest-edge queries are exact for edges
+    within 3/4 of a cell. All batch queries are vectorized over the input
+    points.
+    """
+
+    def __init__(self, network, arrays: Dict[str, np.ndarray], grid: Dict):
+        super().__init__(network.node_lat, network.node_lon,
+                         arrays['grid_node_indptr'], arrays['grid_node_items'], grid)
+        self.network = network
+        self.node_x, self.node_y = self.point_x, self.point_y
+        self.edge_indptr = arrays['grid_edge_indptr']
+        self.edge_items = arrays['grid_edge_items']
+
+    @classmethod
+    def for_network(cls, network) -> 'SpatialIndex':
+        """Use grid arrays stored in the network artifact or build them in memory"""
+        grid = network.meta.get('grid')
+        if grid and all(name in network.arrays for name in GRID_ARRAYS):
+            return cls(network, network.arrays, grid)
+        arrays, grid = build_grid(network)
+        return cls(network, arrays, grid)
+
+    def snap_many(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest node and distance in meters for each point"""
+        return self.nearest_many(lats, lons)
+
+    def snap(self, lat: float, lon: float) -> int:
+        """Nearest node to a single point"""
+        return self.nearest(lat, lon)[0]
+
+    def _project_on_edges(self, x, y, edges):
+        network = self.network
+        ax, ay = self.node_x[network.edge_tail[edges]], self.node_y[network.edge_tail[edges]]
+        bx, by = self.node_x[network.edge_head[edges]], self.node_y[network.edge_head[edges]]
+        dx, dy = bx - ax, by - ay
+        norm = dx * dx + dy * dy
+        t = np.clip(((x - ax) * dx + (y - ay) * dy) / np.where(norm > 0, norm, 1), 0, 1)
+        px, py = ax + t * dx, ay + t * dy
+        return t, px, py, np.hypot(x - px, y - py)
+
+    def snap_edges_many(self, lats, lons) -> Dict[str, np.ndarray]:
+        """Nearest edge for each point with the projection point on it.
+
+        Returns arrays ``edge``, ``fraction`` (position along the edge from
+        its tail, 0..1), ``lat``/``lon`` of the projection and ``distance``
+        in meters.
+        """
+        x, y = self.project(np.atleast_1d(lats), np.atleast_1d(lons))
+        count = len(x)
+        point_ids, candidates = self._candidates(x, y, self.edge_indptr, self.edge_items)
+        t, px, py, distances = self._project_on_edges(x[point_ids], y[point_ids], candidates)
+        best, best_dist = self._argmin_per_point(point_ids, distances, count)
+
+        found = best >= 0
+        edge = np.full(count, -1, dtype=np.int64)
+        fraction = np.zeros(count)
+        proj_x, proj_y = x.copy(), y.copy()
+        edge[found] = candidates[best[found]]
+        fraction[found] = t[best[found]]
+        proj_x[found] = px[best[found]]
+        proj_y[found] = py[best[found]]
+
+        all_edges = None
+        # Ближайшая точка ребра не дальше четверти ячейки от его отсчёта
+        for i in np.flatnonzero(best_dist > self.cell * 0.75):
+            # Точка далеко от сети: полный перебор рёбер
+            if all_edges is None:
+                all_edges = np.arange(self.network.edge_count)
+            ti, pxi, pyi, di = self._project_on_edges(x[i], y[i], all_edges)
+            j = int(np.argmin(di))
+            edge[i], fraction[i], proj_x[i], proj_y[i], best_dist[i] = j, ti[j], pxi[j], pyi[j], di[j]
+
+        proj_lat, proj_lon = self.unproject(proj_x, proj_y)
+        return {
+            'edge': edge,
+            'fraction': fraction,
+            'lat': proj_lat,
+            'lon': proj_lon,
+            'distance': best_dist
+        }
+
+    def candidate_edges_many(self, lats, lons, radius: float, k: int) -> Dict[str, np.ndarray]:
+        """Up to ``k`` edges within ``radius`` meters of each point, nearest first.
+
+        Returns flat arrays ``point`` (query index, ascending), ``edge``,
+        ``fraction`` and ``distance``; points with no edge in range are
+        absent. Exact for ``radius`` up to 3/4 of a cell.
+        """
+        x, y = self.project(np.atleast_1d(lats), np.atleast_1d(lons))
+        point_ids, candidates = self._candidates(x, y, self.edge_indptr, self.edge_items)
+        t, _, _, distances = self._project_on_edges(x[point_ids], y[point_ids], candidates)
+        near = distances <= radius
+        point_ids, candidates, t, distances = point_ids[near], candidates[near], t[near], distances[near]
+
+        order = np.lexsort((candidates, distances, point_ids))
+        point_ids, candidates, t, distances = (
+            point_ids[order], candidates[order], t[order], distances[order]
+        )
+        # Ребро попадает в несколько ячеек блока: повторы идут подряд
+        unique = np.ones(len(point_ids), dtype=bool)
+        unique[1:] = (point_ids[1:] != point_ids[:-1]) | (candidates[1:] != candidates[:-1])
+        point_ids, candidates, t, distances = (
+            point_ids[unique], candidates[unique], t[unique], distances[unique]
+        )
+        rank = np.arange(len(point_ids)) - np.searchsorted(point_ids, point_ids)
+        keep = rank < k
+        return {
+            'point': point_ids[keep],
+            'edge': candidates[keep],
+            'fraction': t[keep],
+            'distance': distances[keep]
+        }
+
+    def snap_edge(self, lat: float, lon: float) -> Dict:
+        """Nearest edge to a single point as a plain dict"""
+        x, y = (lon - self.lon0) * self.kx, (lat - self.lat0) * self.ky
+        candidates = self._block(x, y, self.edge_indptr, self.edge_items)
+        if len(candidates):
+            t, px, py, distances = self._project_on_edges(x, y, candidates)
+            best = int(np.argmin(distances))
+            if distances[best] <= self.cell * 0.75:
+                proj_lat, proj_lon = self.unproject(px[best], py[best])
+                return {
+                    'edge': int(candidates[best]),
+                    'fraction': float(t[best]),
+                    'lat': float(proj_lat),
+                    'lon': float(proj_lon),
+                    'distance': float(distances[best])
+                }
+        snapped = self.snap_edges_many([lat], [lon])
+        return {
+            'edge': int(snapped['edge'][0]),
+            'fraction': float(snapped['fraction'][0]),
+            'lat': float(snapped['lat'][0]),
+            'lon': float(snapped['lon'][0]),
+            'distance': float(snapped['distance'][0])
+        }
+
+
+def _bucket(cells: np.ndarray, items: np.ndarray, cell_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(cells, kind='stable')
+    indptr = np.zeros(cell_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells, minlength=cell_count), out=indptr[1:])
+    return indptr, items[order].astype(np.int32)
+
+
+def _grid_frame(lats: np.ndarray, lons: np.ndarray, cell_m: float):
+    """Grid metadata, projected coordinates and a cell-id function for points"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    lat0 = float((lats.min() + lats.max()) / 2) if len(lats) else 0.0
+    lon0 = float((lons.min() + lons.max()) / 2) if len(lons) else 0.0
+    kx = METERS_PER_DEG_LON * math.cos(math.radians(lat0))
+    x = (lons - lon0) * kx
+    y = (lats - lat0) * METERS_PER_DEG_LAT
+    min_x = float(x.min()) if len(x) else 0.0
+    min_y = float(y.min()) if len(y) else 0.0
+    cols = int((x.max() - min_x) // cell_m) + 1 if len(x) else 1
+    rows = int((y.max() - min_y) // cell_m) + 1 if len(y) else 1
+    grid = {
+        'cell_m': cell_m, 'rows': rows, 'cols': cols,
+        'lat0': lat0, 'lon0': lon0, 'min_x': min_x, 'min_y': min_y
+    }
+
+    def cell_of(px, py):
+        col = np.clip(((px - min_x) // cell_m).astype(np.int64), 0, cols - 1)
+        row = np.clip(((py - min_y) // cell_m).astype(np.int64), 0, rows - 1)
+        return row * cols + col
+
+    return grid, x, y, cell_of
+
+
+def build_point_grid(lats, lons, cell_m: float = GRID_CELL_M) -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """CSR grid (indptr, items) and its metadata for a set of points"""
+    grid, x, y, cell_of = _grid_frame(lats, lons, cell_m)
+    indptr, items = _bucket(cell_of(x, y), np.arange(len(x)), grid['rows'] * grid['cols'])
+    return indptr, items, grid
+
+
+def build_grid(network, cell_m: float = GRID_CELL_M) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Grid index arrays and their metadata for a network"""
+    grid, x, y, cell_of = _grid_frame(network.node_lat, network.node_lon, cell_m)
+    cell_count = grid['rows'] * grid['cols']
+
+    node_indptr, node_items = _bucket(cell_of(x, y), np.arange(network.node_count), cell_count)
+
+    # Отрезки рёбер дискретизируются с шагом в полячейки, пары (ячейка, ребро) без повторов
+    tail, head = network.edge_tail, network.edge_head
+    seg_len = np.hypot(x[head] - x[tail], y[head] - y[tail])
+    samples = (np.ceil(seg_len / (cell_m / 2)).astype(np.int64) + 1)
+    edge_ids = np.repeat(np.arange(network.edge_count), samples)
+    steps = np.arange(len(edge_ids)) - np.repeat(np.cumsum(samples) - samples, samples)
+    t = steps / np.maximum(np.repeat(samples - 1, samples), 1)
+    sx = x[tail][edge_ids] + t * (x[head] - x[tail])[edge_ids]
+    sy = y[tail][edge_ids] + t * (y[head] - y[tail])[edge_ids]
+    pairs = np.unique(cell_of(sx, sy) * network.edge_count + edge_ids)
+    edge_indptr, edge_items = _bucket(pairs // network.edge_count,
+                                      pairs % network.edge_count, cell_count)
+
+    arrays = {
+        'grid_node_indptr': node_indptr,
+        'grid_node_items': node_items,
+        'grid_edge_indptr': edge_indptr,
+        'grid_edge_items': edge_items
+    }
+    return arrays, grid
@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Optional
+import numpy as np
+
+# Профиль скорости - множители времени проезда свободного потока (edge_time)
+# для каждого часа недели; час 0 - понедельник 00:00
+HOURS_PER_WEEK = 168
+
+# Множители по умолчанию по периодам суток, одинаковые для всех дорог и дней
+TRAFFIC_PERIODS = {
+    'morning_rush': ((7, 8, 9), 1.5),
+    'evening_rush': ((17, 18, 19), 1.7),
+    'night': ((23, 0, 1, 2, 3, 4), 0.8)
+}
+
+
+def hour_of_week(time: Optional[datetime] = None) -> int:
+    """Hour of week (0..167) of a departure time, now by default"""
+    if time is None:
+        time = datetime.now()
+    return time.weekday() * 24 + time.hour
+
+
+def default_hourly_factors() -> np.ndarray:
+    """Travel time multipliers for the 168 hours of a week from TRAFFIC_PERIODS"""
+    day = np.ones(24, dtype=np.float32)
+    for hours, factor in TRAFFIC_PERIODS.values():
+        day[list(hours)] = factor
+    return np.tile(day, 7)
+
+
+def default_speed_profiles(profile_count: int) -> np.ndarray:
+    """``profile_count`` identical default profiles (one per road class), shape (profile_count, 168)"""
+    return np.tile(default_hourly_factors(), (profile_count, 1))
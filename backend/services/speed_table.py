@@ -0,0 +1,143 @@
+import os
+import logging
+from typing import Dict, List, Tuple
+import numpy as np
+from .road_network import HIGHWAY_CLASSES, RoadNetwork, load_arrays, save_arrays
+from .speed_profiles import HOURS_PER_WEEK, default_speed_profiles
+
+logger = logging.getLogger(__name__)
+
+# Наблюдений ребра за всё время, чтобы получить собственный профиль, и
+# наблюдений в часе, чтобы заменить множитель профиля по умолчанию
+MIN_EDGE_OBSERVATIONS = 20
+MIN_HOUR_OBSERVATIONS = 3
+
+# Пределы множителя времени проезда из наблюдений
+MIN_TIME_FACTOR = 0.5
+MAX_TIME_FACTOR = 10.0
+
+# Профили адресуются uint16 в edge_profile
+MAX_PROFILES = 65535
+
+
+def speed_table_path(network_path: str) -> str:
+    """Artifact path of the speed table learned for a network file: city.rnet -> city.speeds"""
+    return f'{os.path.splitext(network_path)[0]}.speeds'
+
+
+class SpeedTable:
+    """Observed edge traversal times aggregated per edge and hour of week.
+
+    Sparse table sorted by ``speed_key = edge * 168 + hour``: ``speed_time``
+    is the sum of observed traversal times in seconds and ``speed_count`` the
+    number of traversals. Sums rather than means are stored, so tables of
+    several days merge exactly. Saved with the same mmap format as the road
+    network.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict = None, buffer=None):
+        self.arrays = arrays
+        self.meta = meta or {}
+        self._buffer = buffer
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @property
+    def network_version(self) -> str:
+        return self.meta.get('network_version', '')
+
+    @property
+    def observations(self) -> int:
+        return int(self.speed_count.sum())
+
+    @classmethod
+    def from_observations(cls, keys, times, counts, meta: Dict = None) -> 'SpeedTable':
+        """Table from (key, time sum, count) rows; rows with equal keys are added up"""
+        keys = np.asarray(keys, dtype=np.int64)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        arrays = {
+            'speed_key': unique,
+            'speed_time': np.bincount(inverse, weights=np.asarray(times, dtype=np.float64),
+                                      minlength=len(unique)),
+            'speed_count': np.bincount(inverse, weights=np.asarray(counts, dtype=np.float64),
+                                       minlength=len(unique)).astype(np.uint32)
+        }
+        return cls(arrays, dict(meta or {}))
+
+    @classmethod
+    def merge(cls, tables: List['SpeedTable']) -> 'SpeedTable':
+        """Sum of tables learned for the same network (e.g. several days)"""
+        versions = {table.network_version for table in tables}
+        if len(versions) > 1:
+            raise ValueError(f"Speed tables belong to different networks: {', '.join(sorted(versions))}")
+        return cls.from_observations(
+            np.concatenate([table.speed_key for table in tables]),
+            np.concatenate([table.speed_time for table in tables]),
+            np.concatenate([table.speed_count for table in tables]),
+            meta={
+                'network_version': versions.pop() if versions else '',
+                'sources': sum((table.meta.get('sources', []) for table in tables), [])
+            }
+        )
+
+    def save(self, path: str) -> str:
+        self.meta = save_arrays(path, self.arrays, dict(self.meta, kind='speeds'))
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'SpeedTable':
+        arrays, meta, buffer = load_arrays(path)
+        if meta.get('kind') != 'speeds':
+            raise ValueError(f'{path} is not a speed table file')
+        return cls(arrays, meta, buffer)
+
+    def to_profiles(self, network: RoadNetwork,
+                    min_edge_observations: int = MIN_EDGE_OBSERVATIONS,
+                    min_hour_observations: int = MIN_HOUR_OBSERVATIONS) -> Tuple[np.ndarray, np.ndarray]:
+        """Speed profiles and per-edge profile ids for RoadNetwork.set_speed_profiles.
+
+        Every road class gets a profile from the observations of its edges;
+        edges observed at least ``min_edge_observations`` times get their own
+        profile. Hours with fewer than ``min_hour_observations`` traversals
+        keep the class (or default) multiplier.
+        """
+        class_count = len(HIGHWAY_CLASSES)
+        profiles = default_speed_profiles(class_count)
+        edge_profile = network.edge_highway.astype(np.uint16)
+        if not len(self.speed_key):
+            return profiles, edge_profile
+
+        edges = self.speed_key // HOURS_PER_WEEK
+        hours = self.speed_key % HOURS_PER_WEEK
+        counts = self.speed_count.astype(np.float64)
+        # Множитель - отношение наблюдаемого времени к времени свободного потока
+        free_flow = counts * np.maximum(network.edge_time[edges], 1e-3)
+
+        classes = network.edge_highway[edges].astype(np.int64)
+        cells = classes * HOURS_PER_WEEK + hours
+        size = class_count * HOURS_PER_WEEK
+        class_time = np.bincount(cells, weights=self.speed_time, minlength=size)
+        class_free = np.bincount(cells, weights=free_flow, minlength=size)
+        class_counts = np.bincount(cells, weights=counts, minlength=size)
+        observed = class_counts >= min_hour_observations
+        class_factors = profiles.reshape(-1)
+        class_factors[observed] = np.clip(class_time[observed] / class_free[observed],
+                                          MIN_TIME_FACTOR, MAX_TIME_FACTOR)
+
+        edge_totals = np.bincount(edges, weights=counts, minlength=network.edge_count)
+        own = np.flatnonzero(edge_totals >= min_edge_observations)
+        if len(own) > MAX_PROFILES - class_count:
+            logger.warning(f"{len(own)} edges qualify for own speed profiles, "
+                           f"keeping the {MAX_PROFILES - class_count} most observed")
+            own = own[np.argsort(-edge_totals[own], kind='stable')[:MAX_PROFILES - class_count]]
+            own.sort()
+        edge_rows = profiles[network.edge_highway[own]]
+        row_of = np.full(network.edge_count, -1, dtype=np.int64)
+        row_of[own] = np.arange(len(own))
+        rows = row_of[edges]
+        hit = (rows >= 0) & (counts >= min_hour_observations)
+        edge_rows[rows[hit], hours[hit]] = np.clip(self.speed_time[hit] / free_flow[hit],
+                                                   MIN_TIME_FACTOR, MAX_TIME_FACTOR)
+
+        edge_profile[own] = class_count + np.arange(len(own))
+        return np.vstack([profiles, edge_rows]), edge_profile
@@ -0,0 +1,277 @@
+import os
+import math
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import osmnx as ox
+from osmnx._errors import InsufficientResponseError
+from ..config import Config
+from .road_network import RoadNetwork
+
+logger = logging.getLogger(__name__)
+
+TileKey = Tuple[int, int]
+
+# Сшитых сетей в памяти: длинные поездки часто повторяют один и тот же набор тайлов
+STITCHED_CACHE_SIZE = 8
+
+
+def stitch_networks(networks: List[RoadNetwork], speed_limits: Dict[str, int] = None,
+                    version: str = '') -> Optional[RoadNetwork]:
+    """One network from tiles: nodes are merged by OSM id, edges crossing tile borders are kept once.
+
+    Travel times are recomputed from edge lengths and road classes with
+    ``speed_limits``, so tiles do not depend on the speed settings.
+    """
+    networks = [network for network in networks if network is not None and network.node_count]
+    if not networks:
+        return None
+
+    osmids = np.concatenate([network.node_osmid for network in networks])
+    lats = np.concatenate([network.node_lat for network in networks])
+    lons = np.concatenate([network.node_lon for network in networks])
+    unique, first = np.unique(osmids, return_index=True)
+
+    streets = {}
+    tails, heads, lengths, highway, street = [], [], [], [], []
+    for network in networks:
+        tails.append(network.node_osmid[network.edge_tail])
+        heads.append(network.node_osmid[network.edge_head])
+        lengths.append(network.edge_length)
+        highway.append(network.edge_highway)
+        names = network.meta.get('streets', [])
+        remap = np.array([streets.setdefault(name, len(streets)) for name in names] + [-1],
+                         dtype=np.int32)
+        if 'edge_street' in network.arrays:
+            # -1 (без названия) указывает на последний элемент remap
+            street.append(remap[network.edge_street])
+        else:
+            street.append(np.full(network.edge_count, -1, dtype=np.int32))
+    tails = np.concatenate(tails)
+    heads = np.concatenate(heads)
+    lengths = np.concatenate(lengths)
+
+    # Ребро на границе есть в обоих тайлах: одинаковые концы и длина - одно ребро
+    keys = np.rec.fromarrays([tails, heads, np.round(lengths, 1)])
+    _, keep = np.unique(keys, return_index=True)
+    keep.sort()
+
+    network = RoadNetwork.from_arrays(
+        unique, lats[first], lons[first],
+        np.searchsorted(unique, tails[keep]), np.searchsorted(unique, heads[keep]),
+        lengths[keep], highway=np.concatenate(highway)[keep], speed_limits=speed_limits,
+        meta={'streets': list(streets)}, street=np.concatenate(street)[keep]
+    )
+    network.meta['version'] = version
+    network.meta['bounds'] = {
+        'south': float(network.node_lat.min()), 'north': float(network.node_lat.max()),
+        'west': float(network.node_lon.min()), 'east': float(network.node_lon.max())
+    }
+    return network
+
+
+class TileCache:
+    """Road networks outside the city graph, partitioned into fixed lat/lon tiles.
+
+    A tile is downloaded from OSM once, saved as ``tile_<row>_<col>.rnet``
+    and mapped on demand; trips get a network stitched from the tiles along
+    their corridor, so overlapping trips share tiles instead of creating a
+    file per bbox. Mapped tiles and stitched networks are kept in an LRU
+    bounded by ``memory_bytes``; tile files are bounded by ``disk_bytes``,
+    least recently used first.
+    """
+
+    def __init__(self, cache_dir: str = None, tile_deg: float = None,
+                 memory_bytes: int = None, disk_bytes: int = None):
+        self.cache_dir = cache_dir or Config.GRAPH_TILE_DIR
+        self.tile_deg = tile_deg or Config.GRAPH_TILE_DEG
+        self.memory_bytes = (memory_bytes if memory_bytes is not None
+                             else Config.GRAPH_TILE_MEMORY_MB * 1024 * 1024)
+        self.disk_bytes = (disk_bytes if disk_bytes is not None
+                           else Config.GRAPH_TILE_DISK_MB * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._used_bytes = 0
+        self._empty = set()
+        self._lock = threading.Lock()
+        self._tile_locks = {}
+        self._stats = {
+            'memory_hits': 0, 'disk_hits': 0, 'downloads': 0, 'download_errors': 0,
+            'memory_evictions': 0, 'disk_evictions': 0, 'stitched': 0
+        }
+
+    def tile_key(self, lat: float, lon: float) -> TileKey:
+        return int(math.floor(lat / self.tile_deg)), int(math.floor(lon / self.tile_deg))
+
+    def tile_bounds(self, key: TileKey) -> Tuple[float, float, float, float]:
+        """(south, west, north, east) of a tile"""
+        row, col = key
+        return (round(row * self.tile_deg, 6), round(col * self.tile_deg, 6),
+                round((row + 1) * self.tile_deg, 6), round((col + 1) * self.tile_deg, 6))
+
+    def tile_path(self, key: TileKey) -> str:
+        return os.path.join(self.cache_dir, f'tile_{key[0]}_{key[1]}.rnet')
+
+    def tiles_for_bbox(self, bbox: Tuple[float, float, float, float]) -> List[TileKey]:
+        """Tiles covering (min_lat, min_lon, max_lat, max_lon)"""
+        south, west = self.tile_key(bbox[0], bbox[1])
+        north, east = self.tile_key(bbox[2], bbox[3])
+        return [(row, col) for row in range(south, north + 1) for col in range(west, east + 1)]
+
+    def tiles_for_trip(self, origin: Tuple[float, float], destination: Tuple[float, float],
+                       buffer_deg: float = 0.02) -> List[TileKey]:
+        """Tiles of a corridor around the straight line between two points.
+
+        The corridor is ``buffer_deg`` wide plus a tenth of the trip length
+        (at most one tile), so a long trip loads a band of tiles rather
+        than its whole bbox.
+        """
+        length = math.hypot(destination[0] - origin[0], destination[1] - origin[1])
+        width = buffer_deg + min(0.1 * length, self.tile_deg)
+        steps = max(1, int(math.ceil(length / (self.tile_deg / 2))))
+        tiles = set()
+        for i in range(steps + 1):
+            lat = origin[0] + (destination[0] - origin[0]) * i / steps
+            lon = origin[1] + (destination[1] - origin[1]) * i / steps
+            tiles.update(self.tiles_for_bbox((lat - width, lon - width, lat + width, lon + width)))
+        return sorted(tiles)
+
+    def _remember(self, key, value, size: int):
+        """Put an entry into the memory LRU; caller holds the lock"""
+        if key in self._entries:
+            self._used_bytes -= self._sizes[key]
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._sizes[key] = size
+        self._used_bytes += size
+        # Последняя запись остаётся, даже если одна больше бюджета
+        while self._used_bytes > self.memory_bytes and len(self._entries) > 1:
+            evicted, _ = self._entries.popitem(last=False)
+            self._used_bytes -= self._sizes.pop(evicted)
+            self._stats['memory_evictions'] += 1
+
+    def _lookup(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _tile_lock(self, key: TileKey) -> threading.Lock:
+        with self._lock:
+            return self._tile_locks.setdefault(key, threading.Lock())
+
+    def get_tile(self, key: TileKey) -> Optional[RoadNetwork]:
+        """Tile network from memory, disk or OSM; None for tiles without roads or on errors"""
+        if key in self._empty:
+            return None
+        tile = self._lookup(('tile', key))
+        if tile is not None:
+            with self._lock:
+                self._stats['memory_hits'] += 1
+            return tile
+
+        # Один поток скачивает тайл, остальные ждут и берут его с диска
+        with self._tile_lock(key):
+            tile = self._lookup(('tile', key))
+            if tile is not None:
+                return tile
+            path = self.tile_path(key)
+            if os.path.exists(path):
+                try:
+                    tile = RoadNetwork.load(path)
+                    os.utime(path)  # время использования для вытеснения с диска
+                    with self._lock:
+                        self._stats['disk_hits'] += 1
+                except Exception as e:
+                    logger.error(f"Error loading graph tile {path}: {str(e)}")
+            if tile is None:
+                tile = self._download(key)
+            if tile is None:
+                return None
+            with self._lock:
+                self._remember(('tile', key), tile, tile.nbytes)
+            return tile
+
+    def _download(self, key: TileKey) -> Optional[RoadNetwork]:
+        south, west, north, east = self.tile_bounds(key)
+        try:
+            # truncate_by_edge: рёбра через границу тайла попадают в оба тайла
+            graph = ox.graph_from_bbox(bbox=(north, south, east, west), network_type='drive',
+                                       simplify=True, truncate_by_edge=True)
+        except InsufficientResponseError:
+            # Тайл без дорог (вода, лес) больше не запрашиваем
+            self._empty.add(key)
+            return None
+        except Exception as e:
+            logger.error(f"Error downloading graph tile {key}: {str(e)}")
+            with self._lock:
+                self._stats['download_errors'] += 1
+            return None
+        with self._lock:
+            self._stats['downloads'] += 1
+        network = RoadNetwork.from_networkx(graph)
+        network.meta['bounds'] = {'south': south, 'west': west, 'north': north, 'east': east}
+        network.meta['tile'] = list(key)
+        path = network.save(self.tile_path(key))
+        self._evict_disk(keep={path})
+        return RoadNetwork.load(path)
+
+    def _evict_disk(self, keep=()):
+        """Delete least recently used tile files until the store fits disk_bytes"""
+        try:
+            files = []
+            for name in os.listdir(self.cache_dir):
+                if name.startswith('tile_') and name.endswith('.rnet'):
+                    path = os.path.join(self.cache_dir, name)
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.disk_bytes:
+                    break
+                if path in keep:
+                    continue
+                # Отображённые в память тайлы остаются доступны и после удаления файла
+                os.remove(path)
+                total -= size
+                with self._lock:
+                    self._stats['disk_evictions'] += 1
+        except Exception as e:
+            logger.error(f"Error evicting graph tiles: {str(e)}")
+
+    def network_for(self, tiles: List[TileKey],
+                    speed_limits: Dict[str, int] = None) -> Optional[RoadNetwork]:
+        """Network stitched from tiles, cached per tile set and speed limits"""
+        limits = tuple(sorted((speed_limits or {}).items()))
+        key = ('area', tuple(sorted(tiles)), limits)
+        network = self._lookup(key)
+        if network is not None:
+            return network
+
+        networks = [self.get_tile(tile) for tile in key[1]]
+        networks = [network for network in networks if network is not None]
+        if not networks:
+            return None
+        # Версия сшитой сети - от версий тайлов и скоростей: по ней ключи кэша маршрутов
+        digest = hashlib.sha1(repr((limits, [network.version for network in networks])).encode())
+        network = stitch_networks(networks, speed_limits or None, f'tiles-{digest.hexdigest()[:16]}')
+        if network is None:
+            return None
+        with self._lock:
+            self._stats['stitched'] += 1
+            self._remember(key, network, network.nbytes)
+            # Сшитых сетей держим немного, тайлы важнее
+            areas = [entry for entry in self._entries if entry[0] == 'area']
+            for entry in areas[:-STITCHED_CACHE_SIZE]:
+                del self._entries[entry]
+                self._used_bytes -= self._sizes.pop(entry)
+        return network
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, memory_bytes=self._used_bytes,
+                        tiles_in_memory=sum(1 for entry in self._entries if entry[0] == 'tile'))
@@ -0,0 +1,280 @@
+"""Long-term store of driver trajectories in delta-encoded day files.
+
+Points are kept per local day. The writer follows the ``driver_events``
+stream and flushes a segment every TRAJECTORY_FLUSH_SECONDS::
+
+    cache/trajectories/2026-10-16/seg-<last stream id>.traj
+
+When a day is over the segments are compacted into one day file,
+``cache/trajectories/2026-10-16.traj``. Each file holds the points grouped
+by driver and sorted by time. Time (deciseconds since local midnight) and
+coordinates (microdegrees) are int32 deltas from the previous point of the
+same driver; the first point of a driver is stored as an absolute value.
+Files are written with save_arrays and mapped on read, so a query touches
+only the pages of the requested drivers.
+
+Run the writer under supervisor, or compact a day by hand::
+
+    python -m backend.services.trajectory_store
+    python -m backend.services.trajectory_store --compact 2026-10-16
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import redis
+from ..config import Config
+from .driver_grid import DRIVER_EVENTS_KEY, stream_id
+from .road_network import load_arrays, save_arrays
+
+logger = logging.getLogger(__name__)
+
+# Масштабы целочисленного хранения: децисекунды от полуночи и микроградусы
+TIME_SCALE = 10
+COORD_SCALE = 1e6
+# Позиция писателя в потоке событий: после перезапуска продолжает с неё
+WRITER_POSITION_KEY = 'trajectory_writer:last_id'
+# Событий за одно чтение потока; полная пачка значит, что писатель отстаёт
+READ_BATCH = 10000
+
+Points = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def day_start(day: date) -> float:
+    """Unix time of local midnight of a day"""
+    return datetime(day.year, day.month, day.day).timestamp()
+
+
+def _delta(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Differences to the previous value, absolute at ``starts``"""
+    deltas = np.diff(values, prepend=0)
+    deltas[starts] = values[starts]
+    return deltas.astype(np.int32)
+
+
+def encode_day(day: date, drivers: np.ndarray, timestamps: np.ndarray,
+               lats: np.ndarray, lons: np.ndarray) -> Dict[str, np.ndarray]:
+    """Arrays of a day file from points of that day, in any order"""
+    order = np.lexsort((timestamps, drivers))
+    drivers = np.asarray(drivers, dtype=np.int64)[order]
+    ticks = np.round((np.asarray(timestamps)[order] - day_start(day)) * TIME_SCALE).astype(np.int64)
+    lat = np.round(np.asarray(lats)[order] * COORD_SCALE).astype(np.int64)
+    lon = np.round(np.asarray(lons)[order] * COORD_SCALE).astype(np.int64)
+
+    driver_ids, starts = np.unique(drivers, return_index=True)
+    return {
+        'driver_ids': driver_ids,
+        'offsets': np.append(starts, len(drivers)).astype(np.int64),
+        'time': _delta(ticks, starts),
+        'lat': _delta(lat, starts),
+        'lon': _delta(lon, starts)
+    }
+
+
+class TrajectoryStore:
+    """Day files and segments of driver trajectories under ``root``"""
+
+    def __init__(self, root: str = None):
+        self.root = root or Config.TRAJECTORY_DIR
+
+    def day_path(self, day: date) -> str:
+        return os.path.join(self.root, f'{day.isoformat()}.traj')
+
+    def segment_dir(self, day: date) -> str:
+        return os.path.join(self.root, day.isoformat())
+
+    def files(self, day: date) -> List[str]:
+        """Day file and segments of a day, oldest first"""
+        paths = [self.day_path(day)] if os.path.exists(self.day_path(day)) else []
+        directory = self.segment_dir(day)
+        if os.path.isdir(directory):
+            paths += sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                            if name.endswith('.traj'))
+        return paths
+
+    def write_segment(self, day: date, name: str, drivers: np.ndarray, timestamps: np.ndarray,
+                      lats: np.ndarray, lons: np.ndarray) -> str:
+        """Write points of one day as a new segment; returns its path"""
+        path = os.path.join(self.segment_dir(day), f'seg-{name}.traj')
+        save_arrays(path, encode_day(day, drivers, timestamps, lats, lons),
+                    {'day': day.isoformat(), 'points': len(drivers)})
+        return path
+
+    @staticmethod
+    def _read_file(path: str, day: date, driver_id: int) -> Optional[Points]:
+        arrays, _, _ = load_arrays(path)
+        driver_ids = arrays['driver_ids']
+        position = int(np.searchsorted(driver_ids, driver_id))
+        if position == len(driver_ids) or driver_ids[position] != driver_id:
+            return None
+        start, end = arrays['offsets'][position], arrays['offsets'][position + 1]
+        # Срез отображения: читаются только страницы этого водителя
+        timestamps = np.cumsum(arrays['time'][start:end], dtype=np.int64) / TIME_SCALE + day_start(day)
+        lats = np.cumsum(arrays['lat'][start:end], dtype=np.int64) / COORD_SCALE
+        lons = np.cumsum(arrays['lon'][start:end], dtype=np.int64) / COORD_SCALE
+        return timestamps, lats, lons
+
+    def read(self, driver_id: int, start: datetime, end: datetime = None) -> Points:
+        """Timestamps, lats and lons of a driver between two moments, ordered by time"""
+        end = end or datetime.now()
+        chunks = []
+        day = start.date()
+        while day <= end.date():
+            for path in self.files(day):
+                try:
+                    points = self._read_file(path, day, driver_id)
+                except Exception as e:
+                    logger.error(f"Error reading trajectory file {path}: {str(e)}")
+                    continue
+                if points is not None:
+                    chunks.append(points)
+            day += timedelta(days=1)
+        if not chunks:
+            return np.empty(0), np.empty(0), np.empty(0)
+
+        timestamps, lats, lons = (np.concatenate(parts) for parts in zip(*chunks))
+        # Повторно записанные после перезапуска писателя точки совпадают по времени
+        timestamps, unique = np.unique(timestamps, return_index=True)
+        lats, lons = lats[unique], lons[unique]
+        keep = (timestamps >= start.timestamp()) & (timestamps <= end.timestamp())
+        return timestamps[keep], lats[keep], lons[keep]
+
+    @staticmethod
+    def _read_all(path: str, day: date) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Driver ids, timestamps, lats and lons of every point in a file"""
+        arrays, _, _ = load_arrays(path)
+        counts = np.diff(arrays['offsets'])
+        columns = []
+        # Сумма по всему файлу: в начале каждого водителя вычитаем накопленное до него
+        for name, scale in (('time', TIME_SCALE), ('lat', COORD_SCALE), ('lon', COORD_SCALE)):
+            total = np.cumsum(arrays[name], dtype=np.int64)
+            before = np.concatenate(([0], total))[arrays['offsets'][:-1]]
+            columns.append((total - np.repeat(before, counts)) / scale)
+        return np.repeat(arrays['driver_ids'], counts), columns[0] + day_start(day), columns[1], columns[2]
+
+    def read_day(self, day: date) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Driver ids, timestamps, lats and lons of all points of a day, ordered by driver and time"""
+        paths = self.files(day)
+        if not paths:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), np.empty(0)
+        drivers, timestamps, lats, lons = (np.concatenate(parts) for parts in
+                                           zip(*(self._read_all(path, day) for path in paths)))
+        # Дубликаты (водитель, время) после повторной записи оставляем один раз
+        _, unique = np.unique(np.column_stack((drivers, np.round(timestamps * TIME_SCALE))),
+                              axis=0, return_index=True)
+        return drivers[unique], timestamps[unique], lats[unique], lons[unique]
+
+    def compact(self, day: date) -> Optional[str]:
+        """Merge the day file and segments of a day into the day file; returns its path"""
+        segments = [path for path in self.files(day) if path != self.day_path(day)]
+        if not segments:
+            return None
+        drivers, timestamps, lats, lons = self.read_day(day)
+        path = self.day_path(day)
+        save_arrays(path, encode_day(day, drivers, timestamps, lats, lons),
+                    {'day': day.isoformat(), 'points': len(drivers)})
+        for segment in segments:
+            os.remove(segment)
+        logger.info(f"Trajectories of {day} compacted: {len(segments)} segments, {len(drivers)} points")
+        return path
+
+
+class TrajectoryWriter:
+    """Buffers driver_events pings and writes them to a TrajectoryStore in segments"""
+
+    def __init__(self, store: TrajectoryStore, flush_seconds: float = None):
+        self.store = store
+        self.flush_seconds = flush_seconds if flush_seconds is not None else Config.TRAJECTORY_FLUSH_SECONDS
+        self.last_id = None
+        self._points = []
+        self._stats = {'points': 0, 'segments': 0, 'compactions': 0}
+
+    def add(self, event_id: str, fields: Dict[bytes, bytes]):
+        """Buffer one stream event; only pings (set/busy) carry positions"""
+        self.last_id = event_id
+        if b'ts' not in fields:
+            return
+        self._points.append((int(fields[b'driver'].decode().split(':')[1]), float(fields[b'ts']),
+                             float(fields[b'lat']), float(fields[b'lon'])))
+
+    def flush(self) -> int:
+        """Write buffered points as one segment per day; returns the number written"""
+        if not self._points:
+            return 0
+        drivers, timestamps, lats, lons = (np.array(column) for column in zip(*self._points))
+        days = np.array([datetime.fromtimestamp(ts).date() for ts in timestamps])
+        for day in sorted(set(days)):
+            mask = days == day
+            self.store.write_segment(day, self.last_id.replace('-', '_'), drivers[mask],
+                                     timestamps[mask], lats[mask], lons[mask])
+            self._stats['segments'] += 1
+        written = len(self._points)
+        self._stats['points'] += written
+        self._points = []
+        return written
+
+    def run(self, redis_client):
+        """Follow the stream from the saved position, flushing and compacting until interrupted"""
+        saved = redis_client.get(WRITER_POSITION_KEY)
+        position = saved.decode() if saved else '$'
+        flushed_at = time.monotonic()
+        today = date.today()
+        logger.info(f"Trajectory writer started from {position}, segments every {self.flush_seconds:.0f}s")
+        check_gap = position != '$'
+        # Писатель мог быть остановлен в полночь - досжимаем вчерашний день
+        self.store.compact(today - timedelta(days=1))
+        while True:
+            if check_gap:
+                # Нужные события уже вытеснены из потока (MAXLEN) - часть точек потеряна
+                first = redis_client.xrange(DRIVER_EVENTS_KEY, count=1)
+                if first and stream_id(first[0][0].decode()) > stream_id(position):
+                    logger.warning("Trajectory writer fell behind the event stream, some points are lost")
+            response = redis_client.xread({DRIVER_EVENTS_KEY: position}, count=READ_BATCH, block=1000)
+            events = response[0][1] if response else []
+            for event_id, fields in events:
+                self.add(event_id.decode(), fields)
+                position = event_id.decode()
+            check_gap = len(events) == READ_BATCH
+
+            if time.monotonic() - flushed_at >= self.flush_seconds:
+                if self.flush():
+                    # Позиция сохраняется после записи: при сбое точки пишутся повторно, а не теряются
+                    redis_client.set(WRITER_POSITION_KEY, position)
+                flushed_at = time.monotonic()
+
+            if date.today() != today:
+                self.flush()
+                self.store.compact(today)
+                self._stats['compactions'] += 1
+                today = date.today()
+
+    def get_stats(self) -> Dict:
+        return dict(self._stats, buffered=len(self._points), last_id=self.last_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write driver trajectories from the driver_events stream')
+    parser.add_argument('--compact', metavar='YYYY-MM-DD',
+                        help='compact the segments of a day and exit')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+
+    store = TrajectoryStore()
+    if args.compact:
+        print(store.compact(date.fromisoformat(args.compact)))
+        return 0
+    client = redis.Redis(host=Config.REDIS_HOST, port=Config.REDIS_PORT, db=Config.REDIS_DB,
+                         password=Config.REDIS_PASSWORD)
+    try:
+        TrajectoryWriter(store).run(client)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
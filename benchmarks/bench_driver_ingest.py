@@ -0,0 +1,97 @@
+"""Compare driver location ingest: four commands per ping, one script call, batches.
+
+Usage::
+
+    python benchmarks/bench_driver_ingest.py [--drivers 2000] [--pings 20000] [--batch 500] [--db 15]
+
+Needs a running Redis (REDIS_HOST/REDIS_PORT from .env); the benchmark writes
+to database ``--db`` and flushes it when done, so do not point it at the
+production database.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+import redis
+from backend.config import Config
+from backend.services.driver_location import DriverLocationService
+
+
+async def legacy_update(service: DriverLocationService, driver_id: int, lat: float, lon: float,
+                        status: str = 'available', car_type: str = 'economy'):
+    """Previous update_driver_location: GEOADD, SETEX, LPUSH and LTRIM as separate round trips"""
+    timestamp = time.time()
+    service.redis.geoadd('driver_locations', [lon, lat, f'driver:{driver_id}'])
+    service.redis.setex(f'driver_info:{driver_id}', service.LOCATION_EXPIRE, json.dumps({
+        'driver_id': driver_id, 'lat': lat, 'lon': lon, 'status': status,
+        'car_type': car_type, 'timestamp': timestamp
+    }))
+    history_key = f'driver_history:{driver_id}'
+    service.redis.lpush(history_key, json.dumps({'lat': lat, 'lon': lon, 'timestamp': timestamp}))
+    service.redis.ltrim(history_key, 0, service.LOCATION_HISTORY_SIZE - 1)
+
+
+def make_pings(drivers: int, pings: int):
+    rng = np.random.default_rng(7)
+    bounds = Config.CITY_BOUNDS
+    lats = rng.uniform(bounds['south'], bounds['north'], pings)
+    lons = rng.uniform(bounds['west'], bounds['east'], pings)
+    ids = rng.integers(drivers, size=pings)
+    return [{'driver_id': int(i), 'lat': float(lat), 'lon': float(lon)}
+            for i, lat, lon in zip(ids, lats, lons)]
+
+
+async def measure(name: str, run, pings: int, baseline: float = None) -> float:
+    started = time.perf_counter()
+    await run()
+    elapsed = time.perf_counter() - started
+    speedup = f", x{baseline / elapsed:.1f}" if baseline else ''
+    print(f"{name:>14}: {pings / elapsed:10.0f} pings/s ({elapsed:.2f} s{speedup})")
+    return elapsed
+
+
+async def run_benchmark(args):
+    service = DriverLocationService(redis.Redis(host=Config.REDIS_HOST, port=Config.REDIS_PORT,
+                                                db=args.db, password=Config.REDIS_PASSWORD))
+    service.redis.flushdb()
+    pings = make_pings(args.drivers, args.pings)
+    print(f"{len(pings)} pings of {args.drivers} drivers, Redis {Config.REDIS_HOST}:{Config.REDIS_PORT}/{args.db}")
+
+    async def legacy():
+        for ping in pings:
+            await legacy_update(service, ping['driver_id'], ping['lat'], ping['lon'])
+
+    async def script():
+        for ping in pings:
+            await service.update_driver_location(ping['driver_id'], ping['lat'], ping['lon'])
+
+    async def batched():
+        for start in range(0, len(pings), args.batch):
+            await service.update_driver_locations(pings[start:start + args.batch])
+
+    try:
+        baseline = await measure('4 commands', legacy, len(pings))
+        await measure('script', script, len(pings), baseline)
+        await measure(f'batch of {args.batch}', batched, len(pings), baseline)
+    finally:
+        service.redis.flushdb()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--drivers', type=int, default=2000)
+    parser.add_argument('--pings', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--db', type=int, default=15)
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Load time of the GraphML cache versus the mmap road network artifact.
+
+Usage::
+
+    python benchmarks/bench_graph_load.py [city.graphml] [--grid 300] [--repeat 3]
+
+Without a GraphML file a synthetic osmnx-style grid graph is generated.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import argparse
+import tempfile
+import tracemalloc
+import statistics
+import numpy as np
+import networkx as nx
+import osmnx as ox
+from backend.services.graph_builder import build_network
+from backend.services.road_network import RoadNetwork
+from backend.services.routing import dijkstra
+
+
+def synthetic_graph(size: int) -> nx.MultiDiGraph:
+    """Two-way grid with ~80 m blocks and osmnx attributes"""
+    rng = np.random.default_rng(42)
+    graph = nx.MultiDiGraph(crs='epsg:4326')
+    classes = ['residential', 'tertiary', 'secondary', 'primary']
+    for r in range(size):
+        for c in range(size):
+            graph.add_node(r * size + c, y=55.6 + r * 0.0007, x=37.5 + c * 0.0012)
+    for r in range(size):
+        for c in range(size):
+            node = r * size + c
+            for other in ([node + 1] if c + 1 < size else []) + ([node + size] if r + 1 < size else []):
+                length = float(rng.uniform(60, 120))
+                highway = classes[rng.integers(len(classes))]
+                graph.add_edge(node, other, osmid=node, length=length, highway=highway, oneway=False)
+                graph.add_edge(other, node, osmid=node, length=length, highway=highway, oneway=False)
+    return graph
+
+
+def timed(func, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return result, statistics.median(timings)
+
+
+def traced_memory(func) -> int:
+    """Python heap retained by the object func returns"""
+    tracemalloc.start()
+    result = func()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('graphml', nargs='?')
+    parser.add_argument('--grid', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        graphml_path = args.graphml
+        if not graphml_path:
+            graphml_path = os.path.join(workdir, 'synthetic.graphml')
+            ox.save_graphml(synthetic_graph(args.grid), graphml_path)
+        network_path = os.path.join(workdir, 'city.rnet')
+
+        graph, graphml_time = timed(lambda: ox.load_graphml(graphml_path), args.repeat)
+        graphml_memory = traced_memory(lambda: ox.load_graphml(graphml_path))
+
+        started = time.perf_counter()
+        build_network(graph, graphml_path).save(network_path)
+        build_time = time.perf_counter() - started
+        del graph
+
+        network, mmap_time = timed(lambda: RoadNetwork.load(network_path), args.repeat)
+        mmap_memory = traced_memory(lambda: RoadNetwork.load(network_path))
+
+        # Первый маршрут после загрузки включает подкачку страниц с диска
+        _, first_route_time = timed(
+            lambda: dijkstra(network, 0, network.node_count - 1), 1
+        )
+
+        print(f"nodes: {network.node_count}, edges: {network.edge_count}")
+        print(f"graphml file:       {os.path.getsize(graphml_path) / 1e6:8.1f} MB")
+        print(f"network file:       {os.path.getsize(network_path) / 1e6:8.1f} MB")
+        print(f"ox.load_graphml:    {graphml_time * 1000:8.1f} ms, "
+              f"{graphml_memory / 1e6:.1f} MB python heap")
+        print(f"RoadNetwork.load:   {mmap_time * 1000:8.3f} ms, "
+              f"{mmap_memory / 1e6:.3f} MB python heap (arrays are shared mmap pages)")
+        print(f"build artifact:     {build_time * 1000:8.1f} ms")
+        print(f"first route (cold): {first_route_time * 1000:8.1f} ms")
+        print(f"speedup:            {graphml_time / mmap_time:8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Compare routing engines on origin-destination pairs.
+
+Usage::
+
+    python benchmarks/bench_routing_engines.py [od.csv] [--network cache/osm/city.rnet] [--pairs 500]
+        [--hour 8] [--speeds cache/osm/city.speeds]
+
+od.csv has columns pickup_lat,pickup_lon,dropoff_lat,dropoff_lon (e.g. an
+export of orders); without it random node pairs of the network are used.
+With ``--hour`` the searches run over the travel times of that hour of week
+(learned profiles from ``--speeds`` if given), where 'ch' becomes A* with
+hierarchy distances as the potential ('ch_astar').
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv
+import argparse
+import statistics
+import numpy as np
+from backend.config import Config
+from backend.services.contraction import ContractionHierarchy, hierarchy_path
+from backend.services.road_network import RoadNetwork
+from backend.services.routing import ENGINES, shortest_path
+from backend.services.speed_table import SpeedTable
+
+
+def load_pairs(network: RoadNetwork, path: str, limit: int):
+    if not path:
+        rng = np.random.default_rng(7)
+        return rng.integers(network.node_count, size=(limit, 2)).tolist()
+    pairs = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            pairs.append((
+                network.nearest_node(float(row['pickup_lat']), float(row['pickup_lon'])),
+                network.nearest_node(float(row['dropoff_lat']), float(row['dropoff_lon']))
+            ))
+            if len(pairs) >= limit:
+                break
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('od_csv', nargs='?')
+    parser.add_argument('--network', default=Config.OSM_CITY_NETWORK_PATH)
+    parser.add_argument('--pairs', type=int, default=500)
+    parser.add_argument('--weight', default='time', choices=['time', 'length'])
+    parser.add_argument('--hour', type=int, help='hour of week for time weights')
+    parser.add_argument('--speeds', help='speed table with learned profiles')
+    args = parser.parse_args()
+
+    network = RoadNetwork.load(args.network)
+    if args.speeds:
+        network.set_speed_profiles(*SpeedTable.load(args.speeds).to_profiles(network))
+    weights = max_speed = None
+    if args.hour is not None:
+        weights, max_speed = network.time_weights(args.hour), network.max_speed_at(args.hour)
+    ch_path = hierarchy_path(args.network, args.weight)
+    hierarchy = ContractionHierarchy.load(ch_path) if os.path.exists(ch_path) else None
+    pairs = load_pairs(network, args.od_csv, args.pairs)
+    print(f"{network.node_count} nodes, {network.edge_count} edges, {len(pairs)} pairs")
+
+    baseline = None
+    for engine in ENGINES:
+        if engine == 'ch' and hierarchy is None:
+            print(f"{engine:>9}: skipped, {ch_path} not found")
+            continue
+        settled, elapsed, costs = [], [], []
+        for source, target in pairs:
+            result = shortest_path(network, source, target, args.weight, hierarchy, engine,
+                                   weights, max_speed_kmh=max_speed)
+            if result is None:
+                costs.append(None)
+                continue
+            settled.append(result['settled'])
+            elapsed.append(result['elapsed_ms'])
+            costs.append(round(result['cost'], 1))
+        if baseline is None:
+            baseline = costs
+        mismatches = sum(1 for a, b in zip(costs, baseline) if a != b)
+        if engine == 'ch' and weights is not None:
+            engine = 'ch_astar'
+        print(f"{engine:>9}: median {statistics.median(elapsed):7.2f} ms, "
+              f"p95 {np.percentile(elapsed, 95):7.2f} ms, "
+              f"median settled {statistics.median(settled):8.0f}, "
+              f"cost mismatches {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
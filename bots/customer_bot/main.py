@@ -1,12 +1,21 @@
 import logging
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
+from telegram import (
+    Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton,
+    InlineQueryResultArticle, InputTextMessageContent
+)
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, InlineQueryHandler,
+    ContextTypes, filters
+)
 import os
 from dotenv import load_dotenv
 import sys
 sys.path.append('../..')
+from backend.config import Config
 from backend.models import db, Customer, Order, FareRule
 from backend.services.geo import calculate_route
+from backend.services.city_graph import suggest_addresses
+from backend.services.city_registry import city_registry
 from backend.services.pricing import calculate_fare
 
 # Load environment variables
@@ -42,9 +51,10 @@ async def location_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(
         "Отлично! Теперь укажите адрес назначения или отправьте локацию.",
-        reply_markup=InlineKeyboardMarkup([[
-            InlineKeyboardButton("📍 Отправить локацию", callback_data="send_destination_location")
-        ]])
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📍 Отправить локацию", callback_data="send_destination_location")],
+            [InlineKeyboardButton("🔎 Найти адрес", switch_inline_query_current_chat="")]
+        ])
     )
 
 async def destination_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -53,7 +63,9 @@ async def destination_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     pickup_location = context.user_data.get('pickup_location')
     
     # Calculate route and fare
-    route = await calculate_route(pickup_location, destination)
+    # Маршрут хранится в user_data: геометрия упрощена и закодирована в polyline
+    route = await calculate_route(pickup_location, destination, geometry='polyline',
+                                  tolerance=Config.ROUTE_SIMPLIFY_TOLERANCE)
     fare = await calculate_fare(route)
     
     context.user_data['route'] = route
@@ -74,6 +86,25 @@ async def destination_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
 
+async def address_suggestions_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Suggest destination addresses while the customer types (inline mode)"""
+    query = update.inline_query.query
+    # Подсказки из адресов города, где клиент указал точку посадки
+    pickup = context.user_data.get('pickup_location')
+    city = city_registry.city_for(pickup['lat'], pickup['lon']) if pickup else None
+    suggestions = suggest_addresses(query, limit=10, city=city)
+    
+    # Выбранная подсказка отправляется в чат текстом и попадает в destination_handler
+    results = [
+        InlineQueryResultArticle(
+            id=str(i),
+            title=suggestion['address'],
+            input_message_content=InputTextMessageContent(suggestion['address'])
+        )
+        for i, suggestion in enumerate(suggestions)
+    ]
+    await update.inline_query.answer(results, cache_time=60)
+
 async def car_class_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle car class selection"""
     query = update.callback_query
@@ -133,6 +164,7 @@ def main():
     application.add_handler(MessageHandler(filters.LOCATION, location_handler))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, destination_handler))
     application.add_handler(CallbackQueryHandler(car_class_handler, pattern="^select_car_class_"))
+    application.add_handler(InlineQueryHandler(address_suggestions_handler))
     application.add_handler(MessageHandler(filters.Regex("^📜 История поездок$"), history_handler))
     
     # Start the bot
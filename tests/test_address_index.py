@@ -0,0 +1,134 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from backend.services import city_graph
+from backend.services.address_index import AddressIndex, address_index_path
+from backend.services.address_parser import parse_address
+from backend.services.city_registry import City
+from backend.services.graph_builder import main, read_addresses
+from backend.services.osm_service import OSMService
+from backend.services.road_network import RoadNetwork
+
+OSM_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="55.7500" lon="37.6000"/>
+  <node id="2" lat="55.7500" lon="37.6050"/>
+  <node id="3" lat="55.7550" lon="37.6050"/>
+  <node id="10" lat="55.7502" lon="37.6010"/>
+  <node id="11" lat="55.7502" lon="37.6014"/>
+  <node id="12" lat="55.7505" lon="37.6014"/>
+  <node id="20" lat="55.7503" lon="37.6040">
+    <tag k="addr:street" v="Тверская улица"/>
+    <tag k="addr:housenumber" v="7с1"/>
+  </node>
+  <way id="100">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/>
+    <tag k="highway" v="primary"/>
+    <tag k="name" v="Тверская улица"/>
+  </way>
+  <way id="101">
+    <nd ref="10"/><nd ref="11"/><nd ref="12"/><nd ref="10"/>
+    <tag k="building" v="yes"/>
+    <tag k="addr:street" v="Тверская улица"/>
+    <tag k="addr:housenumber" v="3"/>
+  </way>
+</osm>
+"""
+
+
+def test_read_addresses(tmp_path):
+    path = tmp_path / 'extract.osm'
+    path.write_text(OSM_XML, encoding='utf-8')
+    addresses = read_addresses(str(path))
+    assert sorted(addresses['housenumber']) == ['3', '7с1']
+    building = addresses['housenumber'].index('3')
+    assert abs(addresses['lat'][building] - 55.7503) < 1e-6
+
+
+def test_reverse_lookup(tmp_path):
+    index = AddressIndex.build([55.75, 55.76], [37.60, 37.61],
+                               ['Тверская улица', 'Арбат'], ['1', '2'])
+    loaded = AddressIndex.load(index.save(str(tmp_path / 'city.addr')))
+    assert loaded.reverse(55.7501, 37.6001)['address'] == 'Тверская улица, 1'
+    assert loaded.reverse(55.755, 37.605) is None
+
+
+def test_builder_writes_addresses_and_street_names(tmp_path):
+    source = tmp_path / 'extract.osm'
+    source.write_text(OSM_XML, encoding='utf-8')
+    output = str(tmp_path / 'city.rnet')
+    assert main([str(source), '-o', output, '--skip-ch']) == 0
+
+    network = RoadNetwork.load(output)
+    snapped = network.snap_edge(55.7501, 37.6025)
+    assert network.street_name(snapped['edge']) == 'Тверская улица'
+    addresses = AddressIndex.load(address_index_path(output))
+    assert addresses.count == 2
+
+
+def test_parse_address_normalizes_house_and_street():
+    assert parse_address('ул. Тверская, д. 7 корп. 1') == (['тверская'], 'ул', '7к1')
+    assert parse_address('Тверская улица 7к1') == (['тверская'], 'ул', '7к1')
+    assert parse_address('1-я Тверская-Ямская 12') == (['1я', 'тверская', 'ямская'], None, '12')
+    assert parse_address('8 Марта') == (['8', 'марта'], None, '')
+
+
+def test_forward_search():
+    index = AddressIndex.build(
+        [55.750, 55.751, 55.752, 55.760, 55.770],
+        [37.600, 37.601, 37.602, 37.610, 37.620],
+        ['Тверская улица', 'Тверская улица', 'Тверская улица',
+         'Ленинский проспект', 'Ленинский переулок'],
+        ['7 к1', '71', '12', '5', '5']
+    )
+    assert index.geocode('г. Москва, ул Тверская д 7 корпус 1')['housenumber'] == '7 к1'
+    # Полный номер не путается с другим домом, набор по буквам показывает оба
+    assert index.geocode('тверская 7')['housenumber'] == '7 к1'
+    assert {r['housenumber'] for r in index.search('тверская 7')} == {'7 к1', '71'}
+    assert index.search('тверс')[0]['match'] == 'prefix'
+
+    fuzzy = index.geocode('тверкая 12')
+    assert fuzzy['housenumber'] == '12' and fuzzy['match'] == 'fuzzy'
+    assert index.geocode('Ленинский пер. 5')['street'] == 'Ленинский переулок'
+    street = index.geocode('тверская')
+    assert street['precision'] == 'street' and street['housenumber'] is None
+    assert index.geocode('несуществующая') is None
+
+
+class GeocoderStub:
+    """Nominatim client answering every query with one point"""
+
+    def geocode(self, address):
+        return {'lat': 1.0, 'lon': 2.0, 'address': address}
+
+    async def geocode_many(self, addresses):
+        return [self.geocode(address) for address in addresses]
+
+
+def test_only_exact_houses_skip_nominatim(monkeypatch):
+    index = AddressIndex.build(
+        [55.76, 55.75, 55.78], [37.61, 37.6, 37.55],
+        ['Ленинский проспект', 'Тверская улица', 'Аэропортовская улица'], ['5', '999', '1']
+    )
+    cities = []
+    monkeypatch.setattr(city_graph, 'get_city_addresses', lambda city=None: cities.append(city) or index)
+    # Другая улица, центр похожей улицы и центр улицы без такого дома
+    for query in ('улица Ленина 5', 'аэропорт', 'Тверская 12'):
+        assert city_graph.geocode_address(query) is None
+    assert city_graph.geocode_address('Тверская 999')['housenumber'] == '999'
+    assert city_graph.suggest_addresses('аэропорт')[0]['street'] == 'Аэропортовская улица'
+
+    service = OSMService()
+    service.geocoder = GeocoderStub()
+    assert service.get_coordinates('улица Ленина 5')['lat'] == 1.0
+    assert service.get_coordinates('ленинский проспект 5')['lat'] == 55.76
+
+    city = City('msk', {'north': 56.0, 'south': 55.5, 'west': 37.0, 'east': 38.0}, 'msk.rnet')
+    monkeypatch.setattr('backend.services.osm_service.city_registry.city_for', lambda lat, lon: city)
+    cities.clear()
+    found = asyncio.run(service.get_coordinates_many(['Тверская 999', 'аэропорт'],
+                                                     near={'lat': 55.75, 'lon': 37.6}))
+    assert [point['lat'] for point in found] == [55.75, 1.0]
+    assert cities == [city, city]
@@ -0,0 +1,49 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakeredis
+import pytest
+from flask import Flask
+from flask_login import LoginManager
+from backend.routes import api
+from backend.services.driver_location import DriverLocationService
+
+
+def make_client(monkeypatch, connected=True):
+    app = Flask(__name__)
+    app.config['LOGIN_DISABLED'] = True
+    LoginManager(app)
+    app.register_blueprint(api.api_bp, url_prefix='/api')
+    server = fakeredis.FakeServer()
+    server.connected = connected
+    service = DriverLocationService(fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(api, 'driver_service', service)
+    return app.test_client(), service
+
+
+def test_bulk_locations_endpoint(monkeypatch):
+    client, service = make_client(monkeypatch)
+    response = client.post('/api/drivers/locations', json=[
+        {'driver_id': 1, 'lat': 55.75, 'lon': 37.6},
+        {'driver_id': 2, 'lat': 55.7, 'lon': 37.5, 'status': 'busy', 'car_type': 'comfort'},
+        {'driver_id': 3}
+    ])
+    assert response.status_code == 200
+    assert response.get_json() == {'accepted': 2, 'rejected': 1}
+    assert service.redis.zcard('driver_locations') == 2
+
+
+@pytest.mark.parametrize('body, status', [({'driver_id': 1}, 400), ([{}] * 4, 413)])
+def test_bulk_locations_rejects_bad_requests(monkeypatch, body, status):
+    client, service = make_client(monkeypatch)
+    monkeypatch.setattr(api, 'MAX_LOCATION_BATCH', 3)
+    response = client.post('/api/drivers/locations', json=body)
+    assert response.status_code == status and 'error' in response.get_json()
+    assert service.redis.xlen('driver_events') == 0
+
+
+def test_bulk_locations_without_redis(monkeypatch):
+    client, _ = make_client(monkeypatch, connected=False)
+    response = client.post('/api/drivers/locations', json=[{'driver_id': 1, 'lat': 55.75, 'lon': 37.6}])
+    assert response.status_code == 503
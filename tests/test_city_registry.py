@@ -0,0 +1,97 @@
+import sys
+import os
+import json
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.city_registry import City, CityRegistry, load_cities
+from test_road_network import build_grid_network
+
+REGION = {'north': 56.0, 'south': 55.0, 'west': 37.0, 'east': 38.0}
+CENTER = {'north': 55.8, 'south': 55.7, 'west': 37.5, 'east': 37.7}
+
+
+def test_city_for_prefers_smallest_city(tmp_path):
+    path = tmp_path / 'cities.json'
+    path.write_text(json.dumps([
+        {'name': 'region', 'bounds': REGION, 'network_path': 'region.rnet', 'redis_prefix': ''},
+        {'name': 'center', 'bounds': CENTER, 'network_path': 'center.rnet',
+         'fare_zone': {'north': 55.75, 'south': 55.7, 'west': 37.5, 'east': 37.6}}
+    ]))
+    registry = CityRegistry(load_cities(str(path)), memory_bytes=1 << 30)
+
+    assert registry.default.name == 'region'
+    assert registry.city_for(55.72, 37.55).name == 'center'
+    assert registry.city_for(55.2, 37.1).name == 'region'
+    assert registry.city_for(54.0, 37.5) is None
+
+    center = registry.get('center')
+    assert center.in_fare_zone(55.72, 37.55) and not center.in_fare_zone(55.78, 37.65)
+    assert center.key('driver_locations') == 'center:driver_locations'
+    assert registry.default.key('driver_locations') == 'driver_locations'
+
+
+def test_resources_are_loaded_once_and_cold_cities_unloaded():
+    cities = [City(name, REGION, f'{name}.rnet') for name in ('a', 'b', 'c')]
+    networks = {city.name: build_grid_network(6, seed=i) for i, city in enumerate(cities)}
+    size = networks['a'].nbytes
+    registry = CityRegistry(cities, memory_bytes=size * 2)
+    calls = []
+
+    def load(city):
+        calls.append(city.name)
+        return networks[city.name]
+
+    for city in cities[:2]:
+        assert registry.resource(city, 'network', lambda: load(city)) is networks[city.name]
+    assert registry.resource(cities[0], 'network', lambda: load(cities[0])) is networks['a']
+    assert calls == ['a', 'b']
+
+    # 'b' не использовался дольше всех - выгружается при загрузке 'c'
+    registry.resource(cities[2], 'network', lambda: load(cities[2]))
+    assert registry.loaded(cities[1], 'network') is None
+    assert registry.loaded(cities[0], 'network') is networks['a']
+    stats = registry.get_stats()
+    assert stats['unloads'] == 1 and sorted(stats['loaded']) == ['a', 'c']
+    assert stats['memory_bytes'] <= size * 2
+
+    registry.resource(cities[1], 'network', lambda: load(cities[1]))
+    assert calls == ['a', 'b', 'c', 'b']
+
+
+def test_missing_artifacts_are_retried_and_loads_do_not_block_other_cities():
+    cities = [City(name, REGION, f'{name}.rnet') for name in ('a', 'b')]
+    network = build_grid_network(4, seed=1)
+    registry = CityRegistry(cities, memory_bytes=1 << 30, retry_seconds=0.2)
+    available = []
+    calls = []
+
+    def load():
+        calls.append(1)
+        return network if available else None
+
+    # Артефакта ещё нет: None не кэшируется навсегда, но и не проверяется на каждый запрос
+    assert registry.resource(cities[0], 'network', load) is None
+    assert registry.resource(cities[0], 'network', load) is None
+    assert len(calls) == 1 and registry.get_stats()['missing'] == 1
+    available.append(True)
+    time.sleep(0.25)
+    assert registry.resource(cities[0], 'network', load) is network
+
+    # Пока грузится город 'b', загруженный 'a' отдаётся без ожидания
+    started, release = threading.Event(), threading.Event()
+
+    def slow_load():
+        started.set()
+        release.wait(5)
+        return network
+
+    loader = threading.Thread(target=lambda: registry.resource(cities[1], 'network', slow_load))
+    loader.start()
+    assert started.wait(5)
+    assert registry.resource(cities[0], 'network', load) is network
+    assert registry.loaded(cities[1], 'network') is None
+    release.set()
+    loader.join(5)
+    assert registry.resource(cities[1], 'network', load) is network and len(calls) == 2
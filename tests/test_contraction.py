@@ -0,0 +1,66 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import numpy as np
+from backend.services.contraction import ContractionHierarchy, hierarchy_path
+from backend.services.routing import dijkstra, shortest_path
+from backend.services.speed_profiles import HOURS_PER_WEEK
+from test_road_network import build_grid_network
+
+
+def test_queries_match_dijkstra():
+    network = build_grid_network(12, seed=3)
+    hierarchy = ContractionHierarchy.build(network, 'time')
+    rng = random.Random(1)
+    for _ in range(50):
+        source = rng.randrange(network.node_count)
+        target = rng.randrange(network.node_count)
+        expected = dijkstra(network, source, target)
+        path = hierarchy.query(source, target)
+        assert abs(path['cost'] - expected['cost']) < 1e-3
+        # Распакованный путь состоит из исходных рёбер и связен
+        nodes = network.path_nodes(path['edges'], source)
+        assert nodes[0] == source and nodes[-1] == target
+        assert np.all(network.edge_head[path['edges'][:-1]] == network.edge_tail[path['edges'][1:]])
+        assert abs(float(network.edge_time[path['edges']].sum()) - expected['cost']) < 1e-2
+
+
+def test_save_load_and_version_check(tmp_path):
+    network = build_grid_network(8)
+    network_path = network.save(str(tmp_path / 'city.rnet'))
+    hierarchy = ContractionHierarchy.build(network, 'length')
+    path = hierarchy.save(hierarchy_path(network_path, 'length'))
+    assert path.endswith('city.length.ch')
+
+    loaded = ContractionHierarchy.load(path)
+    assert loaded.network_version == network.version
+    result = shortest_path(network, 0, 63, 'length', loaded)
+    expected = dijkstra(network, 0, 63, network.edge_length)
+    assert abs(result['cost'] - expected['cost']) < 1e-3
+
+
+def test_learned_profiles_search_with_hierarchy_potential():
+    network = build_grid_network(12, seed=5)
+    hierarchy = ContractionHierarchy.build(network, 'time')
+    version = network.weights_version
+    # Своя кривая у каждого ребра, как у профилей из треков водителей
+    rng = np.random.default_rng(2)
+    network.set_speed_profiles(rng.uniform(0.6, 3.0, (network.edge_count, HOURS_PER_WEEK)),
+                               np.arange(network.edge_count))
+    assert network.uniform_time_factor(8) is None
+    assert network.version == hierarchy.network_version and network.weights_version != version
+
+    weights = network.time_weights(8)
+    penalties = {edge: float(weights[edge]) * 2 for edge in range(0, network.edge_count, 7)}
+    pick = random.Random(4)
+    for _ in range(30):
+        source = pick.randrange(network.node_count)
+        target = pick.randrange(network.node_count)
+        for overrides in (None, penalties):
+            result = shortest_path(network, source, target, 'time', hierarchy, 'ch', weights,
+                                   overrides, max_speed_kmh=network.max_speed_at(8))
+            expected = dijkstra(network, source, target, weights, overrides)
+            assert result['engine'] == 'ch_astar'
+            assert abs(result['cost'] - expected['cost']) < 1e-3
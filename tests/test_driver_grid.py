@@ -0,0 +1,71 @@
+import sys
+import os
+import math
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from backend.services.city_registry import city_registry
+from backend.services.driver_grid import DriverGrid, DriverIndex
+from backend.services.hex_grid import HexGrid
+
+CAR_TYPES = ['economy', 'comfort', 'business']
+
+
+def random_grid(count, seed):
+    grid = DriverGrid(HexGrid(300, 55.75, 37.6))
+    rng = np.random.default_rng(seed)
+    lats = 55.75 + rng.uniform(-0.05, 0.05, count)
+    lons = 37.6 + rng.uniform(-0.08, 0.08, count)
+    types = rng.choice(CAR_TYPES, count)
+    for driver_id, (lat, lon, car_type) in enumerate(zip(lats, lons, types)):
+        grid.upsert(driver_id, float(lat), float(lon), str(car_type))
+    return grid, lats, lons, types
+
+
+def test_hex_cell_and_rings():
+    grid = HexGrid(250, 54.7, 55.9)
+    rng = np.random.default_rng(5)
+    lats = 54.7 + rng.uniform(-0.05, 0.05, 200)
+    lons = 55.9 + rng.uniform(-0.05, 0.05, 200)
+    assert [grid.cell(lat, lon) for lat, lon in zip(lats, lons)] == grid.cells(lats, lons).tolist()
+
+    center = grid.cell(54.71, 55.88)
+    seen = set()
+    for k in range(5):
+        ring = grid.ring(center, k)
+        assert len(ring) == max(1, 6 * k) and not seen & set(ring)
+        seen.update(ring)
+        q, r = grid.unpack(ring)
+        q0, r0 = grid.unpack([center])
+        # Расстояние в кубических координатах до центра - ровно k
+        assert (np.maximum.reduce([abs(q - q0), abs(r - r0), abs(q + r - q0 - r0)]) == k).all()
+
+
+def test_nearest_matches_brute_force():
+    grid, lats, lons, types = random_grid(3000, seed=8)
+    kx, ky = grid.grid.kx, grid.grid.ky
+    max_distance = {'economy': 1.5, 'business': 3.0}
+    for lat, lon in ((55.75, 37.6), (55.72, 37.55), (55.79, 37.67)):
+        km = np.hypot((lons - lon) * kx, (lats - lat) * ky) / 1000
+        allowed = np.array([km[i] <= max_distance.get(types[i], -1) for i in range(len(km))])
+        expected = [int(i) for i in np.argsort(km) if allowed[i]][:10]
+        found = grid.nearest(lat, lon, 10, max_distance)
+        assert [driver_id for driver_id, _, _, _ in found] == expected
+        assert all(math.isclose(distance, km[driver_id]) for driver_id, distance, _, _ in found)
+
+
+def test_updates_and_stream_events_move_drivers():
+    grid, _, _, _ = random_grid(50, seed=9)
+    grid.upsert(7, 55.75, 37.6, 'comfort')
+    assert grid.nearest(55.75, 37.6, 1, {'comfort': 1.0})[0][0] == 7
+    grid.remove(7)
+    assert all(driver_id != 7 for driver_id, _, _, _ in grid.ring(55.75, 37.6, 3))
+    assert len(grid) == 49
+
+    index = DriverIndex(None, CAR_TYPES)
+    city = city_registry.default
+    index.apply({b'op': b'set', b'driver': b'driver:5', b'city': city.name.encode(),
+                 b'lat': b'55.7', b'lon': b'37.6', b'car_type': b'economy'})
+    assert index.grid_for(city).nearest(55.7, 37.6, 5, {'economy': 1.0})[0][0] == 5
+    index.apply({b'op': b'del', b'driver': b'driver:5'})
+    assert len(index.grid_for(city)) == 0 and index.get_stats()['events'] == 2
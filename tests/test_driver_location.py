@@ -0,0 +1,207 @@
+import sys
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakeredis
+import numpy as np
+import pytest
+from backend.services import driver_location, driver_sweeper
+from backend.services.city_registry import City, CityRegistry
+from backend.services.driver_grid import DRIVER_EVENTS_KEY
+from backend.services.driver_location import DriverLocationService, UPDATE_LOCATION_SHA
+from backend.services.trajectory_store import TrajectoryStore
+
+
+def make_service(connected=True):
+    server = fakeredis.FakeServer()
+    server.connected = connected
+    return DriverLocationService(fakeredis.FakeRedis(server=server))
+
+
+def ping(driver_id, lat, lon, **fields):
+    return dict(fields, driver_id=driver_id, lat=lat, lon=lon)
+
+
+def test_location_update_writes_indexes_in_one_script():
+    service = make_service()
+    r = service.redis
+    assert asyncio.run(service.update_driver_location(1, 55.75, 37.6, car_type='comfort'))
+    assert r.geopos('driver_locations', 'driver:1')[0] is not None
+    assert r.zrange('drivers_available:comfort', 0, -1) == [b'driver:1']
+    assert json.loads(r.get('driver_info:1'))['status'] == 'available'
+    assert 0 < r.ttl('driver_info:1') <= service.LOCATION_EXPIRE
+    assert r.zscore('drivers_last_seen', 'driver:1') == pytest.approx(time.time(), abs=5)
+
+    # Занятый водитель сменил тип авто: ни в одном индексе свободных его нет
+    for _ in range(service.LOCATION_HISTORY_SIZE + 2):
+        asyncio.run(service.update_driver_location(1, 55.76, 37.61, 'busy', 'economy'))
+    assert r.zcard('drivers_available:comfort') == r.zcard('drivers_available:economy') == 0
+    assert r.llen('driver_history:1') == service.LOCATION_HISTORY_SIZE
+    ops = [fields[b'op'] for _, fields in r.xrange(DRIVER_EVENTS_KEY)]
+    assert ops == [b'set'] + [b'busy'] * (service.LOCATION_HISTORY_SIZE + 2)
+
+
+def test_bulk_update_counts_and_script_reload():
+    service = make_service()
+    r = service.redis
+    batch = [ping(1, 55.75, 37.6), ping(2, 55.7, 37.5, status='busy'),
+             ping('x', 55.7, 37.5), {'driver_id': 3, 'lat': 55.7}]
+    assert not r.script_exists(UPDATE_LOCATION_SHA)[0]
+    # Первый вызов получает NOSCRIPT, загружает скрипт и повторяет пачку
+    assert asyncio.run(service.update_driver_locations(batch)) == 2
+    assert r.script_exists(UPDATE_LOCATION_SHA)[0]
+    assert r.zcard('driver_locations') == 2 and r.xlen(DRIVER_EVENTS_KEY) == 2
+
+    r.script_flush()
+    assert asyncio.run(service.update_driver_locations([ping(1, 55.76, 37.61, timestamp=1.5e9)])) == 1
+    assert r.llen('driver_history:1') == 2
+    assert json.loads(r.lindex('driver_history:1', 0))['timestamp'] == 1.5e9
+    assert asyncio.run(service.update_driver_locations([])) == 0
+
+
+def test_redis_errors_are_reported():
+    service = make_service(connected=False)
+    assert asyncio.run(service.update_driver_locations([ping(1, 55.75, 37.6)])) is None
+    assert asyncio.run(service.update_driver_location(1, 55.75, 37.6)) is False
+
+
+def place(service, driver_id, km_north, **fields):
+    """Driver ``km_north`` kilometers north of (55.75, 37.6)"""
+    asyncio.run(service.update_driver_location(driver_id, 55.75 + km_north / 111.2, 37.6, **fields))
+
+
+def test_search_widens_radius_in_distance_order():
+    service = make_service()
+    for driver_id, km in ((1, 2.6), (2, 0.4), (3, 1.5), (4, 6.0)):
+        place(service, driver_id, km)
+    rounds = []
+    pipeline = service.redis.pipeline
+    service.redis.pipeline = lambda **kwargs: rounds.append(1) or pipeline(**kwargs)
+
+    found = service._search_available(55.75, 37.6, 10, 'economy', 1)
+    assert [driver[0] for driver in found] == [2] and len(rounds) == 1
+    found = service._search_available(55.75, 37.6, 10, 'economy', 2)
+    assert [driver[0] for driver in found] == [2, 3] and len(rounds) == 3
+    # Радиус ограничен max_distance эконома (3 км): четвёртого водителя нет
+    found = service._search_available(55.75, 37.6, 10, 'economy', 5)
+    assert [driver[0] for driver in found] == [2, 3, 1]
+    assert [round(driver[1], 1) for driver in found] == [0.4, 1.5, 2.6]
+    assert found[0][2][1] == pytest.approx(55.75 + 0.4 / 111.2, abs=1e-5)
+
+
+def test_search_skips_busy_expired_and_other_car_types():
+    service = make_service()
+    place(service, 1, 0.2)
+    place(service, 2, 0.3, car_type='comfort')
+    place(service, 3, 0.4, status='busy')
+    place(service, 4, 0.5)
+    place(service, 5, 0.6)
+    # Информация истекла, а водитель остался в гео-индексе
+    service.redis.delete('driver_info:4')
+    # Статус сменился в обход скрипта обновления
+    info = json.loads(service.redis.get('driver_info:5'))
+    service.redis.set('driver_info:5', json.dumps(dict(info, status='busy')))
+
+    found = service._search_available(55.75, 37.6, 5, 'economy', 10)
+    assert [(driver[0], driver[3]) for driver in found] == [(1, 'economy')]
+    found = service._search_available(55.75, 37.6, 5, None, 10)
+    assert [(driver[0], driver[3]) for driver in found] == [(1, 'economy'), (2, 'comfort')]
+    drivers = asyncio.run(service.find_nearest_drivers(55.75, 37.6, car_type='comfort', index='redis'))
+    assert [driver['driver_id'] for driver in drivers] == [2]
+
+
+def test_sweep_removes_only_stale_drivers(monkeypatch, capsys):
+    service = make_service()
+    r = service.redis
+    service.SWEEP_BATCH_SIZE = 2
+    for driver_id in range(1, 8):
+        place(service, driver_id, driver_id * 0.1, car_type='comfort' if driver_id % 2 else 'economy')
+    place(service, 8, 0.8, status='busy')
+    # Пятеро давно не присылали локацию
+    stale = {f'driver:{driver_id}': time.time() - service.LOCATION_EXPIRE - 60 for driver_id in (1, 2, 3, 4, 8)}
+    r.zadd('drivers_last_seen', stale)
+
+    stats = service.get_presence_stats()['default']
+    assert (stats['geo_set_size'], stats['live_drivers'], stats['stale_drivers']) == (8, 3, 5)
+    assert stats['available'] == {'economy': 3, 'comfort': 4, 'business': 0}
+
+    monkeypatch.setattr(driver_sweeper, 'DriverLocationService', lambda: service)
+    assert driver_sweeper.main(['--once']) == 0
+    assert capsys.readouterr().out.strip() == '5'
+    assert sorted(r.zrange('driver_locations', 0, -1)) == [b'driver:5', b'driver:6', b'driver:7']
+    assert r.zrange('drivers_last_seen', 0, -1) == [b'driver:5', b'driver:6', b'driver:7']
+    assert r.zrange('drivers_available:economy', 0, -1) == [b'driver:6']
+    assert sorted(r.zrange('drivers_available:comfort', 0, -1)) == [b'driver:5', b'driver:7']
+    deleted = [fields[b'driver'] for _, fields in r.xrange(DRIVER_EVENTS_KEY) if fields[b'op'] == b'del']
+    assert sorted(deleted) == sorted(member.encode() for member in stale)
+
+    stats = service.get_presence_stats()['default']
+    assert (stats['geo_set_size'], stats['live_drivers'], stats['stale_drivers']) == (3, 3, 0)
+    assert service.sweep_stale_drivers() == 0
+    assert make_service(connected=False).get_presence_stats() == {}
+
+
+def test_trajectory_and_analytics_read_synchronously(tmp_path):
+    service = make_service()
+    service.trajectories = TrajectoryStore(str(tmp_path))
+    now = time.time()
+    # Сохранённая часть траектории и свежие точки, ещё не записанные в хранилище
+    stored = now - 3600 + np.arange(10) * 60.0
+    service.trajectories.write_segment(datetime.fromtimestamp(stored[0]).date(), '1', np.full(10, 7),
+                                       stored, 55.75 + np.arange(10) * 0.001, np.full(10, 37.6))
+    for i in range(3):
+        service.redis.lpush('driver_history:7', json.dumps(
+            {'lat': 55.76 + i * 0.001, 'lon': 37.6, 'timestamp': now - 60 + i * 20}))
+
+    async def handler():
+        # Как обработчик бота: цикл событий уже запущен
+        return (service.driver_trajectory(7, datetime.fromtimestamp(now - 7200)),
+                service.driver_analytics(7, datetime.fromtimestamp(now - 7200)))
+
+    points, analytics = asyncio.run(handler())
+    assert len(points) == 13 and points == sorted(points, key=lambda p: p['timestamp'])
+    assert analytics['points_count'] == 13
+    assert analytics['total_distance'] == pytest.approx(12 * 0.111, rel=0.01)
+    assert asyncio.run(service.get_driver_analytics(7, datetime.fromtimestamp(now - 7200))) == analytics
+
+
+def test_presence_stats_use_redis_clock():
+    service = make_service()
+    for driver_id in (1, 2, 3):
+        place(service, driver_id, driver_id * 0.1)
+    # Часы Redis отстают от часов процесса на три часа
+    redis_now = time.time() - 3 * 3600
+    service.redis.time = lambda: (int(redis_now), 0)
+    service.redis.zadd('drivers_last_seen', {'driver:1': redis_now - 10, 'driver:2': redis_now - 20,
+                                             'driver:3': redis_now - service.LOCATION_EXPIRE - 60})
+    stats = service.get_presence_stats()['default']
+    assert (stats['live_drivers'], stats['stale_drivers']) == (2, 1)
+
+
+def test_driver_moves_between_cities(monkeypatch):
+    north = {'north': 56.0, 'south': 55.8, 'west': 37.0, 'east': 38.0}
+    south = {'north': 55.8, 'south': 55.5, 'west': 37.0, 'east': 38.0}
+    registry = CityRegistry([City('south', south, 's.rnet', redis_prefix=''),
+                             City('north', north, 'n.rnet')], memory_bytes=0)
+    monkeypatch.setattr(driver_location, 'city_registry', registry)
+    service = make_service()
+    r = service.redis
+
+    asyncio.run(service.update_driver_location(1, 55.75, 37.6, car_type='comfort'))
+    keys, _ = service._location_update(1, 55.9, 37.6, 'available', 'economy', time.time())
+    # Ключи одной локации не зависят от числа городов и типов авто
+    assert len(keys) == 7
+    asyncio.run(service.update_driver_location(1, 55.9, 37.6, car_type='economy'))
+    assert r.zcard('driver_locations') == r.zcard('drivers_last_seen') == 0
+    assert r.zcard('drivers_available:comfort') == 0
+    assert r.zrange('north:drivers_available:economy', 0, -1) == [b'driver:1']
+    assert r.zrange('north:drivers_last_seen', 0, -1) == [b'driver:1']
+
+    asyncio.run(service.update_driver_location(1, 55.9, 37.6, 'busy', 'economy'))
+    assert r.zcard('north:drivers_available:economy') == 0
+    assert r.zrange('north:driver_locations', 0, -1) == [b'driver:1']
+    assert r.hgetall('driver_keys:1')[b'available'] == b''
@@ -0,0 +1,104 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from backend.services.geocoding_client import GeocodingClient, RedisTokenBucket
+
+
+class DictRedis:
+    """Minimal Redis replacement keeping values in a dict; scripts always fail"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value.encode('utf-8')
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def register_script(self, script):
+        def run(keys, args):
+            raise ConnectionError('scripts are not supported')
+        return run
+
+
+class SlowGeocoder:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        time.sleep(self.delay)
+        if 'nowhere' in address:
+            return None
+        return SimpleNamespace(latitude=55.75, longitude=37.61, address=address)
+
+
+def make_client(geocoder, rate=1000.0, max_wait=1.0):
+    redis = DictRedis()
+    limiter = RedisTokenBucket(redis, 'geocode:ratelimit', rate, burst=1)
+    return GeocodingClient(redis, geocoder, limiter=limiter, ttl=60, negative_ttl=60,
+                           max_wait=max_wait, concurrency=4)
+
+
+def test_concurrent_lookups_share_one_call():
+    geocoder = SlowGeocoder()
+    client = make_client(geocoder)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(client.geocode('Арбат 1')))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(geocoder.calls) == 1
+    assert all(result['lat'] == 55.75 for result in results)
+    assert client.geocode('  арбат   1 ')['lat'] == 55.75
+    assert client.get_stats()['hits'] == 1
+
+
+def test_not_found_is_cached():
+    geocoder = SlowGeocoder(delay=0)
+    client = make_client(geocoder)
+    assert client.geocode('nowhere street') is None
+    assert client.geocode('nowhere street') is None
+    assert len(geocoder.calls) == 1
+    assert client.get_stats()['negative_hits'] == 1
+
+
+def test_rate_limit_without_redis_falls_back_to_process_bucket():
+    geocoder = SlowGeocoder(delay=0)
+    client = make_client(geocoder, rate=2.0, max_wait=0.1)
+    assert client.geocode('Тверская 1') is not None
+    # Следующий токен через 0.5 с - дольше max_wait, запрос не выполняется и не кэшируется
+    assert client.geocode('Тверская 2') is None
+    assert client.get_stats()['rate_limited'] == 1
+    assert len(geocoder.calls) == 1
+
+
+def test_geocode_many_keeps_order_and_deduplicates():
+    geocoder = SlowGeocoder()
+    client = make_client(geocoder)
+    addresses = ['Арбат 1', 'nowhere', 'Арбат 2', 'Арбат 1']
+    started = time.monotonic()
+    results = asyncio.run(client.geocode_many(addresses))
+    assert time.monotonic() - started < 3 * geocoder.delay
+    assert [r and r['address'] for r in results] == ['Арбат 1', None, 'Арбат 2', 'Арбат 1']
+    assert sorted(geocoder.calls) == sorted(set(addresses))
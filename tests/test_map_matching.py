@@ -0,0 +1,59 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+import numpy as np
+from backend.services.map_matching import match_traces
+from backend.services.road_network import haversine_km
+from backend.services.routing import dijkstra
+from backend.services.speed_table import SpeedTable
+from backend.services.trajectory_store import TrajectoryStore
+from test_road_network import build_grid_network
+
+
+def drive(network, edges, speed, interval, start, noise, rng):
+    """GPS fixes of a drive along edges at constant speed"""
+    nodes = network.path_nodes(edges)
+    lats, lons = network.node_lat[nodes], network.node_lon[nodes]
+    along = np.concatenate(([0.0], np.cumsum(
+        haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:]) * 1000)))
+    times = np.arange(0, along[-1] / speed, interval)
+    fix_lat = np.interp(times * speed, along, lats) + rng.normal(0, noise / 111000, len(times))
+    fix_lon = np.interp(times * speed, along, lons) + rng.normal(0, noise / 63000, len(times))
+    return start + times, fix_lat, fix_lon
+
+
+def test_matched_traversals_give_speed_profiles(tmp_path):
+    network = build_grid_network(10, seed=5, stretch=1.0)
+    network_path = network.save(str(tmp_path / 'city.rnet'))
+    rng = np.random.default_rng(1)
+    start = datetime(2026, 10, 12, 8, 0).timestamp()  # понедельник, 8 утра
+
+    rows = []
+    routes = [dijkstra(network, 0, 99, network.edge_length)['edges'],
+              dijkstra(network, 90, 9, network.edge_length)['edges']]
+    for driver, edges in enumerate(routes):
+        times, lats, lons = drive(network, edges, 5.0, 3.0, start, 4.0, rng)
+        rows += [(driver, t, lat, lon) for t, lat, lon in zip(times, lats, lons)]
+    store = TrajectoryStore(str(tmp_path / 'trajectories'))
+    day = datetime.fromtimestamp(start).date()
+    store.write_segment(day, '1', *(np.array(column) for column in zip(*rows)))
+
+    table = match_traces(network_path, [day], workers=1, store=store)
+    edges = table.speed_key // 168
+    assert set(edges.tolist()) <= set(routes[0]) | set(routes[1])
+    # Первое и последнее ребро пройдены не целиком
+    assert len(edges) >= len(routes[0]) + len(routes[1]) - 6
+    assert set((table.speed_key % 168).tolist()) <= {8}
+    factors = table.speed_time / (table.speed_count * network.edge_time[edges])
+    expected = (30 / 3.6) / 5.0
+    assert abs(np.median(factors) - expected) < 0.15
+
+    loaded = SpeedTable.load(table.save(str(tmp_path / 'city.speeds')))
+    profiles, edge_profile = loaded.to_profiles(network, min_edge_observations=1,
+                                                min_hour_observations=1)
+    network.set_speed_profiles(profiles, edge_profile)
+    observed = network.time_weights(8)[edges] / network.edge_time[edges]
+    assert np.allclose(observed, np.clip(factors, 0.5, 10.0), rtol=1e-4)
+    assert network.uniform_time_factor(8) is None
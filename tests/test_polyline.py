@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from backend.services.polyline import (
+    ROUTE_PRECISION, decode_polyline, encode_polyline, line_geometry, route_geometry,
+    route_points, simplify_line
+)
+
+
+def test_encode_matches_reference():
+    coords = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+    encoded = encode_polyline(coords)
+    assert encoded == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+    assert np.allclose(decode_polyline(encoded), coords)
+    assert encode_polyline([]) == '' and decode_polyline('').shape == (0, 2)
+
+
+def test_round_trip_precision():
+    rng = np.random.default_rng(4)
+    coords = np.column_stack((54.7 + rng.uniform(-0.1, 0.1, 300), 55.9 + rng.uniform(-0.1, 0.1, 300)))
+    decoded = decode_polyline(encode_polyline(coords, ROUTE_PRECISION), ROUTE_PRECISION)
+    assert np.abs(decoded - coords).max() <= 0.5e-6 + 1e-12
+
+
+def test_simplify_line_keeps_shape():
+    # Прямая с шумом в пару метров и один поворот
+    rng = np.random.default_rng(5)
+    lons = np.linspace(55.90, 55.95, 200)
+    lats = 54.70 + rng.normal(0, 0.00001, 200)
+    lats[100:] += np.linspace(0, 0.02, 100)
+    coords = np.column_stack((lats, lons))
+    simplified = simplify_line(coords, 10)
+    assert len(simplified) < 10
+    assert np.array_equal(simplified[0], coords[0]) and np.array_equal(simplified[-1], coords[-1])
+    assert len(simplify_line(coords, 0)) == len(coords)
+
+
+def test_route_geometry_formats():
+    coords = [[54.7, 55.9], [54.71, 55.91], [54.72, 55.905]]
+    polyline = line_geometry(coords, 'polyline')['route_polyline']
+    assert route_geometry(polyline, 'polyline') == {'route_polyline': polyline}
+    array = route_geometry(polyline, 'array')['route_coordinates']
+    assert isinstance(array, np.ndarray) and np.allclose(array, coords)
+    assert np.allclose(route_geometry(polyline)['route_coordinates'], coords)
+    assert np.allclose(route_points({'route_polyline': polyline}), coords)
+    assert route_points({'route_coordinates': array}) == array.tolist()
@@ -0,0 +1,42 @@
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services import pricing
+
+
+class RuleStub:
+    base_fare = 100.0
+    per_km_city = 20.0
+    per_km_suburb = 30.0
+    minimum_fare = 150.0
+
+
+class QueryStub:
+    def filter_by(self, **kwargs):
+        return self
+
+    def first(self):
+        return RuleStub()
+
+
+class FareRuleStub:
+    query = QueryStub()
+
+
+def route(start, end, distance=10.0):
+    return {'distance': distance,
+            'start_location': {'lat': start[0], 'lng': start[1]},
+            'end_location': {'lat': end[0], 'lng': end[1]}}
+
+
+def test_default_city_keeps_legacy_fare_zone(monkeypatch):
+    monkeypatch.setattr(pricing, 'FareRule', FareRuleStub)
+    # Обе точки в старой зоне городского тарифа (56.0-56.5, 92.5-93.0)
+    assert asyncio.run(pricing.calculate_fare(route((56.01, 92.87), (56.05, 92.93)))) == 300.0
+    # Конец поездки за городом
+    assert asyncio.run(pricing.calculate_fare(route((56.01, 92.87), (55.9, 92.7)))) == 400.0
+    # Поездка в границах CITY_BOUNDS, но вне зоны тарифа
+    assert asyncio.run(pricing.calculate_fare(route((55.75, 37.6), (55.7, 37.5)))) == 400.0
+    assert asyncio.run(pricing.calculate_fare(route((56.01, 92.87), (56.05, 92.93), 1.0))) == 150.0
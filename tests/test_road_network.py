@@ -0,0 +1,161 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import networkx as nx
+from backend.services.road_network import RoadNetwork, haversine_km
+from backend.services.routing import (
+    alternative_paths, bidirectional_astar, dijkstra, many_to_one, path_overlap, reachable, shortest_path
+)
+from backend.services.hex_grid import HexGrid
+from backend.services.speed_profiles import HOURS_PER_WEEK
+
+
+def build_grid_network(size=6, seed=0, stretch=2.0):
+    """Random-weight grid network with two-way streets; edges are up to ``stretch`` times the straight line"""
+    rng = np.random.default_rng(seed)
+    osmids = rng.permutation(size * size) * 7 + 1000
+    lats = 55.7 + np.repeat(np.arange(size), size) * 0.002
+    lons = 37.6 + np.tile(np.arange(size), size) * 0.003
+    tails, heads = [], []
+    for r in range(size):
+        for c in range(size):
+            node = r * size + c
+            if c + 1 < size:
+                tails += [node, node + 1]
+                heads += [node + 1, node]
+            if r + 1 < size:
+                tails += [node, node + size]
+                heads += [node + size, node]
+    # Длина ребра не короче прямой между узлами, как у рёбер osmnx
+    straight = haversine_km(lats[tails], lons[tails], lats[heads], lons[heads]) * 1000
+    lengths = straight * rng.uniform(1.0, stretch, len(tails))
+    return RoadNetwork.from_arrays(osmids, lats, lons, tails, heads, lengths)
+
+
+def test_csr_layout():
+    network = build_grid_network()
+    assert np.all(np.diff(network.node_osmid) > 0)
+    for node in range(network.node_count):
+        assert np.all(network.edge_tail[network.out_edges(node)] == node)
+        assert np.all(network.edge_head[network.in_edges(node)] == node)
+    assert network.node_index(int(network.node_osmid[5])) == 5
+
+
+def test_save_and_mmap_load(tmp_path):
+    network = build_grid_network()
+    path = network.save(str(tmp_path / 'city.rnet'))
+    loaded = RoadNetwork.load(path)
+    assert loaded.version == network.version
+    for name, array in network.arrays.items():
+        assert np.array_equal(loaded.arrays[name], array)
+    assert not loaded.edge_time.flags.writeable
+
+
+def test_dijkstra_matches_networkx():
+    network = build_grid_network()
+    graph = nx.DiGraph()
+    for e in range(network.edge_count):
+        graph.add_edge(int(network.edge_tail[e]), int(network.edge_head[e]),
+                       time=float(network.edge_time[e]))
+    for source, target in [(0, 35), (7, 30), (12, 12)]:
+        path = dijkstra(network, source, target)
+        expected = nx.shortest_path_length(graph, source, target, weight='time')
+        assert abs(path['cost'] - expected) < 1e-3
+        assert network.path_nodes(path['edges'], source)[-1] == target
+
+
+def test_haversine():
+    assert abs(haversine_km(55.7539, 37.6208, 55.7298, 37.6010) - 2.97) < 0.05
+
+
+def test_bidirectional_astar_matches_dijkstra():
+    network = build_grid_network(15, seed=2)
+    settled_astar = settled_dijkstra = 0
+    for source, target in [(0, 224), (14, 210), (100, 120), (37, 37)]:
+        for weight in ('time', 'length'):
+            expected = dijkstra(network, source, target, network.edge_weights(weight))
+            path = bidirectional_astar(network, source, target, weight=weight)
+            assert abs(path['cost'] - expected['cost']) < 1e-3
+            assert network.path_nodes(path['edges'], source)[-1] == target
+            settled_astar += path['settled']
+            settled_dijkstra += expected['settled']
+    assert settled_astar < settled_dijkstra
+
+
+def test_alternative_paths_use_overlay():
+    network = build_grid_network(10, seed=4)
+    before = network.edge_time.copy()
+    paths = alternative_paths(network, 0, 99, count=3, engine='astar')
+    assert np.array_equal(network.edge_time, before)
+    assert paths[0]['cost'] == min(path['cost'] for path in paths)
+    for path in paths[1:]:
+        assert path_overlap(network, path['edges'], paths[0]['edges']) <= 0.7
+        assert network.path_nodes(path['edges'], 0)[-1] == 99
+
+
+def test_many_to_one_matches_dijkstra():
+    network = build_grid_network(10, seed=6)
+    sources = [0, 9, 45, 77, 99, 45]
+    costs = many_to_one(network, sources, 55)
+    for source, cost in zip(sources, costs):
+        assert abs(cost - dijkstra(network, source, 55)['cost']) < 1e-3
+    assert many_to_one(network, [55], 55) == [0.0]
+
+
+def test_reachable_matches_dijkstra():
+    network = build_grid_network(10, seed=9)
+    bound = dijkstra(network, 0, 99)['cost'] * 0.6
+    for reverse in (False, True):
+        nodes, costs = reachable(network, 44, bound, reverse=reverse)
+        assert list(nodes) == sorted(nodes) and 44 in nodes
+        for node in range(network.node_count):
+            path = dijkstra(network, node, 44) if reverse else dijkstra(network, 44, node)
+            if path['cost'] <= bound:
+                position = int(np.searchsorted(nodes, node))
+                assert nodes[position] == node
+                assert abs(costs[position] - path['cost']) < 1e-3
+            else:
+                assert node not in nodes
+
+
+def test_hex_grid_round_trip():
+    grid = HexGrid(250, 54.7, 55.9)
+    rng = np.random.default_rng(3)
+    lats = 54.7 + rng.uniform(-0.05, 0.05, 500)
+    lons = 55.9 + rng.uniform(-0.05, 0.05, 500)
+    cells = grid.cells(lats, lons)
+    center_lats, center_lons = grid.centers(cells)
+    assert np.array_equal(grid.cells(center_lats, center_lons), cells)
+    q, r = grid.unpack(cells)
+    assert np.array_equal(grid.pack(q, r), cells) and (q < 0).any() and (r < 0).any()
+    # Точка не дальше радиуса ячейки от ее центра
+    dy = (lats - center_lats) * grid.ky
+    dx = (lons - center_lons) * grid.kx
+    assert np.hypot(dx, dy).max() <= 250 + 1e-6
+    assert len(grid.polygon(int(cells[0]))) == 6
+
+
+def test_time_weights_follow_speed_profiles(tmp_path):
+    network = build_grid_network(12, seed=8)
+    # Ночью все дороги быстрее свободного потока, в час пик - по-разному
+    profiles = np.full((2, HOURS_PER_WEEK), 0.8, dtype=np.float32)
+    profiles[1, 8] = 3.0
+    profiles[0, 8] = 1.0
+    edge_profile = (network.edge_tail % 2).astype(np.uint16)
+    network.set_speed_profiles(profiles, edge_profile)
+    loaded = RoadNetwork.load(network.save(str(tmp_path / 'city.rnet')))
+
+    assert loaded.uniform_time_factor(2) == np.float32(0.8)
+    assert loaded.uniform_time_factor(8) is None
+    rush = loaded.time_weights(8)
+    assert np.allclose(rush, loaded.edge_time * profiles[edge_profile, 8])
+    assert loaded.time_weights(8) is rush
+
+    for hour in (2, 8):
+        weights = loaded.time_weights(hour)
+        expected = dijkstra(loaded, 0, 143, weights)
+        path = shortest_path(loaded, 0, 143, engine='astar', weights=weights,
+                             max_speed_kmh=loaded.max_speed_at(hour))
+        assert abs(path['cost'] - expected['cost']) < 1e-3
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.route_cache import RouteCache
+
+
+class DictRedis:
+    """Minimal Redis replacement keeping values in a dict"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value.encode('utf-8')
+
+
+def snapped(edge, fraction):
+    return {'edge': edge, 'fraction': fraction}
+
+
+def test_key_groups_nearby_points():
+    cache = RouteCache(DictRedis(), max_entries=10)
+    key = cache.make_key('v1', snapped(5, 0.42), snapped(9, 0.1), 'time', 'normal', 3)
+    assert key == cache.make_key('v1', snapped(5, 0.38), snapped(9, 0.12), 'time', 'normal', 3)
+    assert key != cache.make_key('v1', snapped(5, 0.42), snapped(9, 0.1), 'time', 'night', 3)
+    assert key != cache.make_key('v2', snapped(5, 0.42), snapped(9, 0.1), 'time', 'normal', 3)
+
+
+def test_two_tiers_and_eviction():
+    redis = DictRedis()
+    cache = RouteCache(redis, max_entries=2)
+    keys = [cache.make_key('v1', snapped(i, 0), snapped(i + 1, 0), 'time', 'normal') for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.set(key, [{'distance': i}])
+    assert cache.get_stats()['evictions'] == 1
+    assert cache.get(keys[2]) == [{'distance': 2}]
+    # Вытесненная запись читается из Redis
+    assert cache.get(keys[0]) == [{'distance': 0}]
+    assert cache.get(cache.make_key('v1', snapped(7, 0), snapped(8, 0), 'time', 'normal')) is None
+    stats = cache.get_stats()
+    assert (stats['local_hits'], stats['redis_hits'], stats['misses']) == (1, 1, 1)
+    assert stats['size'] == 2
+
+
+def test_network_versions_share_local_entries():
+    cache = RouteCache(DictRedis(), max_entries=2)
+    city_a = cache.make_key('cityA', snapped(1, 0), snapped(2, 0), 'time', 'normal')
+    city_b = cache.make_key('cityB', snapped(1, 0), snapped(2, 0), 'time', 'normal')
+    cache.set(city_a, [{'distance': 1}])
+    cache.set(city_b, [{'distance': 2}])
+    assert cache.get(city_a) == [{'distance': 1}] and cache.get(city_b) == [{'distance': 2}]
+    assert cache.get_stats()['local_hits'] == 2
+
+    # Записи заменённой версии сети не читаются и вытесняются по LRU
+    rebuilt = cache.make_key('cityA2', snapped(1, 0), snapped(2, 0), 'time', 'normal')
+    cache.redis.data.clear()
+    assert cache.get(rebuilt) is None
+    cache.set(rebuilt, [{'distance': 3}])
+    cache.get(city_b)
+    cache.set(cache.make_key('cityA2', snapped(3, 0), snapped(4, 0), 'time', 'normal'), [])
+    assert cache.get(city_a) is None and cache.get(city_b) == [{'distance': 2}]
@@ -0,0 +1,86 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import numpy as np
+from backend.services import osm_service
+from backend.services.routing import many_to_one, snap_endpoint
+from backend.services.routing_client import RoutingClient, RoutingDaemonError
+from backend.services.routing_daemon import RoutingDaemon
+from backend.services.routing_pool import RoutingPool
+from test_road_network import build_grid_network
+
+
+def test_daemon_serves_calls_and_batches(tmp_path, monkeypatch):
+    network = build_grid_network(8, seed=11)
+    monkeypatch.setattr(osm_service, 'get_route_network', lambda *args: network)
+    points = [{'lat': float(network.node_lat[i]), 'lon': float(network.node_lon[i])} for i in (0, 9, 63)]
+    socket_path = str(tmp_path / 'routing.sock')
+    pool = RoutingPool(workers=0, timeout=10)
+
+    async def run():
+        server = await RoutingDaemon(socket_path, pool).start()
+        client = RoutingClient(socket_path, timeout=10)
+        try:
+            matrix = await client.call('search_eta_matrix', points[:2], points[2:], 30, {})
+            snapped, bad, stats = await client.call_many([
+                ('search_snap', (points, {})), ('no_such_method', ()), ('stats', ())
+            ])
+            return matrix, snapped, bad, stats
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    matrix, snapped, bad, stats = asyncio.run(run())
+    pool.shutdown()
+
+    weights = network.time_weights(30)
+    target = snap_endpoint(network, network.snap_edge(points[2]['lat'], points[2]['lon']), origin=False)
+    sources = [snap_endpoint(network, network.snap_edge(p['lat'], p['lon']), origin=True) for p in points[:2]]
+    expected = many_to_one(network, sources, target, 'time', weights)
+    assert [row[0] for row in matrix] == [round(cost / 60, 1) for cost in expected]
+
+    # Массивы NumPy проходят через протокол без потери типа
+    assert isinstance(snapped['node'], np.ndarray) and snapped['node'].tolist() == [0, 9, 63]
+    assert snapped['network_version'] == network.version
+    assert isinstance(bad, RoutingDaemonError)
+    assert stats['calls'] == {'search_eta_matrix': 1, 'search_snap': 1}
+
+
+def search_double(value):
+    return value * 2
+
+
+def test_run_search_falls_back_to_local_pool(tmp_path, monkeypatch):
+    pool = RoutingPool(workers=0, timeout=10)
+    monkeypatch.setattr(osm_service, 'routing_pool', pool)
+    monkeypatch.setattr(osm_service, '_daemon_stats', dict.fromkeys(osm_service._daemon_stats, 0))
+    socket_path = str(tmp_path / 'routing.sock')
+    silent_path = str(tmp_path / 'silent.sock')
+
+    async def never_answer(reader, writer):
+        await asyncio.sleep(10)
+
+    async def run():
+        results = []
+        # Сокета нет - демон не запущен
+        monkeypatch.setattr(osm_service, 'routing_client', RoutingClient(socket_path, timeout=1))
+        results.append(await osm_service.run_search(search_double, 1))
+        # Демон не знает метода и отвечает ошибкой
+        server = await RoutingDaemon(socket_path, pool).start()
+        results.append(await osm_service.run_search(search_double, 2))
+        server.close()
+        await server.wait_closed()
+        # Демон не отвечает дольше таймаута
+        silent = await asyncio.start_unix_server(never_answer, path=silent_path)
+        monkeypatch.setattr(osm_service, 'routing_client', RoutingClient(silent_path, timeout=0.2))
+        results.append(await osm_service.run_search(search_double, 3))
+        silent.close()
+        return results
+
+    assert asyncio.run(run()) == [2, 4, 6]
+    pool.shutdown()
+    stats = osm_service.get_daemon_stats()
+    assert (stats['calls'], stats['unavailable'], stats['errors'], stats['timeouts']) == (3, 1, 1, 1)
+    assert stats['fallbacks'] == 3 and stats['enabled']
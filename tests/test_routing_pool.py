@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import asyncio
+import pytest
+from backend.services.routing_pool import RoutingOverloaded, RoutingPool
+
+
+def test_process_pool_runs_tasks():
+    pool = RoutingPool(workers=1, max_pending=4, timeout=30)
+    try:
+        async def run():
+            return await asyncio.gather(*(pool.run(pow, 2, n) for n in range(4)))
+
+        assert asyncio.run(run()) == [1, 2, 4, 8]
+        stats = pool.get_stats()
+        assert stats['completed'] == 4 and stats['pending'] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_queue_bound_and_timeout():
+    pool = RoutingPool(workers=0, max_pending=1, timeout=0.05)
+    try:
+        async def run():
+            # Задача в работе занимает единственное место в очереди
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.run(time.sleep, 0.3)
+            with pytest.raises(RoutingOverloaded):
+                await pool.run(abs, -1)
+            await asyncio.sleep(0.4)
+            return await pool.run(abs, -1)
+
+        assert asyncio.run(run()) == 1
+        stats = pool.get_stats()
+        assert stats['timeouts'] == 1 and stats['rejected'] == 1 and stats['pending'] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_cancel_drops_queued_task():
+    pool = RoutingPool(workers=0, max_pending=10, timeout=5)
+    try:
+        async def run():
+            busy = asyncio.ensure_future(pool.run(time.sleep, 0.2))
+            queued = asyncio.ensure_future(pool.run(abs, -1))
+            await asyncio.sleep(0.05)
+            queued.cancel()
+            await busy
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+        assert pool.get_stats()['cancelled'] == 1
+    finally:
+        pool.shutdown()
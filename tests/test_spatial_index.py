@@ -0,0 +1,74 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from backend.services.contraction import ContractionHierarchy
+from backend.services.road_network import RoadNetwork
+from backend.services.routing import dijkstra, path_total, shortest_path, snap_endpoint
+from test_road_network import build_grid_network
+
+
+def random_points(network, count, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(network.node_lat.min() - 0.003, network.node_lat.max() + 0.003, count)
+    lons = rng.uniform(network.node_lon.min() - 0.003, network.node_lon.max() + 0.003, count)
+    return lats, lons
+
+
+def test_snap_many_matches_brute_force():
+    network = build_grid_network(10, seed=1)
+    index = network.spatial_index
+    lats, lons = random_points(network, 300)
+    nodes, distances = network.snap_many(lats, lons)
+    for lat, lon, node, distance in zip(lats, lons, nodes, distances):
+        x, y = index.project(lat, lon)
+        expected = np.hypot(index.node_x - x, index.node_y - y).min()
+        assert abs(distance - expected) < 1e-6
+        assert abs(np.hypot(index.node_x[node] - x, index.node_y[node] - y) - expected) < 1e-6
+
+
+def test_snap_edge_matches_brute_force():
+    network = build_grid_network(10, seed=1)
+    index = network.spatial_index
+    lats, lons = random_points(network, 300, seed=2)
+    snapped = index.snap_edges_many(lats, lons)
+    all_edges = np.arange(network.edge_count)
+    for i in range(len(lats)):
+        x, y = index.project(lats[i], lons[i])
+        _, _, _, distances = index._project_on_edges(x, y, all_edges)
+        assert abs(snapped['distance'][i] - distances.min()) < 1e-6
+        assert 0 <= snapped['fraction'][i] <= 1
+
+
+def test_grid_saved_with_network(tmp_path):
+    network = build_grid_network(8)
+    network.add_spatial_index()
+    loaded = RoadNetwork.load(network.save(str(tmp_path / 'city.rnet')))
+    assert 'grid' in loaded.meta
+    lats, lons = random_points(loaded, 50)
+    assert np.array_equal(loaded.snap_many(lats, lons)[0], network.snap_many(lats, lons)[0])
+
+
+def test_routes_between_snapped_points():
+    network = build_grid_network(8, seed=5)
+    hierarchy = ContractionHierarchy.build(network, 'time')
+    weights = network.edge_time
+    lats, lons = random_points(network, 20, seed=3)
+    for i in range(0, len(lats), 2):
+        origin = snap_endpoint(network, network.snap_edge(lats[i], lons[i]), origin=True)
+        destination = snap_endpoint(network, network.snap_edge(lats[i + 1], lons[i + 1]), origin=False)
+        # Перебор всех пар узлов концов с частями рёбер
+        expected = min(
+            dijkstra(network, u, v)['cost'] + share_u * weights[edge_u] + share_v * weights[edge_v]
+            for u, (edge_u, share_u) in origin.items()
+            for v, (edge_v, share_v) in destination.items()
+        )
+        for edge, share in origin.values():
+            for target_edge, target_share in destination.values():
+                if edge == target_edge and share + target_share >= 1:
+                    expected = min(expected, (share + target_share - 1) * weights[edge])
+        for engine in ('dijkstra', 'astar', 'ch'):
+            path = shortest_path(network, origin, destination, 'time', hierarchy, engine)
+            assert abs(path['cost'] - expected) < 1e-2
+            assert abs(path_total(network, path, weights) - path['cost']) < 1e-2
@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from backend.services.road_network import RoadNetwork
+from backend.services.routing import dijkstra
+from backend.services.tile_cache import TileCache
+from test_road_network import build_grid_network
+
+
+def cut_tiles(network, cache):
+    """Save tiles of a network like truncate_by_edge: edges with an end inside the tile"""
+    tail_tiles = [cache.tile_key(lat, lon) for lat, lon in
+                  zip(network.node_lat[network.edge_tail], network.node_lon[network.edge_tail])]
+    head_tiles = [cache.tile_key(lat, lon) for lat, lon in
+                  zip(network.node_lat[network.edge_head], network.node_lon[network.edge_head])]
+    keys = sorted(set(tail_tiles) | set(head_tiles))
+    for key in keys:
+        edges = np.array([i for i, (a, b) in enumerate(zip(tail_tiles, head_tiles)) if key in (a, b)])
+        nodes = np.unique(np.concatenate([network.edge_tail[edges], network.edge_head[edges]]))
+        position = np.searchsorted(nodes, np.arange(network.node_count))
+        tile = RoadNetwork.from_arrays(
+            network.node_osmid[nodes], network.node_lat[nodes], network.node_lon[nodes],
+            position[network.edge_tail[edges]], position[network.edge_head[edges]],
+            network.edge_length[edges]
+        )
+        tile.save(cache.tile_path(key))
+    return keys
+
+
+def test_stitched_tiles_match_network(tmp_path):
+    network = build_grid_network(10, seed=12)
+    cache = TileCache(str(tmp_path), tile_deg=0.007, memory_bytes=1 << 30, disk_bytes=1 << 30)
+    tiles = cut_tiles(network, cache)
+    assert len(tiles) > 4 and set(tiles) <= set(cache.tiles_for_bbox((55.7, 37.6, 55.72, 37.63)))
+
+    stitched = cache.network_for(tiles)
+    assert stitched.node_count == network.node_count
+    assert stitched.edge_count == network.edge_count
+    assert stitched.version.startswith('tiles-')
+    for source, target in ((0, 99), (9, 90), (45, 54)):
+        expected = dijkstra(network, source, target)['cost']
+        found = dijkstra(stitched, int(np.searchsorted(stitched.node_osmid, network.node_osmid[source])),
+                         int(np.searchsorted(stitched.node_osmid, network.node_osmid[target])))['cost']
+        assert abs(found - expected) < 1e-3
+
+    assert cache.network_for(list(reversed(tiles))) is stitched
+    assert cache.get_stats()['disk_hits'] == len(tiles)
+
+
+def test_memory_and_disk_budgets(tmp_path):
+    network = build_grid_network(10, seed=13)
+    cache = TileCache(str(tmp_path), tile_deg=0.007, memory_bytes=1 << 30, disk_bytes=1 << 30)
+    tiles = cut_tiles(network, cache)
+    tile_bytes = RoadNetwork.load(cache.tile_path(tiles[0])).nbytes
+
+    small = TileCache(str(tmp_path), tile_deg=0.007, memory_bytes=tile_bytes * 2, disk_bytes=1 << 30)
+    for key in tiles:
+        small.get_tile(key)
+    stats = small.get_stats()
+    assert stats['tiles_in_memory'] < len(tiles) and stats['memory_evictions'] > 0
+
+    # Старые по времени использования файлы удаляются первыми
+    for age, key in enumerate(tiles):
+        os.utime(cache.tile_path(key), (1000 + age, 1000 + age))
+    sizes = [os.path.getsize(cache.tile_path(key)) for key in tiles]
+    TileCache(str(tmp_path), disk_bytes=sum(sizes[-2:]))._evict_disk()
+    assert [os.path.exists(cache.tile_path(key)) for key in tiles] == [False] * (len(tiles) - 2) + [True, True]
@@ -0,0 +1,64 @@
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from backend.services.trajectory_store import TrajectoryStore, TrajectoryWriter
+
+START = datetime(2026, 10, 12, 22, 0)
+
+
+def ping_events(count, seed):
+    """Stream events of random walks of a few drivers over two days"""
+    rng = np.random.default_rng(seed)
+    drivers = rng.integers(1, 6, count)
+    timestamps = START.timestamp() + np.sort(rng.uniform(0, 30 * 3600, count)).round(1)
+    lats = 55.75 + rng.uniform(-0.1, 0.1, count).round(6)
+    lons = 37.6 + rng.uniform(-0.1, 0.1, count).round(6)
+    events = []
+    for i, (driver, ts, lat, lon) in enumerate(zip(drivers, timestamps, lats, lons)):
+        events.append((f'{i + 1}-0', {
+            b'op': b'busy' if i % 3 else b'set', b'driver': f'driver:{driver}'.encode(),
+            b'city': b'default', b'lat': str(float(lat)).encode(), b'lon': str(float(lon)).encode(),
+            b'car_type': b'economy', b'ts': str(float(ts)).encode()
+        }))
+    return events, drivers, timestamps, lats, lons
+
+
+def test_segments_round_trip_and_compaction(tmp_path):
+    store = TrajectoryStore(str(tmp_path))
+    writer = TrajectoryWriter(store, flush_seconds=0)
+    events, drivers, timestamps, lats, lons = ping_events(2000, seed=4)
+    for chunk in (events[:700], events[700:1500], events[1500:]):
+        for event_id, fields in chunk:
+            writer.add(event_id, fields)
+        writer.add(f'{chunk[-1][0]}1', {b'op': b'del', b'driver': b'driver:1'})
+        writer.flush()
+    # Повторная запись пачки после перезапуска писателя не даёт дубликатов
+    for event_id, fields in events[1500:]:
+        writer.add(event_id, fields)
+    assert writer.flush() == 500
+    assert writer.get_stats()['points'] == 2500
+
+    end = START + timedelta(days=2)
+    for driver in (1, 4):
+        mine = drivers == driver
+        found = store.read(driver, START, end)
+        assert np.allclose(found[0], timestamps[mine])
+        assert np.allclose(found[1], lats[mine]) and np.allclose(found[2], lons[mine])
+
+    day = (START + timedelta(days=1)).date()
+    assert len(store.files(day)) == 4
+    store.compact(day)
+    assert store.files(day) == [store.day_path(day)]
+    found = store.read(4, START, end)
+    assert np.allclose(found[0], timestamps[drivers == 4])
+
+    days = [store.read_day((START + timedelta(days=i)).date()) for i in range(3)]
+    assert sum(len(found[0]) for found in days) == 2000
+    assert np.array_equal(days[1][0], np.sort(days[1][0]))
+
+    window = store.read(4, START + timedelta(hours=3), START + timedelta(hours=5))
+    assert len(window[0]) and window[0].min() >= (START + timedelta(hours=3)).timestamp()
+    assert len(store.read(42, START, end)[0]) == 0